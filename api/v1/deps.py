@@ -1,15 +1,66 @@
+from concurrent.futures import Future
 from contextlib import contextmanager
+import contextvars
+import os
+import queue
 import sqlite3
+import threading
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
 from fastapi import HTTPException, Request
+from metrics import DB_WRITE_BATCH, HASH_DURATION
+from querylog import InstrumentedConnection
 
-DB_PATH = "data.db"
+DB_PATH = os.getenv("DB_PATH", "data.db")
+# most write jobs one group commit takes
+WRITE_BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", "64"))
+
+# tables referencing users without ON DELETE CASCADE, cleared before a user
+# is deleted (see delete_user_s)
+USER_DEPENDENTS = (
+    ("tutoring", "user"),
+    ("push_subscriptions", "user_id"),
+    ("secrets", "user_id"),
+    ("user_keys", "user_id"),
+    ("key_rotations", "user_id"),
+    ("unlock_sessions", "user_id"),
+    ("wlan_vouchers", "claimed_by"),
+)
+# (table, column, parent table) of every reference the orphan cleanup checks
+ORPHANS = (
+    *((table, column, "users") for table, column in USER_DEPENDENTS),
+    ("push_queue", "user_id", "users"),
+    ("parentnotification_answers", "user_id", "users"),
+    ("parentnotification_answers", "notification_id", "parentnotifications"),
+    # a voucher for a class that is gone can never be claimed
+    ("wlan_vouchers", "class_id", "classes"),
+)
+
+_last_columns = (None, ())
+
+def dict_row(cursor, row):
+    # rows as plain dicts: they serialize straight through orjson, where
+    # sqlite3.Row has to go through jsonable_encoder. the column names are
+    # kept for the statement whose rows are being fetched
+    global _last_columns
+    description, columns = _last_columns
+    if description is not cursor.description:
+        description = cursor.description
+        columns = tuple(d[0] for d in description)
+        _last_columns = (description, columns)
+    return dict(zip(columns, row))
+
+def open_db(**kwargs):
+    # foreign key enforcement is a per-connection setting in sqlite, so every
+    # connection of the app turns it on
+    conn = sqlite3.connect(DB_PATH, factory=InstrumentedConnection, **kwargs)
+    conn.row_factory = dict_row
+    sqlite3.Connection.execute(conn, "PRAGMA foreign_keys = ON")
+    return conn
 
 @contextmanager
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = open_db()
     try:
         yield conn
         conn.commit()
@@ -19,6 +70,140 @@ def get_db():
     finally:
         conn.close()
 
+@contextmanager
+def get_read_db():
+    # for requests that only read. query_only turns an accidental write into
+    # an error instead of a write lock next to the writer thread's
+    conn = open_db()
+    sqlite3.Connection.execute(conn, "PRAGMA query_only = ON")
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+class DBWriter:
+    # one thread per worker owns the write connection. write jobs are
+    # functions taking that connection; whatever is queued when the thread
+    # gets to it runs in one transaction with one commit (group commit), each
+    # job in its own savepoint, so a failing job only rolls back itself.
+    # jobs must not commit and must only use the connection they are given.
+    # every write of the services and the event log takes this path; get_db()
+    # is left to reads and scripts. outside of it write only the migrations,
+    # the maintenance checkpoint/vacuum steps and backups, on connections of
+    # their own. each uvicorn worker has its own writer thread, so with
+    # several workers the writers still take turns on the sqlite write lock
+    # (busy timeout), one group commit each
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._conn = None
+        self._conn_path = None
+
+    def submit(self, func):
+        future = Future()
+        if threading.current_thread() is self._thread:
+            # a job writing through another write helper: same transaction
+            try:
+                future.set_result(func(self._conn))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                    self._thread.start()
+        self._queue.put((func, contextvars.copy_context(), future))
+        return future
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _connect(self):
+        if self._conn is not None and self._conn_path == DB_PATH:
+            return self._conn
+        if self._conn is not None:
+            self._conn.close()
+        conn = open_db(isolation_level=None, timeout=30)
+        self._conn, self._conn_path = conn, DB_PATH
+        return conn
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < WRITE_BATCH_MAX:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._queue.put(None)
+                    break
+                batch.append(job)
+            self._write(batch)
+        if self._conn is not None:
+            # the long-lived connection knows which tables it used
+            sqlite3.Connection.execute(self._conn, "PRAGMA optimize")
+            self._conn.close()
+            self._conn = None
+
+    def _write(self, batch):
+        # transaction control goes past the query log
+        control = sqlite3.Connection.execute
+        results = []
+        try:
+            conn = self._connect()
+            control(conn, "BEGIN IMMEDIATE")
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for func, context, future in batch:
+            control(conn, "SAVEPOINT job")
+            try:
+                result = context.run(func, conn)
+                control(conn, "RELEASE job")
+                results.append((future, result, None))
+            except BaseException as e:
+                control(conn, "ROLLBACK TO job")
+                control(conn, "RELEASE job")
+                results.append((future, None, e))
+            context.run(conn.flush)
+
+        try:
+            control(conn, "COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                control(conn, "ROLLBACK")
+            results = [(future, None, e) for future, _, _ in results]
+        DB_WRITE_BATCH.observe(len(batch))
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+db_writer = DBWriter()
+
+def db_write(func, wait=True):
+    # runs func(conn) on the writer thread and returns its result once it is
+    # committed; exceptions raised by func come back here. wait=False queues
+    # the job and returns right away (cleanups nobody waits for)
+    future = db_writer.submit(func)
+    if wait:
+        return future.result()
+    return future
+
 async def get_db_conn():
     with get_db() as conn:
         yield conn
@@ -30,7 +215,7 @@ async def LoggedIn(request: Request):
 
 def require_role(*allowed_roles: int):
     async def _role(request: Request):
-        with get_db() as conn:
+        with get_read_db() as conn:
             session_data = await LoggedIn(request)
             user_role = session_data["role"]
 
@@ -50,11 +235,13 @@ def require_role(*allowed_roles: int):
 ph = PasswordHasher()
 
 def hash_password(password: str, salt="") -> str:
-    return ph.hash(password, salt=salt)
+    with HASH_DURATION.time("hash"):
+        return ph.hash(password, salt=salt)
 
 def verify_password(password: str, hashed: str) -> bool:
     try:
-        return ph.verify(hashed, password)
+        with HASH_DURATION.time("verify"):
+            return ph.verify(hashed, password)
     except VerifyMismatchError:
         return False
     except Exception:
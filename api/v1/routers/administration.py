@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, Request
+import asyncio
+from fastapi import APIRouter, Depends, File, Form, Request, UploadFile
 from fastapi.params import Body
 from api.v1.deps import require_role
 from services.administration_service import *
-from payloads import CreateUserRequest, CreateClassRequest
+from payloads import BulkUsersRequest, CreateUserRequest, CreateClassRequest, SchedulePushRequest
 from definitions import sl_limiter
 
 router = APIRouter()
@@ -10,17 +11,17 @@ router = APIRouter()
 @router.put("/user")
 @sl_limiter.limit("1000/hour")
 async def create_user(request: Request, payload: CreateUserRequest, session_data: dict = Depends(require_role(4))):
-    return create_user_s(payload)
+    return await asyncio.to_thread(create_user_s, payload)
 
 @router.put("/class")
 @sl_limiter.limit("1000/hour")
 async def create_class(request: Request, payload: CreateClassRequest, session_data: dict = Depends(require_role(4))):
-    return create_class_s(payload)
+    return await asyncio.to_thread(create_class_s, payload)
     
 @router.post("/send-all")
 @sl_limiter.limit("10/hour")
 async def send_push_all(request: Request, title: str = Body(..., max_length=100, embed=True), body: str = Body(..., max_length=800, embed=True), session_data: dict = Depends(require_role(4))):
-    return push_all(title, body)
+    return await asyncio.to_thread(push_all, title, body)
 
 @router.post("/send-user")
 @sl_limiter.limit("200/hour")
@@ -31,29 +32,107 @@ async def send_push_user(
     body: str = Body(..., max_length=800, embed=True), 
     session_data: dict = Depends(require_role(4))
 ):
-    return push_user(user_id, title, body)
+    return await asyncio.to_thread(push_user, user_id, title, body)
+
+@router.post("/send-users")
+@sl_limiter.limit("200/hour")
+async def send_push_users(
+    request: Request,
+    user_ids: list[int] = Body(..., min_length=1, max_length=5000, embed=True),
+    title: str = Body(..., max_length=100, embed=True),
+    body: str = Body(..., max_length=800, embed=True),
+    session_data: dict = Depends(require_role(4))
+):
+    return await asyncio.to_thread(push_users, user_ids, title, body)
+
+@router.post("/send-class")
+@sl_limiter.limit("200/hour")
+async def send_push_class(
+    request: Request,
+    class_id: int = Body(..., ge=0, le=9999, embed=True),
+    role_id: int | None = Body(None, ge=1, le=4, embed=True),
+    title: str = Body(..., max_length=100, embed=True),
+    body: str = Body(..., max_length=800, embed=True),
+    session_data: dict = Depends(require_role(4))
+):
+    return await asyncio.to_thread(push_class, class_id, title, body, role_id)
+
+@router.post("/send-role")
+@sl_limiter.limit("10/hour")
+async def send_push_role(
+    request: Request,
+    role_id: int = Body(..., ge=1, le=4, embed=True),
+    title: str = Body(..., max_length=100, embed=True),
+    body: str = Body(..., max_length=800, embed=True),
+    session_data: dict = Depends(require_role(4))
+):
+    return await asyncio.to_thread(push_role, role_id, title, body)
+
+@router.post("/schedule-push")
+@sl_limiter.limit("200/hour")
+async def schedule_push(request: Request, payload: SchedulePushRequest, session_data: dict = Depends(require_role(4))):
+    return await asyncio.to_thread(schedule_push_s, payload)
+
+@router.get("/push-queue")
+@sl_limiter.limit("1000/hour")
+async def get_push_queue(request: Request, session_data: dict = Depends(require_role(4))):
+    return get_push_queue_s()
+
+@router.delete("/push-queue/{batch}")
+@sl_limiter.limit("200/hour")
+async def cancel_push_batch(request: Request, batch: str, session_data: dict = Depends(require_role(4))):
+    return await asyncio.to_thread(cancel_push_batch_s, batch)
 
 @router.delete("/class/{class_id}")
 @sl_limiter.limit("10/minute")
 async def delete_class(request: Request, class_id: int, session_data: dict = Depends(require_role(4))):
-    return delete_class_s(class_id)
+    return await asyncio.to_thread(delete_class_s, class_id)
 
 @router.delete("/user/{user_id}")
 @sl_limiter.limit("10/minute")
 async def delete_user(request: Request, user_id: int, session_data: dict = Depends(require_role(4))):
-    return delete_user_s(user_id)
+    return await asyncio.to_thread(delete_user_s, user_id)
+
+@router.post("/users/bulk")
+@sl_limiter.limit("100/hour")
+async def bulk_users(request: Request, payload: BulkUsersRequest, session_data: dict = Depends(require_role(4))):
+    # up to 1000 creates, updates, moves and deletes in one transaction
+    return await asyncio.to_thread(bulk_users_s, payload)
 
 @router.post("/user/{user_id}/reset-pw")
 @sl_limiter.limit("10/minute")
 async def reset_user_password(request: Request, user_id: int, session_data: dict = Depends(require_role(4))):
-    return reset_user_password_s(user_id)
+    return await asyncio.to_thread(reset_user_password_s, user_id)
 
 @router.put("/wlan-code")
 @sl_limiter.limit("10/minute")
 async def add_wlan_code(request: Request, code: str = Body(embed=True), user_ids: str = Body(embed=True), expiry: str = Body(embed=True), session_data: dict = Depends(require_role(4))):
-    return add_wlan_code_s(user_ids, code, expiry)
+    return await asyncio.to_thread(add_wlan_code_s, user_ids, code, expiry)
 
 @router.delete("/wlan-code/{code_id}")
 @sl_limiter.limit("10/minute")
 async def delete_wlan_code(request: Request, code_id: int, session_data: dict = Depends(require_role(4))):
-    return delete_wlan_code_s(code_id)
\ No newline at end of file
+    return await asyncio.to_thread(delete_wlan_code_s, code_id)
+
+@router.put("/wlan-vouchers")
+@sl_limiter.limit("10/minute")
+async def upload_wlan_vouchers(
+    request: Request,
+    file: UploadFile = File(...),
+    expiry: str = Form(...),
+    class_id: int | None = Form(None, ge=0, le=9999),
+    role_id: int | None = Form(None, ge=1, le=4),
+    session_data: dict = Depends(require_role(4))
+):
+    csv_text = (await file.read()).decode("utf-8-sig")
+    return await asyncio.to_thread(upload_wlan_vouchers_s, csv_text, expiry, class_id, role_id)
+
+@router.get("/wlan-vouchers")
+@sl_limiter.limit("1/second")
+async def get_wlan_voucher_pool(request: Request, session_data: dict = Depends(require_role(4))):
+    return get_wlan_voucher_pool_s()
+
+@router.delete("/wlan-vouchers/expired")
+@sl_limiter.limit("10/minute")
+async def delete_expired_wlan_vouchers(request: Request, session_data: dict = Depends(require_role(4))):
+    return await asyncio.to_thread(delete_expired_wlan_vouchers_s)
\ No newline at end of file
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends, Query, Request
+from api.v1.deps import LoggedIn, require_role
+from services.attachment_service import *
+from definitions import sl_limiter
+
+router = APIRouter()
+
+@router.post("/")
+@sl_limiter.limit("200/hour")
+async def upload_attachment(request: Request, name: str = Query(..., max_length=200), session_data: dict = Depends(require_role(4))):
+    return await store_attachment_s(request, name)
+
+@router.get("/{sha256}")
+@sl_limiter.limit("120/minute")
+async def get_attachment(request: Request, sha256: str, name: str | None = Query(None, max_length=200), session_data: dict = Depends(LoggedIn)):
+    return get_attachment_s(request, sha256, name)
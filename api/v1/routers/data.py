@@ -1,7 +1,9 @@
+import asyncio
+from typing import Literal
 from fastapi import APIRouter, Body, Depends, Query, Request
 from api.v1.deps import LoggedIn
 from services.data_service import *
-from definitions import sl_limiter
+from definitions import sl_limiter, FastJSONResponse
 
 router = APIRouter()
 
@@ -18,22 +20,27 @@ async def encrypt_string(request: Request, input: str):
 @router.get("/get-classes")
 @sl_limiter.limit("1/second")
 async def get_classes(request: Request, session_data: dict = Depends(LoggedIn)):
-    return get_classes_s(session_data)
+    return FastJSONResponse(get_classes_s(session_data))
 
 @router.get("/class/{class_id}")
 @sl_limiter.limit("1/second")
 async def get_class(request: Request, class_id: int, session_data: dict = Depends(LoggedIn)):
     return get_class_s(class_id, session_data)
 
+@router.get("/class/{class_id}/members")
+@sl_limiter.limit("10/second")
+async def get_class_members(request: Request, class_id: int, role: list[int] = Query(default=[]), others: bool = False, after: str | None = None, limit: int = Query(default=50, ge=1, le=200), session_data: dict = Depends(LoggedIn)):
+    return FastJSONResponse(get_class_members_s(class_id, role, others, after, limit))
+
 @router.patch("/class/{class_id}")
 @sl_limiter.limit("10/minute")
 async def update_class(request: Request, class_id: int, new_name: str = Body(embed=True), session_data: dict = Depends(LoggedIn)):
-    return update_class_s(class_id, new_name)
+    return await asyncio.to_thread(update_class_s, class_id, new_name)
 
 @router.get("/get-users")
 @sl_limiter.limit("1/second")
 async def get_users(request: Request, page: int = 1, all: bool = Query(default=False), session_data: dict = Depends(LoggedIn)):
-    return get_users_s(all, page)
+    return FastJSONResponse(get_users_s(all, page))
 
 @router.get("/user/{user_id}")
 @sl_limiter.limit("100/second")
@@ -43,7 +50,7 @@ async def get_user(request: Request, user_id: int, session_data: dict = Depends(
 @router.patch("/user/{user_id}")
 @sl_limiter.limit("1/second")
 async def update_user(request: Request, user_id: int, new_role: int = Body(embed=True), new_class: int = Body(embed=True), new_username: str = Body(embed=True), new_firstname: str = Body(embed=True), new_lastname: str = Body(embed=True), session_data: dict = Depends(LoggedIn)):
-    return update_user_s(user_id, new_role, new_class, new_username, new_firstname, new_lastname)
+    return await asyncio.to_thread(update_user_s, user_id, new_role, new_class, new_username, new_firstname, new_lastname)
 
 @router.get("/roles")
 @sl_limiter.limit("1/second")
@@ -58,9 +65,18 @@ async def get_wlan_code(request: Request, code_id: int, session_data: dict = Dep
 @router.patch("/wlan-code/{code_id}")
 @sl_limiter.limit("1/second")
 async def update_wlan_code(request: Request, code_id: int, new_expiry: str = Body(embed=True), new_user_ids: str = Body(embed=True), session_data: dict = Depends(LoggedIn)):
-    return update_wlan_code_s(code_id, new_expiry, new_user_ids)
+    return await asyncio.to_thread(update_wlan_code_s, code_id, new_expiry, new_user_ids)
 
 @router.get("/get-files")
 @sl_limiter.limit("1/second")
-async def get_files(request: Request, session_data: dict = Depends(LoggedIn)):
-    return get_files_s(session_data)
\ No newline at end of file
+async def get_files(
+    request: Request,
+    page: int = 1,
+    all: bool = Query(default=False),
+    sort: str = "name",
+    order: Literal["asc", "desc"] = "asc",
+    q: str | None = Query(None, max_length=100),
+    session_data: dict = Depends(LoggedIn),
+):
+    # a refresh of the index hashes new files, off the event loop
+    return await asyncio.to_thread(get_files_s, session_data, all, page, sort, order, q)
\ No newline at end of file
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Depends, Header, Request
+from api.v1.deps import LoggedIn
+from services.events_service import *
+from definitions import sl_limiter
+
+router = APIRouter()
+
+@router.get("/")
+@sl_limiter.limit("60/minute")
+async def events(request: Request, last_event_id: int | None = Header(None, ge=0), session_data: dict = Depends(LoggedIn)):
+    return open_event_stream_s(session_data, last_event_id)
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Body, Depends, Request
 from api.v1.deps import LoggedIn, get_db, hash_password, require_role
 from services.import_service import *
@@ -13,7 +14,7 @@ async def get_untis_classes(request: Request, session_data: dict = Depends(requi
 @router.post("/untis/classes")
 @sl_limiter.limit("10/hour")
 async def import_untis_classes(request: Request, session_data: dict = Depends(require_role(4))):
-    return import_untis_classes_s()
+    return await asyncio.to_thread(import_untis_classes_s)
 
 @router.get("/untis/users")
 @sl_limiter.limit("1/second")
@@ -23,4 +24,4 @@ async def get_untis_users(request: Request, session_data: dict = Depends(require
 @router.post("/untis/users")
 @sl_limiter.limit("10/hour")
 async def import_untis_users(request: Request, session_data: dict = Depends(require_role(4))):
-    return import_untis_users_s()
\ No newline at end of file
+    return await asyncio.to_thread(import_untis_users_s)
\ No newline at end of file
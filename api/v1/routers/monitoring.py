@@ -0,0 +1,43 @@
+import asyncio
+from fastapi import APIRouter, Depends, Query, Request
+from api.v1.deps import require_role
+from services.monitoring_service import *
+from definitions import sl_limiter
+
+router = APIRouter()
+
+@router.get("/metrics")
+@sl_limiter.limit("60/minute")
+async def get_metrics(request: Request, session_data: dict = Depends(require_role(4))):
+    # reads the other workers' files
+    return await asyncio.to_thread(get_metrics_s)
+
+@router.get("/metrics/queries")
+@sl_limiter.limit("60/minute")
+async def get_top_queries(request: Request, sort: str = "total", limit: int = Query(50, ge=1, le=500), session_data: dict = Depends(require_role(4))):
+    return await asyncio.to_thread(get_top_queries_s, sort, limit)
+
+@router.delete("/metrics/queries")
+@sl_limiter.limit("10/minute")
+async def reset_top_queries(request: Request, session_data: dict = Depends(require_role(4))):
+    return await asyncio.to_thread(reset_top_queries_s)
+
+@router.get("/metrics/profiles")
+@sl_limiter.limit("60/minute")
+async def get_profiles(request: Request, session_data: dict = Depends(require_role(4))):
+    return get_profiles_s()
+
+@router.get("/metrics/profiles/{name}")
+@sl_limiter.limit("60/minute")
+async def get_profile(request: Request, name: str, format: str = "pstats", sort: str = "cumulative", limit: int = Query(50, ge=1, le=1000), session_data: dict = Depends(require_role(4))):
+    return get_profile_s(name, format, sort, limit)
+
+@router.get("/metrics/database")
+@sl_limiter.limit("60/minute")
+async def get_database(request: Request, session_data: dict = Depends(require_role(4))):
+    return get_database_s()
+
+@router.post("/metrics/database/maintenance")
+@sl_limiter.limit("5/minute")
+async def run_maintenance(request: Request, full: bool = True, session_data: dict = Depends(require_role(4))):
+    return await asyncio.to_thread(run_maintenance_s, full)
@@ -1,20 +1,31 @@
-from fastapi import APIRouter, Body, Depends
+import asyncio
+from fastapi import APIRouter, Body, Depends, Query
 from api.v1.deps import LoggedIn
 from services.parentnotification_service import *
+from definitions import FastJSONResponse
 
 router = APIRouter()
 
 @router.get("/")
 async def get_parentnotifications(session_data: dict = Depends(LoggedIn)):
-    return get_parentnotifications_s(session_data)
+    return FastJSONResponse(get_parentnotifications_s(session_data))
 
 @router.get("/list")
 async def get_parentnotifications_list(session_data: dict = Depends(LoggedIn)):
-    return get_parentnotifications_s(session_data, filter_user_id=False)
+    return FastJSONResponse(get_parentnotifications_s(session_data, filter_user_id=False))
+
+@router.get("/sync")
+async def sync_parentnotifications(
+    since: int = Query(0, ge=0),
+    limit: int = Query(PN_SYNC_PAGE_SIZE, ge=1, le=500),
+    session_data: dict = Depends(LoggedIn),
+):
+    return FastJSONResponse(sync_parentnotifications_s(session_data, since, limit))
 
 @router.post("/feedback")
 async def feedback(notification_id: int = Body(embed=True), feedback: dict = Body(embed=True), session_data: dict = Depends(LoggedIn)):
-    return feedback_s(session_data, notification_id, feedback)
+    # off the event loop, so concurrent answers can share a commit
+    return await asyncio.to_thread(feedback_s, session_data, notification_id, feedback)
 
 @router.get("/feedback/{notification_id}")
 async def get_feedback(notification_id: int, session_data: dict = Depends(LoggedIn)):
@@ -22,4 +33,8 @@ async def get_feedback(notification_id: int, session_data: dict = Depends(Logged
 
 @router.put("/")
 async def create_parentnotification(title: str = Body(embed=True), body: str = Body(embed=True), feedback: str = Body(embed=True), attachments: str = Body(embed=True), user_ids: str = Body(embed=True), session_data: dict = Depends(LoggedIn)):
-    return create_parentnotification_s(session_data, title, body, feedback, attachments, user_ids)
\ No newline at end of file
+    return await asyncio.to_thread(create_parentnotification_s, session_data, title, body, feedback, attachments, user_ids)
+
+@router.get("/{notification_id}")
+async def get_parentnotification(notification_id: int, session_data: dict = Depends(LoggedIn)):
+    return get_parentnotification_s(session_data, notification_id)
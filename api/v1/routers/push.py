@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, Request
 from api.v1.deps import LoggedIn, get_db
 from services.push_service import *
@@ -13,14 +14,15 @@ async def push_subscribe(
     payload: PushSubscription,
     session_data: dict = Depends(LoggedIn)
 ):
-    return subscribe(session_data, payload)
+    # off the event loop, so concurrent writes can share a commit
+    return await asyncio.to_thread(subscribe, session_data, payload)
 
 @router.delete("/subscribe/{endpoint}")
 async def push_unsubscribe(
     endpoint: str,
     session_data: dict = Depends(LoggedIn)
 ):
-    return unsubscribe(session_data, endpoint)
+    return await asyncio.to_thread(unsubscribe, session_data, endpoint)
 
 @router.get("/status")
 async def get_push_status(session_data: dict = Depends(LoggedIn)):
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from pydantic import BaseModel
 from api.v1.deps import LoggedIn, get_db
 from services.pw_service import *
@@ -9,39 +10,87 @@ router = APIRouter()
 class SecretCreate(BaseModel):
     name: str
     value: str
-    unlock_key: str
+    unlock_key: str | None = None
 
 class SecretUpdate(BaseModel):
     value: str
+    unlock_key: str | None = None
+
+class Unlock(BaseModel):
     unlock_key: str
 
+class SecretBatchRead(BaseModel):
+    names: list[str] | None = None
+    unlock_key: str | None = None
+
+class SecretExport(BaseModel):
+    export_key: str
+    names: list[str] | None = None
+    unlock_key: str | None = None
+
+class SecretImport(BaseModel):
+    export: dict
+    export_key: str
+    overwrite: bool = False
+    unlock_key: str | None = None
+
 class ChangeUnlockKey(BaseModel):
     old_unlock_key: str
     new_unlock_key: str
 
 @router.post("/create")
 @sl_limiter.limit("100/minute")
-async def create_secret(request: Request, secret: SecretCreate, session_data: dict = Depends(LoggedIn)):
+async def create_secret(request: Request, secret: SecretCreate, x_unlock_token: str | None = Header(None), session_data: dict = Depends(LoggedIn)):
     user_id = session_data["user_id"]
-    return create_secret_s(user_id, secret.name, secret.value, secret.unlock_key)
+    return await asyncio.to_thread(create_secret_s, user_id, secret.name, secret.value, secret.unlock_key, x_unlock_token)
 
 @router.get("/read/{name}")
 @sl_limiter.limit("100/minute")
-async def read_secret(request: Request, name: str, unlock_key: str, session_data: dict = Depends(LoggedIn)):
+async def read_secret(request: Request, name: str, unlock_key: str | None = None, x_unlock_token: str | None = Header(None), session_data: dict = Depends(LoggedIn)):
+    user_id = session_data["user_id"]
+    return await asyncio.to_thread(get_secret_s, user_id, name, unlock_key, x_unlock_token)
+
+@router.post("/read-batch")
+@sl_limiter.limit("100/minute")
+async def read_secrets_batch(request: Request, batch: SecretBatchRead, x_unlock_token: str | None = Header(None), session_data: dict = Depends(LoggedIn)):
+    user_id = session_data["user_id"]
+    return await asyncio.to_thread(read_secrets_batch_s, user_id, batch.names, batch.unlock_key, x_unlock_token)
+
+@router.post("/export")
+@sl_limiter.limit("10/minute")
+async def export_secrets(request: Request, export: SecretExport, x_unlock_token: str | None = Header(None), session_data: dict = Depends(LoggedIn)):
     user_id = session_data["user_id"]
-    return get_secret_s(user_id, name, unlock_key)
+    return await asyncio.to_thread(export_secrets_s, user_id, export.export_key, export.names, export.unlock_key, x_unlock_token)
+
+@router.post("/import")
+@sl_limiter.limit("10/minute")
+async def import_secrets(request: Request, payload: SecretImport, x_unlock_token: str | None = Header(None), session_data: dict = Depends(LoggedIn)):
+    user_id = session_data["user_id"]
+    return await asyncio.to_thread(import_secrets_s, user_id, payload.export, payload.export_key, payload.overwrite, payload.unlock_key, x_unlock_token)
 
 @router.put("/modify/{name}")
 @sl_limiter.limit("100/minute")
-async def modify_secret(request: Request, name: str, secret: SecretUpdate, session_data: dict = Depends(LoggedIn)):
+async def modify_secret(request: Request, name: str, secret: SecretUpdate, x_unlock_token: str | None = Header(None), session_data: dict = Depends(LoggedIn)):
+    user_id = session_data["user_id"]
+    return await asyncio.to_thread(update_secret_s, user_id, name, secret.value, secret.unlock_key, x_unlock_token)
+
+@router.post("/unlock")
+@sl_limiter.limit("10/minute")
+async def unlock(request: Request, payload: Unlock, session_data: dict = Depends(LoggedIn)):
+    user_id = session_data["user_id"]
+    return await asyncio.to_thread(unlock_s, user_id, payload.unlock_key)
+
+@router.post("/lock")
+@sl_limiter.limit("100/minute")
+async def lock(request: Request, x_unlock_token: str = Header(...), session_data: dict = Depends(LoggedIn)):
     user_id = session_data["user_id"]
-    return update_secret_s(user_id, name, secret.value, secret.unlock_key)
+    return await asyncio.to_thread(lock_s, user_id, x_unlock_token)
 
 @router.delete("/delete/{name}")
 @sl_limiter.limit("100/minute")
 async def delete_secret(request: Request, name: str, session_data: dict = Depends(LoggedIn)):
     user_id = session_data["user_id"]
-    return delete_secret_s(user_id, name)
+    return await asyncio.to_thread(delete_secret_s, user_id, name)
 
 @router.get("/list")
 @sl_limiter.limit("100/minute")
@@ -59,4 +108,4 @@ async def get_key_status(request: Request, session_data: dict = Depends(LoggedIn
 @sl_limiter.limit("10/minute")
 async def change_unlock_key(request: Request, change: ChangeUnlockKey, session_data: dict = Depends(LoggedIn)):
     user_id = session_data["user_id"]
-    return change_unlock_key_s(user_id, change.old_unlock_key, change.new_unlock_key)
\ No newline at end of file
+    return await asyncio.to_thread(change_unlock_key_s, user_id, change.old_unlock_key, change.new_unlock_key)
\ No newline at end of file
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends
+import asyncio
+from fastapi import APIRouter, Depends, Request
 from api.v1.deps import LoggedIn, get_db, require_role
 from services.wlan_service import *
+from definitions import sl_limiter
 
 router = APIRouter()
 
@@ -10,4 +12,10 @@ async def wlan_codes(session_data: dict = Depends(LoggedIn)):
     
 @router.post("/")
 async def add_wlan_code(code: str, users: str, expiry: str, session_data: dict = Depends(require_role(4))):
-    return add_wlan_code_s(users, code, expiry)
\ No newline at end of file
+    return await asyncio.to_thread(add_wlan_code_s, users, code, expiry)
+
+@router.post("/claim")
+@sl_limiter.limit("300/minute")
+async def claim_wlan_voucher(request: Request, session_data: dict = Depends(LoggedIn)):
+    # off the event loop, so concurrent claims can share a commit
+    return await asyncio.to_thread(claim_wlan_voucher_s, session_data)
\ No newline at end of file
@@ -0,0 +1,254 @@
+import asyncio
+import calendar
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+import portalocker
+
+from api.v1 import deps
+from metrics import BACKUP_DURATION, BACKUP_LAST
+
+# online backups of the database with sqlite's backup API. pages are copied
+# BACKUP_PAGES_PER_STEP at a time with a short sleep in between, so requests
+# keep getting the database while a backup runs. the source connection holds
+# one read transaction for the whole copy: in WAL mode writers carry on, and
+# the snapshot does not change under the backup (which would make sqlite
+# start the copy over).
+#
+# a snapshot is BACKUP_DIR/data-<utc time>.db[.gz] plus a .json manifest
+# with its sha256, size and schema version. see backup/__main__.py for the
+# command line (create, list, verify, restore).
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+# seconds between scheduled snapshots, 0 turns them off
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", str(24 * 60 * 60)))
+# the scheduler looks whether a snapshot is due this often, the first time
+# BACKUP_STARTUP_DELAY seconds after the app started
+BACKUP_CHECK_INTERVAL = min(BACKUP_INTERVAL / 4, 60 * 60)
+BACKUP_STARTUP_DELAY = int(os.getenv("BACKUP_STARTUP_DELAY", "60"))
+# snapshots kept, older ones are deleted after each backup
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "14"))
+BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "1") != "0"
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.005"))
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _manifest_path(path):
+    name = path.name[:-3] if path.name.endswith(".gz") else path.name
+    return path.with_name(name[:-3] + ".json")
+
+def list_backups(directory=None):
+    # newest first
+    directory = Path(directory or BACKUP_DIR)
+    if not directory.is_dir():
+        return []
+    backups = []
+    for manifest in directory.glob("*.json"):
+        try:
+            info = json.loads(manifest.read_text(encoding="utf-8"))
+        except ValueError:
+            continue
+        path = directory / info["file"]
+        if path.is_file():
+            backups.append({**info, "path": str(path)})
+    backups.sort(key=lambda b: (b["created_at"], b["file"]), reverse=True)
+    return backups
+
+def copy_database(source, target, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP, progress=None):
+    # page-stepped copy between two open connections; the source stays on
+    # one snapshot for the whole copy
+    source.execute("BEGIN")
+    try:
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=pages, sleep=sleep, progress=progress)
+    finally:
+        source.execute("COMMIT")
+
+def create_backup(db_path=None, directory=None, compress=None, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP, prefix="data"):
+    db_path = db_path or deps.DB_PATH
+    directory = Path(directory or BACKUP_DIR)
+    compress = BACKUP_COMPRESS if compress is None else compress
+    directory.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    name = f"{prefix}-{stamp}.db"
+    partial = directory / f"{name}.partial"
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+
+    source = sqlite3.connect(db_path, isolation_level=None)
+    target = sqlite3.connect(partial)
+    try:
+        copy_database(source, target, pages, sleep, progress)
+        # the copy is its own database now, no WAL next to it
+        target.execute("PRAGMA journal_mode=DELETE")
+        check = target.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise RuntimeError(f"backup failed quick_check: {check}")
+        version = target.execute("SELECT MAX(version) FROM schema_version").fetchone()[0]
+        page_count = target.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+
+    db_size = partial.stat().st_size
+    if compress:
+        path = directory / f"{name}.gz"
+        with open(partial, "rb") as src, gzip.open(path, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        partial.unlink()
+    else:
+        path = directory / name
+        os.replace(partial, path)
+
+    seconds = time.perf_counter() - start
+    info = {
+        "file": path.name,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+        "sha256": _sha256(path),
+        "size": path.stat().st_size,
+        "db_size": db_size,
+        "pages": page_count,
+        "steps": steps,
+        "schema_version": version,
+        "seconds": round(seconds, 3),
+    }
+    _manifest_path(path).write_text(json.dumps(info, indent=4), encoding="utf-8")
+    BACKUP_DURATION.observe(seconds)
+    BACKUP_LAST.set(time.time())
+    return {**info, "path": str(path)}
+
+def prune_backups(directory=None, keep=None):
+    keep = BACKUP_KEEP if keep is None else keep
+    removed = []
+    # only scheduled snapshots count, pre-restore copies are kept
+    for info in [b for b in list_backups(directory) if b["file"].startswith("data-")][keep:]:
+        path = Path(info["path"])
+        path.unlink(missing_ok=True)
+        _manifest_path(path).unlink(missing_ok=True)
+        removed.append(info["file"])
+    return removed
+
+def _unpacked(path, workdir):
+    # a plain .db copy of a snapshot to open with sqlite
+    path = Path(path)
+    if not path.name.endswith(".gz"):
+        return path
+    target = Path(workdir) / path.name[:-3]
+    with gzip.open(path, "rb") as src, open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+    return target
+
+def verify_backup(path):
+    # checksum against the manifest, then a full integrity check of the
+    # database inside
+    path = Path(path)
+    result = {"file": path.name, "ok": False}
+    manifest = _manifest_path(path)
+    if manifest.is_file():
+        expected = json.loads(manifest.read_text(encoding="utf-8"))["sha256"]
+        result["checksum"] = "ok" if _sha256(path) == expected else "mismatch"
+        if result["checksum"] != "ok":
+            return result
+    else:
+        result["checksum"] = "no manifest"
+
+    with tempfile.TemporaryDirectory(prefix="bogy-verify-") as workdir:
+        try:
+            unpacked = _unpacked(path, workdir)
+        except (OSError, EOFError, zlib.error) as e:
+            result["integrity"] = f"cannot decompress: {e}"
+            return result
+        conn = sqlite3.connect(f"file:{unpacked}?mode=ro", uri=True)
+        try:
+            result["integrity"] = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            result["schema_version"] = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0]
+            result["users"] = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            result["integrity"] = str(e)
+        finally:
+            conn.close()
+    result["ok"] = result["integrity"] == "ok"
+    return result
+
+def restore_backup(path, db_path=None):
+    # verifies the snapshot, keeps a copy of the current database
+    # (pre-restore-*) and copies the snapshot into the live database with
+    # the backup API, which goes through sqlite's locking and WAL handling
+    db_path = db_path or deps.DB_PATH
+    check = verify_backup(path)
+    if not check["ok"]:
+        raise RuntimeError(f"backup did not verify: {check}")
+
+    safety = None
+    if os.path.exists(db_path):
+        safety = create_backup(db_path, directory=Path(path).parent, prefix="pre-restore")
+
+    with tempfile.TemporaryDirectory(prefix="bogy-restore-") as workdir:
+        source = sqlite3.connect(_unpacked(path, workdir), isolation_level=None)
+        target = sqlite3.connect(db_path, timeout=30)
+        try:
+            source.backup(target, pages=-1)
+        finally:
+            target.close()
+            source.close()
+    return {"restored": Path(path).name, "database": db_path, "previous": safety and safety["file"], **check}
+
+def scheduled_backup():
+    # every worker runs the scheduler; the lock and the age of the newest
+    # snapshot make sure only one of them backs up per interval
+    Path(BACKUP_DIR).mkdir(parents=True, exist_ok=True)
+    with open(Path(BACKUP_DIR) / ".lock", "a") as lock_file:
+        try:
+            portalocker.lock(lock_file, portalocker.LOCK_EX | portalocker.LOCK_NB)
+        except portalocker.LockException:
+            return None
+        try:
+            newest = next((b for b in list_backups() if b["file"].startswith("data-")), None)
+            if newest is not None:
+                age = time.time() - calendar.timegm(time.strptime(newest["created_at"], "%Y-%m-%d %H:%M:%S"))
+                # due a check early rather than a check late
+                if age < BACKUP_INTERVAL - BACKUP_CHECK_INTERVAL:
+                    return None
+            info = create_backup()
+            prune_backups()
+            return info
+        finally:
+            portalocker.unlock(lock_file)
+
+async def backup_scheduler():
+    # started from the app lifespan
+    if BACKUP_INTERVAL <= 0:
+        return
+    # a fresh install or a restart after a long outage gets its snapshot
+    # right away instead of a whole interval later
+    await asyncio.sleep(BACKUP_STARTUP_DELAY)
+    while True:
+        try:
+            info = await asyncio.to_thread(scheduled_backup)
+        except Exception as e:
+            print(f"Backup failed: {e}")
+            info = None
+        if info:
+            print(f"Backup {info['file']}: {info['db_size'] / 1024 / 1024:.1f} MiB in {info['seconds']:.1f} s")
+        await asyncio.sleep(BACKUP_CHECK_INTERVAL)
@@ -0,0 +1,50 @@
+import argparse
+import json
+
+from backup import BACKUP_COMPRESS, create_backup, list_backups, prune_backups, restore_backup, verify_backup
+
+# backups of the database while the app keeps running:
+#   python -m backup create [--no-compress] [--prune]
+#   python -m backup list
+#   python -m backup verify [FILE]       (newest snapshot without FILE)
+#   python -m backup restore FILE --yes
+# restore overwrites the database named by DB_PATH; stop the app first so no
+# request writes between the restore and its own cached state.
+
+parser = argparse.ArgumentParser(prog="python -m backup")
+sub = parser.add_subparsers(dest="command", required=True)
+create = sub.add_parser("create", help="take a snapshot now")
+create.add_argument("--no-compress", action="store_true", help="keep the snapshot as a plain .db file")
+create.add_argument("--prune", action="store_true", help="delete snapshots beyond BACKUP_KEEP afterwards")
+sub.add_parser("list", help="list snapshots, newest first")
+verify = sub.add_parser("verify", help="check a snapshot's checksum and integrity")
+verify.add_argument("file", nargs="?", help="snapshot file, the newest one by default")
+restore = sub.add_parser("restore", help="verify a snapshot and copy it into the database")
+restore.add_argument("file", help="snapshot file")
+restore.add_argument("--yes", action="store_true", help="really overwrite the database")
+args = parser.parse_args()
+
+if args.command == "create":
+    info = create_backup(compress=BACKUP_COMPRESS and not args.no_compress)
+    print(f"{info['path']}: {info['db_size'] / 1024 / 1024:.1f} MiB database, {info['size'] / 1024 / 1024:.1f} MiB on disk, {info['steps']} steps, {info['seconds']:.2f} s")
+    if args.prune:
+        for name in prune_backups():
+            print(f"deleted {name}")
+elif args.command == "list":
+    for info in list_backups():
+        print(f"  {info['file']:45} {info['created_at']}  {info['size'] / 1024 / 1024:8.1f} MiB  schema {info['schema_version']}")
+elif args.command == "verify":
+    path = args.file
+    if path is None:
+        backups = list_backups()
+        if not backups:
+            raise SystemExit("no snapshots found")
+        path = backups[0]["path"]
+    result = verify_backup(path)
+    print(json.dumps(result, indent=4))
+    if not result["ok"]:
+        raise SystemExit(1)
+else:
+    if not args.yes:
+        raise SystemExit("restore overwrites the database, pass --yes")
+    print(json.dumps(restore_backup(args.file), indent=4))
@@ -1,14 +1,32 @@
 import os
+import sqlite3
+import orjson
 from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
 from fastapi.templating import Jinja2Templates
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+import ratelimit_storage  # registers the sqlite:// storage scheme
 
 load_dotenv()
 
-sl_limiter = Limiter(key_func=get_remote_address, default_limits=["200/hour"])
+# shared between uvicorn workers, use "memory://" for a single process
+RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "sqlite:///ratelimit.db")
+
+sl_limiter = Limiter(key_func=get_remote_address, default_limits=["200/hour"], storage_uri=RATELIMIT_STORAGE_URI)
 templates = Jinja2Templates(directory="templates")
 
+def _json_default(obj):
+    if isinstance(obj, sqlite3.Row):
+        return dict(obj)
+    raise TypeError
+
+# default response class of the app. FastAPI still runs jsonable_encoder on
+# plain return values; list endpoints return this response directly to skip it
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
 # Load VAPID credentials from environment for security (set in .env)
 VAPID_PUBLIC_KEY = os.getenv("VAPID_PUBLIC_KEY")
 VAPID_PRIVATE_KEY = os.getenv("VAPID_PRIVATE_KEY")
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import os
+import time
+
+from fastapi import HTTPException
+
+from api.v1.deps import db_write, get_read_db
+from metrics import SSE_CONNECTIONS, SSE_EVENTS
+
+# live events for the PWA over server-sent events (GET /api/v1/events).
+# services call publish_event() with their cursor, so an event is only seen
+# once the change it announces is committed. the event_log table carries the
+# events to every uvicorn worker: while a worker has clients it reads new
+# rows every EVENT_POLL_INTERVAL seconds and hands each one to the clients
+# it is meant for. a worker without clients does not poll.
+
+EVENT_POLL_INTERVAL = float(os.getenv("EVENT_POLL_INTERVAL", "1"))
+# comment lines keep proxies from closing idle streams
+SSE_HEARTBEAT = 15
+# open streams per worker and per user (several tabs and devices)
+SSE_MAX_CONNECTIONS = int(os.getenv("SSE_MAX_CONNECTIONS", "1000"))
+SSE_MAX_PER_USER = 5
+# events waiting for a client; a client that falls further behind is
+# disconnected and catches up through Last-Event-ID when it reconnects
+SSE_QUEUE_SIZE = 100
+# how long events are kept for reconnecting clients
+EVENT_LOG_KEEP = 60 * 60
+EVENT_PRUNE_INTERVAL = 60
+
+def publish_event(cursor, event, data, user_ids=None, role=None):
+    # user_ids (a list of ids) and role (a role name) each add recipients,
+    # without either the event goes to everybody
+    audience = None if user_ids is None else ";" + ";".join(str(i) for i in user_ids) + ";"
+    cursor.execute(
+        "INSERT INTO event_log (event, data, user_ids, role) VALUES (?, ?, ?, ?)",
+        (event, json.dumps(data), audience, role),
+    )
+
+def parse_user_ids(user_ids):
+    # the "all" / "1;2;3" columns of wlan_codes and parentnotifications
+    ids = user_ids.split(";")
+    if ids[0] == "all":
+        return None
+    return [int(i) for i in ids if i.strip().isdigit()]
+
+def format_event(row):
+    return f"id: {row['id']}\nevent: {row['event']}\ndata: {row['data']}\n\n"
+
+class Client:
+    __slots__ = ("user_id", "role", "queue")
+
+    def __init__(self, user_id, role):
+        self.user_id = user_id
+        self.role = role
+        self.queue = asyncio.Queue(SSE_QUEUE_SIZE)
+
+    def wants(self, row):
+        if row["user_ids"] is None and row["role"] is None:
+            return True
+        if row["role"] is not None and row["role"] == self.role:
+            return True
+        return row["user_ids"] is not None and f";{self.user_id};" in row["user_ids"]
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # too slow, end the stream
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+class EventHub:
+    def __init__(self):
+        self._clients = {}  # user_id -> set of Client
+        self._count = 0
+        self._poller = None
+        self._last_id = 0
+        self._pruned_at = 0.0
+
+    def connect(self, user_id, role):
+        if self._count >= SSE_MAX_CONNECTIONS:
+            raise HTTPException(status_code=503, detail="Too many event streams")
+        clients = self._clients.setdefault(user_id, set())
+        if len(clients) >= SSE_MAX_PER_USER:
+            raise HTTPException(status_code=429, detail="Too many event streams for this user")
+
+        client = Client(user_id, role)
+        clients.add(client)
+        self._count += 1
+        SSE_CONNECTIONS.inc()
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+        return client
+
+    def disconnect(self, client):
+        clients = self._clients.get(client.user_id)
+        if clients is None or client not in clients:
+            return
+        clients.discard(client)
+        if not clients:
+            del self._clients[client.user_id]
+        self._count -= 1
+        SSE_CONNECTIONS.dec()
+
+    def close(self):
+        for clients in self._clients.values():
+            for client in clients:
+                client.put(None)
+        if self._poller is not None:
+            self._poller.cancel()
+
+    async def _poll(self):
+        self._last_id = await asyncio.to_thread(self._max_id)
+        while self._count:
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+            try:
+                rows = await asyncio.to_thread(self._read)
+            except Exception as e:
+                print(f"Event poll failed: {e}")
+                continue
+            for row in rows:
+                for clients in self._clients.values():
+                    for client in clients:
+                        if client.wants(row):
+                            client.put(row)
+
+    def _max_id(self):
+        with get_read_db() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) AS id FROM event_log").fetchone()["id"]
+
+    def _read(self):
+        with get_read_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, event, data, user_ids, role FROM event_log WHERE id > ? ORDER BY id ASC",
+                (self._last_id,),
+            )
+            rows = cursor.fetchall()
+        if rows:
+            self._last_id = rows[-1]["id"]
+
+        if time.monotonic() - self._pruned_at >= EVENT_PRUNE_INTERVAL:
+            self._pruned_at = time.monotonic()
+            db_write(
+                lambda conn: conn.execute(
+                    "DELETE FROM event_log WHERE created_at < datetime('now', ?)",
+                    (f"-{EVENT_LOG_KEEP} seconds",),
+                ),
+                wait=False,
+            )
+        return rows
+
+    def backlog(self, client, last_event_id):
+        # events a reconnecting client missed, as far as they are still kept
+        with get_read_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, event, data, user_ids, role FROM event_log WHERE id > ? ORDER BY id ASC",
+                (last_event_id,),
+            )
+            return [row for row in cursor.fetchall() if client.wants(row)]
+
+hub = EventHub()
+
+async def event_stream(client, last_event_id=None):
+    # the first lines tell EventSource how long to wait before reconnecting
+    sent = last_event_id or 0
+    try:
+        yield "retry: 5000\n\n"
+        if last_event_id is not None:
+            for row in await asyncio.to_thread(hub.backlog, client, last_event_id):
+                sent = row["id"]
+                SSE_EVENTS.inc(row["event"])
+                yield format_event(row)
+
+        while True:
+            try:
+                row = await asyncio.wait_for(client.queue.get(), SSE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if row is None:
+                break
+            # the backlog and the poller can both carry an event
+            if row["id"] <= sent:
+                continue
+            sent = row["id"]
+            SSE_EVENTS.inc(row["event"])
+            yield format_event(row)
+    finally:
+        hub.disconnect(client)
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+# in-memory index of a directory of handouts (public_files) for listing:
+# name, size, mtime and SHA-256 of every file. the directory is looked at
+# again at most every FILE_INDEX_TTL seconds; files are only stat'ed when the
+# directory's mtime changed (a file was added, removed or renamed) or every
+# FILE_INDEX_RESCAN seconds to catch files overwritten in place. hashes are
+# computed once per file version. each worker keeps its own index.
+
+FILE_INDEX_TTL = float(os.getenv("FILE_INDEX_TTL", "5"))
+FILE_INDEX_RESCAN = float(os.getenv("FILE_INDEX_RESCAN", "60"))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class FileIndex:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._files = {}  # name -> entry dict
+        self._listing = []
+        self._dir_mtime = None
+        self._checked_at = None
+        self._scanned_at = None
+        self._lock = threading.Lock()
+
+    def files(self):
+        # entries sorted by name; callers must not change them
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= FILE_INDEX_TTL:
+            with self._lock:
+                if self._checked_at is None or now - self._checked_at >= FILE_INDEX_TTL:
+                    self._refresh(now)
+                    self._checked_at = now
+        return self._listing
+
+    def invalidate(self):
+        with self._lock:
+            self._checked_at = None
+            self._dir_mtime = None
+
+    def _refresh(self, now):
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            self._files, self._listing, self._dir_mtime = {}, [], None
+            return
+        if dir_mtime == self._dir_mtime and now - self._scanned_at < FILE_INDEX_RESCAN:
+            return
+
+        files = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                known = self._files.get(entry.name)
+                if known is not None and known["size"] == stat.st_size and known["_mtime_ns"] == stat.st_mtime_ns:
+                    files[entry.name] = known
+                    continue
+                try:
+                    sha256 = file_sha256(entry.path)
+                except OSError:
+                    # removed while we looked
+                    continue
+                files[entry.name] = {
+                    "name": entry.name,
+                    "size": stat.st_size,
+                    "mtime": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(stat.st_mtime)),
+                    "sha256": sha256,
+                    "_mtime_ns": stat.st_mtime_ns,
+                }
+
+        self._files = files
+        self._listing = sorted(files.values(), key=lambda f: f["name"].lower())
+        self._dir_mtime = dir_mtime
+        self._scanned_at = now
+
+    def page(self, page=1, per_page=100, sort="name", order="asc", search=None):
+        files = self.files()
+        if search:
+            search = search.lower()
+            files = [f for f in files if search in f["name"].lower()]
+        if sort != "name" or order != "asc":
+            keys = {
+                "name": lambda f: f["name"].lower(),
+                "size": lambda f: f["size"],
+                "mtime": lambda f: f["_mtime_ns"],
+            }
+            files = sorted(files, key=keys[sort], reverse=order == "desc")
+
+        total_items = len(files)
+        start = (page - 1) * per_page
+        items = [
+            {"name": f["name"], "size": f["size"], "mtime": f["mtime"], "sha256": f["sha256"]}
+            for f in files[start:start + per_page]
+        ]
+        return items, total_items
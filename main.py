@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
@@ -10,21 +12,51 @@ from slowapi.errors import RateLimitExceeded
 from starlette.middleware.sessions import SessionMiddleware
 
 # import deps
-from api.v1.deps import LoggedIn, get_db
+from api.v1.deps import LoggedIn, db_writer
+
+from migrations import ensure_schema
+from metrics import MetricsMiddleware, metrics_writer
+from querylog import QueryStatsMiddleware
+from profiling import PROFILING_ENABLED, ProfilingMiddleware, install_executor
+from services.push_service import push_scheduler
+from events import hub
+from backup import backup_scheduler
+from maintenance import maintenance_scheduler
 
 # import routers
-from api.v1.routers import administration, wlan, push, tutoring, parentnotification, user, data, admin_dashboard, pw, importing
+from api.v1.routers import administration, wlan, push, tutoring, parentnotification, user, data, admin_dashboard, pw, importing, monitoring, events, attachments
 
 # import definitions
-from definitions import sl_limiter, SECRET_KEY
+from definitions import sl_limiter, FastJSONResponse, SECRET_KEY
 
 is_production = os.getenv("ENV") == "production"
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ensure_schema()
+    if PROFILING_ENABLED:
+        install_executor(asyncio.get_running_loop())
+    scheduler = asyncio.create_task(push_scheduler())
+    backups = asyncio.create_task(backup_scheduler())
+    maintenance = asyncio.create_task(maintenance_scheduler())
+    stats = asyncio.create_task(metrics_writer())
+    yield
+    scheduler.cancel()
+    backups.cancel()
+    maintenance.cancel()
+    stats.cancel()
+    hub.close()
+    # commits what is still queued
+    await asyncio.to_thread(db_writer.stop)
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.state.limiter = sl_limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+if PROFILING_ENABLED:
+    # inside the session middleware, profiling is for admins only
+    app.add_middleware(ProfilingMiddleware)
 app.add_middleware(
     SessionMiddleware,
     secret_key=SECRET_KEY,
@@ -37,8 +69,11 @@ app.add_middleware(
     allow_origins=["*"],  # Später einschränken
     allow_credentials=True,
     allow_methods=["GET", "POST", "DELETE"],
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "X-Unlock-Token", "X-Profile"],
 )
+app.add_middleware(QueryStatsMiddleware)
+# outermost, so the timings include the other middlewares
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(administration.router, prefix="/api/v1/administration", tags=["administration"])
 app.include_router(wlan.router, prefix="/api/v1/wlan", tags=["wlan"])
@@ -50,6 +85,9 @@ app.include_router(pw.router, prefix="/api/v1/pw", tags=["pw"])
 app.include_router(data.router, prefix="/api/v1/data", tags=["data"])
 app.include_router(admin_dashboard.router, prefix="/dashboard", tags=["admin_dashboard"])
 app.include_router(importing.router, prefix="/api/v1/import", tags=["import"])
+app.include_router(monitoring.router, tags=["monitoring"])
+app.include_router(events.router, prefix="/api/v1/events", tags=["events"])
+app.include_router(attachments.router, prefix="/api/v1/attachments", tags=["attachments"])
 
 class NoCacheStaticFiles(StaticFiles):
     def file_response(self, full_path, stat_result, scope, status_code=200):
@@ -85,169 +123,27 @@ class AuthPWA(NoCacheStaticFiles):
             
         await super().__call__(scope, receive, send)
 
-app.mount("/app", AuthPWA(directory="pwa", html=True), name="pwa")
-
-app.mount("/static", NoCacheStaticFiles(directory="static", html=True), name="static")
-app.mount("/files", StaticFiles(directory="public_files"), name="files")
-
-def init_db():
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS roles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                german_name TEXT UNIQUE NOT NULL
-            )
-            """
-        )
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                firstname TEXT,
-                lastname TEXT,
-                password TEXT NOT NULL,
-                role INTEGER,
-                class INTEGER,
-                FOREIGN KEY(role) REFERENCES roles(id)
-            )
-            """
-        )
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS classes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL
-            )
-            """
-        )
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS subjects (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                german_name TEXT UNIQUE NOT NULL
-            )
-            """
-        )
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS tutoring (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user INTEGER NOT NULL,
-                subjects TEXT,
-                FOREIGN KEY(user) REFERENCES users(id)
-            )
-            """
-        )
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS push_subscriptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                endpoint TEXT NOT NULL,
-                p256dh TEXT NOT NULL,
-                auth TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(user_id) REFERENCES users(id),
-                UNIQUE(endpoint)
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS wlan_codes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_ids INTEGER NOT NULL,
-                code TEXT NOT NULL,
-                expiry DATETIME NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS parentnotifications (
-                id INTEGER PRIMARY KEY,
-                title TEXT NOT NULL,
-                body TEXT NOT NULL,
-                feedback TEXT NOT NULL,
-                attachments TEXT,
-                user_ids TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_keys (
-                user_id INTEGER PRIMARY KEY,
-                hashed_key TEXT NOT NULL,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS secrets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                encrypted_value TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(user_id) REFERENCES users(id),
-                UNIQUE(user_id, name)
-            )
-        """)
-
-        # settings
-        cursor.execute("PRAGMA foreign_keys=ON")
-        cursor.execute("PRAGMA journal_mode=WAL")
-
-        # seed subjects
-        subjects = {
-            "german": "Deutsch",
-            "english": "Englisch",
-            "french": "Französisch",
-            "latin": "Latein",
-            "spanish": "Spanisch",
-            "italian": "Italienisch",
-            "maths": "Mathematik",
-            "physics": "Physik",
-            "chemistry": "Chemie",
-            "biology": "Biologie",
-            "cs": "Informatik",
-            "nut": "Natur und Technik",
-            "history": "Geschichte",
-            "geography": "Geographie",
-            "economics": "Wirtschaft und Recht",
-            "politics": "Politik und Gesellschaft",
-            "business-cs": "Wirtschaftsinformatik",
-            "art": "Kunst",
-            "music": "Musik",
-            "pe": "Sport",
-            "catholic": "Katholische Religionslehre",
-            "evangelic": "Evangelische Religionslehre",
-            "ethics": "Ethik"
-        }
-        for s in subjects.keys():
-            cursor.execute("INSERT OR IGNORE INTO subjects(name, german_name) VALUES(?, ?)", (s, subjects[s],))
-        
-        # seed roles
-        roles = {
-            "student": "Schüler",
-            "teacher": "Lehrer",
-            "parent": "Elternteil",
-            "administration": "Verwaltung"
-        }
-        for r in roles.keys():
-            cursor.execute("INSERT OR IGNORE INTO roles(name, german_name) VALUES(?, ?)", (r, roles[r],))
-
-        # standard user
-        cursor.execute("INSERT OR IGNORE INTO users (username, firstname, lastname, password, role, class) VALUES ('admin', 'Max', 'Mustermann', '$argon2id$v=19$m=65536,t=3,p=4$rv8/JsLAAwnC8sC/T2cabw$bMBb9Xycyd5MMFXvEF3ni2KCcfROc/jMrIM9sGk70U8', '4', NULL)") # pw: AdminPW (change!)
+# older attachments, uploads go to /api/v1/attachments
+class AuthStaticFiles(StaticFiles):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            try:
+                await LoggedIn(request=Request(scope))
+            except HTTPException as e:
+                await send({
+                    'type': 'http.response.start',
+                    'status': e.status_code,
+                    'headers': [[b'content-type', b'text/plain']],
+                })
+                await send({'type': 'http.response.body', 'body': e.detail.encode()})
+                return
 
-        conn.commit()
+        await super().__call__(scope, receive, send)
 
+app.mount("/app", AuthPWA(directory="pwa", html=True), name="pwa")
 
-init_db()
+app.mount("/static", NoCacheStaticFiles(directory="static", html=True), name="static")
+app.mount("/files", AuthStaticFiles(directory="public_files"), name="files")
 
 # ROOT
 @app.get("/")
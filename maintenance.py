@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import time
+
+import portalocker
+
+from api.v1 import deps
+from metrics import DB_FILE_SIZE, DB_FREE_PAGES, MAINTENANCE_DURATION
+
+# periodic database housekeeping. every CHECKPOINT_INTERVAL seconds the WAL
+# is checkpointed (PASSIVE, so nobody waits); once it has grown past
+# WAL_TRUNCATE_SIZE a TRUNCATE checkpoint shrinks the file again. every
+# MAINTENANCE_INTERVAL seconds the full run also
+#   - deletes orphan rows (rows pointing at users, classes or notifications
+#     that no longer exist, left behind while foreign keys were not enforced),
+#   - refreshes the planner statistics (ANALYZE with analysis_limit, plus
+#     PRAGMA optimize on the writer thread's long-lived connection),
+#   - hands free pages back to the file system with incremental vacuum,
+#     VACUUM_PAGES_PER_STEP pages per short write transaction.
+# sizes and step timings go to the metrics and to last_report. every worker
+# runs the scheduler; a file lock next to the database lets one run at a time
+# and its mtime records the last full run.
+#   python -m maintenance [--checkpoint-only] [--vacuum-pages N]
+
+CHECKPOINT_INTERVAL = int(os.getenv("CHECKPOINT_INTERVAL", "300"))
+# seconds between full runs, 0 turns the scheduler off
+MAINTENANCE_INTERVAL = int(os.getenv("MAINTENANCE_INTERVAL", str(60 * 60)))
+WAL_TRUNCATE_SIZE = int(os.getenv("WAL_TRUNCATE_SIZE", str(64 * 1024 * 1024)))
+# rows looked at per index by ANALYZE, keeps it fast on big tables
+ANALYSIS_LIMIT = 1000
+# free pages below this are left for new rows to reuse
+VACUUM_MIN_FREE_PAGES = int(os.getenv("VACUUM_MIN_FREE_PAGES", "1024"))
+VACUUM_PAGES_PER_STEP = 256
+VACUUM_STEP_SLEEP = 0.005
+# pages freed per full run at most, the rest waits for the next one
+VACUUM_MAX_PAGES = int(os.getenv("VACUUM_MAX_PAGES", "65536"))
+
+# report of the last run in this worker, for GET /metrics/database
+last_report = None
+
+def _connect():
+    conn = sqlite3.connect(deps.DB_PATH, isolation_level=None, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def database_sizes(conn=None):
+    own = conn is None
+    conn = conn or _connect()
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        sizes = {
+            "db_size": os.path.getsize(deps.DB_PATH),
+            "wal_size": os.path.getsize(f"{deps.DB_PATH}-wal") if os.path.exists(f"{deps.DB_PATH}-wal") else 0,
+            "page_size": page_size,
+            "page_count": conn.execute("PRAGMA page_count").fetchone()[0],
+            "free_pages": conn.execute("PRAGMA freelist_count").fetchone()[0],
+            "auto_vacuum": ("none", "full", "incremental")[conn.execute("PRAGMA auto_vacuum").fetchone()[0]],
+        }
+    finally:
+        if own:
+            conn.close()
+    DB_FILE_SIZE.set(sizes["db_size"], "db")
+    DB_FILE_SIZE.set(sizes["wal_size"], "wal")
+    DB_FREE_PAGES.set(sizes["free_pages"])
+    return sizes
+
+def checkpoint(conn):
+    # PASSIVE copies what it can without waiting for anyone. TRUNCATE waits
+    # (up to the busy timeout) for readers to leave the WAL, so it only runs
+    # when the file has grown
+    busy, log, done = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    result = {"mode": "passive", "busy": bool(busy), "wal_frames": log, "checkpointed": done}
+    wal = f"{deps.DB_PATH}-wal"
+    if os.path.exists(wal) and os.path.getsize(wal) > WAL_TRUNCATE_SIZE:
+        busy, log, done = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        result.update({"mode": "truncate", "busy": bool(busy), "wal_frames": log, "checkpointed": done})
+    return result
+
+def delete_orphans():
+    # one write job on the writer thread: the orphans are gone in one commit
+    def write(conn):
+        removed = {}
+        for table, column, parent in deps.ORPHANS:
+            cursor = conn.execute(
+                f"DELETE FROM {table} WHERE {column} IS NOT NULL "
+                f"AND NOT EXISTS (SELECT 1 FROM {parent} p WHERE p.id = {table}.{column})"
+            )
+            if cursor.rowcount:
+                removed[f"{table}.{column}"] = cursor.rowcount
+        return removed
+
+    return deps.db_write(write)
+
+def analyze(conn):
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    # optimize only looks at tables the connection itself has queried, which
+    # makes the writer thread's connection the one worth running it on
+    deps.db_write(lambda writer: writer.execute("PRAGMA optimize").fetchall())
+
+def incremental_vacuum(conn, max_pages=VACUUM_MAX_PAGES):
+    # needs auto_vacuum=INCREMENTAL (migration 0008). executescript steps the
+    # pragma until it is done (execute() would free a single page); each step
+    # is its own short write transaction
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2 or free < VACUUM_MIN_FREE_PAGES:
+        return 0
+    freed = 0
+    while freed < min(free, max_pages):
+        conn.executescript(f"PRAGMA incremental_vacuum({min(VACUUM_PAGES_PER_STEP, max_pages - freed)})")
+        left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if left >= free - freed:
+            break
+        freed = free - left
+        time.sleep(VACUUM_STEP_SLEEP)
+    return freed
+
+def run_maintenance(full=True, vacuum_pages=VACUUM_MAX_PAGES):
+    global last_report
+    report = {"started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()), "full": full, "timings": {}}
+    conn = _connect()
+    try:
+        report["before"] = database_sizes(conn)
+
+        def step(name, func, *args):
+            start = time.perf_counter()
+            result = func(*args)
+            seconds = time.perf_counter() - start
+            report["timings"][name] = round(seconds, 4)
+            MAINTENANCE_DURATION.observe(seconds, name)
+            return result
+
+        if full:
+            report["orphans"] = step("orphans", delete_orphans)
+            step("analyze", analyze, conn)
+            report["vacuumed_pages"] = step("vacuum", incremental_vacuum, conn, vacuum_pages)
+        report["checkpoint"] = step("checkpoint", checkpoint, conn)
+        report["after"] = database_sizes(conn)
+    finally:
+        conn.close()
+    last_report = report
+    return report
+
+def scheduled_maintenance():
+    # the lock file's mtime is the time of the last full run of any worker
+    lock_path = f"{deps.DB_PATH}.maintenance.lock"
+    with open(lock_path, "a") as lock_file:
+        try:
+            portalocker.lock(lock_file, portalocker.LOCK_EX | portalocker.LOCK_NB)
+        except portalocker.LockException:
+            return None
+        try:
+            full = time.time() - os.path.getmtime(lock_path) >= MAINTENANCE_INTERVAL or os.path.getsize(lock_path) == 0
+            report = run_maintenance(full=full)
+            if full:
+                # non-empty marks "has run once"
+                lock_file.seek(0)
+                lock_file.truncate()
+                lock_file.write(report["started_at"])
+            return report
+        finally:
+            portalocker.unlock(lock_file)
+
+async def maintenance_scheduler():
+    # started from the app lifespan
+    if MAINTENANCE_INTERVAL <= 0:
+        return
+    while True:
+        await asyncio.sleep(CHECKPOINT_INTERVAL)
+        try:
+            report = await asyncio.to_thread(scheduled_maintenance)
+        except Exception as e:
+            print(f"Database maintenance failed: {e}")
+            continue
+        if report and report["full"]:
+            before, after = report["before"], report["after"]
+            print(
+                f"Database maintenance: {after['db_size'] / 1024 / 1024:.1f} MiB "
+                f"(WAL {before['wal_size'] / 1024 / 1024:.1f} -> {after['wal_size'] / 1024 / 1024:.1f} MiB), "
+                f"{sum(report['orphans'].values())} orphans, {report['vacuumed_pages']} pages freed "
+                f"in {sum(report['timings'].values()):.2f} s"
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m maintenance")
+    parser.add_argument("--checkpoint-only", action="store_true", help="only checkpoint the WAL")
+    parser.add_argument("--vacuum-pages", type=int, default=VACUUM_MAX_PAGES, help="most pages to free")
+    args = parser.parse_args()
+    print(json.dumps(run_maintenance(full=not args.checkpoint_only, vacuum_pages=args.vacuum_pages), indent=4))
+    deps.db_writer.stop()
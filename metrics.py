@@ -0,0 +1,360 @@
+import asyncio
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+import portalocker
+
+# minimal Prometheus-style metrics: counters, gauges and histograms kept in
+# process memory and rendered in the text exposition format on /metrics.
+# recording is a dict lookup and an add under a lock, cheap enough for every
+# request; there is no dependency on prometheus_client.
+#
+# every uvicorn worker keeps its own values and writes them to
+# METRICS_DIR/metrics-<worker>.json every METRICS_FLUSH_INTERVAL seconds
+# (metrics_writer, started from the app lifespan). /metrics adds up the files
+# of all workers on the host, so any worker can answer a scrape: counters and
+# histograms are summed, gauges are summed too or, when per_worker, get a
+# worker label (the pid). a worker that exits, or has not written its file
+# for METRICS_STALE_AFTER seconds, has its counters and histograms folded
+# into metrics-archive.json, so totals do not go backwards; its gauges are
+# dropped. with METRICS_DIR="" every worker only reports its own values and
+# each one has to be scraped.
+
+METRICS_DIR = os.getenv("METRICS_DIR", "worker-metrics")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+METRICS_STALE_AFTER = 60
+# archived workers remembered, so a hung one that comes back is not counted twice
+ARCHIVE_WORKERS_MAX = 1000
+
+# pid plus start time, pids get reused
+WORKER_ID = f"{os.getpid()}-{int(time.time() * 1000)}"
+
+REGISTRY = []
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HASH_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names, values, extra="") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Metric:
+    TYPE = ""
+    per_worker = False
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def values(self):
+        # a copy of labelvalues -> value
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, into, labelvalues, value):
+        into[labelvalues] = into.get(labelvalues, 0) + value
+
+    def render(self, values):
+        labelnames = ("worker", *self.labelnames) if self.per_worker else self.labelnames
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.TYPE}"
+        for labelvalues, value in sorted(values.items(), key=lambda i: tuple(map(str, i[0]))):
+            yield from self._render_value(labelnames, labelvalues, value)
+
+    def _render_value(self, labelnames, labelvalues, value):
+        yield f"{self.name}{_labels(labelnames, labelvalues)} {value}"
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+class Gauge(Metric):
+    TYPE = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames=(), per_worker=False):
+        super().__init__(name, help, labelnames)
+        # values that make no sense added up (sizes, times) are shown per worker
+        self.per_worker = per_worker
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        # per label set: [count per bucket (+Inf last), sum]
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def time(self, *labelvalues):
+        return _Timer(self, labelvalues)
+
+    def values(self):
+        with self._lock:
+            return {labelvalues: [counts[:], total] for labelvalues, (counts, total) in self._values.items()}
+
+    def merge(self, into, labelvalues, value):
+        entry = into.get(labelvalues)
+        if entry is None:
+            into[labelvalues] = [value[0][:], value[1]]
+            return
+        entry[0] = [a + b for a, b in zip(entry[0], value[0])]
+        entry[1] += value[1]
+
+    def _render_value(self, labelnames, labelvalues, value):
+        counts, total = value
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            yield f"{self.name}_bucket{_labels(labelnames, labelvalues, le)} {cumulative}"
+        yield f"{self.name}_sum{_labels(labelnames, labelvalues)} {total}"
+        yield f"{self.name}_count{_labels(labelnames, labelvalues)} {cumulative}"
+
+class _Timer:
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+# per-worker files, shared with the query log (see querylog.py)
+
+_worker_files = {}  # kind -> (snapshot, fold)
+
+def register_worker_file(kind, snapshot, fold):
+    # snapshot() returns this worker's data as json; fold(archive, data)
+    # adds a gone worker's data to the archive (None at first) and returns it
+    _worker_files[kind] = (snapshot, fold)
+
+def _write_json(path, data):
+    tmp = f"{path}.{WORKER_ID}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def write_worker_file(kind):
+    snapshot, _ = _worker_files[kind]
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _write_json(os.path.join(METRICS_DIR, f"{kind}-{WORKER_ID}.json"), snapshot())
+
+def read_worker_files(kind, retire=False):
+    # returns (archive data or None, {worker id: data}) of the workers still
+    # writing. gone workers (and with retire=True this one) are folded into
+    # the archive; the lock keeps readers from counting a worker twice
+    _, fold = _worker_files[kind]
+    archive_path = os.path.join(METRICS_DIR, f"{kind}-archive.json")
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(os.path.join(METRICS_DIR, ".lock"), "a") as lock_file:
+        portalocker.lock(lock_file, portalocker.LOCK_EX)
+        try:
+            try:
+                with open(archive_path) as f:
+                    archive = json.load(f)
+            except (FileNotFoundError, ValueError):
+                archive = {"workers": [], "data": None}
+            archived = set(archive["workers"])
+            live, changed = {}, False
+            now = time.time()
+            for path in glob.glob(os.path.join(METRICS_DIR, f"{kind}-*.json")):
+                worker = os.path.basename(path)[len(kind) + 1:-len(".json")]
+                if worker == "archive":
+                    continue
+                try:
+                    stale = now - os.path.getmtime(path) > METRICS_STALE_AFTER
+                    with open(path) as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if worker in archived:
+                    os.remove(path)
+                elif (worker == WORKER_ID and retire) or (worker != WORKER_ID and stale):
+                    archive["data"] = fold(archive["data"], data)
+                    archive["workers"] = [*archive["workers"], worker][-ARCHIVE_WORKERS_MAX:]
+                    changed = True
+                    os.remove(path)
+                else:
+                    live[worker] = data
+            if changed:
+                _write_json(archive_path, archive)
+            return archive["data"], live
+        finally:
+            portalocker.unlock(lock_file)
+
+def _snapshot():
+    return {metric.name: [[list(k), v] for k, v in metric.values().items()] for metric in REGISTRY}
+
+def _fold(archive, data):
+    # counters and histograms of a gone worker; its gauges go with it
+    archive = archive or {}
+    for metric in REGISTRY:
+        if isinstance(metric, Gauge):
+            continue
+        values = {tuple(k): v for k, v in archive.get(metric.name, [])}
+        for labelvalues, value in data.get(metric.name, []):
+            metric.merge(values, tuple(labelvalues), value)
+        archive[metric.name] = [[list(k), v] for k, v in values.items()]
+    return archive
+
+register_worker_file("metrics", _snapshot, _fold)
+
+def collect():
+    # metric name -> labelvalues -> value, of all workers or of this one
+    if not METRICS_DIR:
+        pid = os.getpid()
+        return {
+            metric.name: {(pid, *k): v for k, v in metric.values().items()} if metric.per_worker else metric.values()
+            for metric in REGISTRY
+        }
+
+    write_worker_file("metrics")
+    archive, live = read_worker_files("metrics")
+    merged = {metric.name: {} for metric in REGISTRY}
+    for worker, data in [(None, archive or {}), *live.items()]:
+        for metric in REGISTRY:
+            for labelvalues, value in data.get(metric.name, []):
+                if metric.per_worker:
+                    labelvalues = [worker.split("-")[0], *labelvalues]
+                metric.merge(merged[metric.name], tuple(labelvalues), value)
+    return merged
+
+def render() -> str:
+    values = collect()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(values[metric.name]))
+    return "\n".join(lines) + "\n"
+
+async def metrics_writer():
+    # started from the app lifespan; on shutdown this worker's counts move
+    # to the archive
+    if not METRICS_DIR:
+        return
+    try:
+        while True:
+            for kind in _worker_files:
+                try:
+                    await asyncio.to_thread(write_worker_file, kind)
+                except OSError as e:
+                    print(f"Writing {kind} for other workers failed: {e}")
+            await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+    finally:
+        for kind in _worker_files:
+            try:
+                write_worker_file(kind)
+                read_worker_files(kind, retire=True)
+            except OSError as e:
+                print(f"Archiving {kind} failed: {e}")
+
+# http
+HTTP_REQUESTS = Counter("bogy_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("bogy_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("bogy_http_requests_in_flight", "HTTP requests being processed.", ("method",))
+
+# push
+PUSH_SENT = Counter("bogy_push_sent_total", "Push messages delivered to the push service.", ("target",))
+PUSH_FAILED = Counter("bogy_push_failed_total", "Push messages the push service rejected.", ("target",))
+
+# untis import
+IMPORT_ITEMS = Counter("bogy_import_items_total", "Classes, teachers and students created by Untis imports.", ("kind",))
+IMPORT_DURATION = Histogram("bogy_import_duration_seconds", "Duration of Untis imports.", ("kind",), buckets=(1, 5, 15, 30, 60, 120, 300, 600))
+
+# server-sent events
+SSE_CONNECTIONS = Gauge("bogy_sse_connections", "Open event stream connections.")
+SSE_EVENTS = Counter("bogy_sse_events_total", "Events sent to event stream clients.", ("event",))
+
+# password hashing (argon2)
+HASH_DURATION = Histogram("bogy_password_hash_duration_seconds", "Argon2 hash, verify and key derivation time.", ("op",), buckets=HASH_BUCKETS)
+
+# database writes
+DB_WRITE_BATCH = Histogram("bogy_db_write_batch_size", "Write jobs committed together by the writer thread.", buckets=(1, 2, 4, 8, 16, 32, 64))
+
+# database maintenance
+DB_FILE_SIZE = Gauge("bogy_db_file_size_bytes", "Size of the database and its WAL at the last maintenance run.", ("file",), per_worker=True)
+DB_FREE_PAGES = Gauge("bogy_db_free_pages", "Unused pages in the database at the last maintenance run.", per_worker=True)
+MAINTENANCE_DURATION = Histogram("bogy_db_maintenance_duration_seconds", "Duration of database maintenance steps.", ("step",), buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 30, 120))
+
+# backups
+BACKUP_DURATION = Histogram("bogy_backup_duration_seconds", "Duration of database backups.", buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+BACKUP_LAST = Gauge("bogy_backup_last_success_time_seconds", "Time of the last successful backup since the epoch.", per_worker=True)
+
+PROCESS_START = Gauge("bogy_process_start_time_seconds", "Start time of each worker since the epoch.", per_worker=True)
+PROCESS_START.set(time.time())
+
+def route_label(scope) -> str:
+    # the route template, not the raw path, so ids don't blow up the label set.
+    # the router fills these into the scope while dispatching
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if scope.get("root_path"):
+        return scope["root_path"]  # mounted static apps: /app, /static, /files
+    return "unmatched"
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        method = scope["method"]
+        HTTP_IN_FLIGHT.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec(method)
+            route = route_label(scope)
+            HTTP_REQUESTS.inc(method, route, status)
+            HTTP_LATENCY.observe(elapsed, method, route)
@@ -0,0 +1,108 @@
+import importlib
+import pkgutil
+import sqlite3
+
+import portalocker
+
+from api.v1 import deps
+
+# migrations live next to this file as vNNNN_<name>.py, applied in version
+# order. each module has a DESCRIPTION and an upgrade(conn). by default the
+# engine runs upgrade() inside one transaction together with its
+# schema_version row; modules that set TRANSACTIONAL = False manage their own
+# transactions (e.g. through create_index) and must be safe to re-run.
+
+def load_migrations():
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        if not info.name.startswith("v") or not info.name[1:5].isdigit():
+            continue
+        module = importlib.import_module(f"{__name__}.{info.name}")
+        migrations.append((int(info.name[1:5]), module))
+    migrations.sort(key=lambda m: m[0])
+    return migrations
+
+def latest_version():
+    migrations = load_migrations()
+    return migrations[-1][0] if migrations else 0
+
+def connect():
+    conn = sqlite3.connect(deps.DB_PATH, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def current_version(conn):
+    try:
+        row = conn.execute("SELECT MAX(version) AS version FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        # no schema_version table yet
+        return 0
+    return row["version"] or 0
+
+def create_index(conn, sql):
+    # one index per short transaction: the write lock is released between
+    # builds, so requests are only held up for one index at a time
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(sql)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def migrate(target=None, verbose=False):
+    # the file lock keeps several workers (or a deploy-time run and a starting
+    # worker) from migrating the same database at once
+    with open(f"{deps.DB_PATH}.migrate.lock", "a") as lock_file:
+        portalocker.lock(lock_file, portalocker.LOCK_EX)
+        try:
+            return _migrate(target, verbose)
+        finally:
+            portalocker.unlock(lock_file)
+
+def _migrate(target, verbose):
+    conn = connect()
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        applied = []
+        version = current_version(conn)
+        for number, module in load_migrations():
+            if number <= version or (target is not None and number > target):
+                continue
+            if verbose:
+                print(f"Applying migration {number:04d}: {module.DESCRIPTION}")
+
+            if getattr(module, "TRANSACTIONAL", True):
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    module.upgrade(conn)
+                    conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (number, module.DESCRIPTION))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            else:
+                module.upgrade(conn)
+                conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (number, module.DESCRIPTION))
+            applied.append(number)
+        return applied
+    finally:
+        conn.close()
+
+def ensure_schema():
+    # startup path: a single version query when the database is up to date
+    conn = connect()
+    try:
+        version = current_version(conn)
+    finally:
+        conn.close()
+    if version < latest_version():
+        migrate(verbose=True)
@@ -0,0 +1,28 @@
+import argparse
+
+from migrations import connect, current_version, latest_version, load_migrations, migrate
+
+# run migrations ahead of a deploy:
+#   python -m migrations status
+#   python -m migrations upgrade [--target N]
+
+parser = argparse.ArgumentParser(prog="python -m migrations")
+sub = parser.add_subparsers(dest="command", required=True)
+sub.add_parser("status", help="show applied and pending migrations")
+upgrade = sub.add_parser("upgrade", help="apply pending migrations")
+upgrade.add_argument("--target", type=int, default=None, help="stop after this version")
+args = parser.parse_args()
+
+if args.command == "status":
+    conn = connect()
+    try:
+        version = current_version(conn)
+    finally:
+        conn.close()
+    print(f"current version: {version}, latest: {latest_version()}")
+    for number, module in load_migrations():
+        state = "applied" if number <= version else "pending"
+        print(f"  {number:04d} {state:8} {module.DESCRIPTION}")
+else:
+    applied = migrate(args.target, verbose=True)
+    print(f"applied {len(applied)} migration(s)" if applied else "already up to date")
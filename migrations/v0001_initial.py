@@ -0,0 +1,199 @@
+# baseline: the schema and seed data main.init_db used to create at startup.
+# everything is idempotent, so databases created by init_db pass through.
+
+DESCRIPTION = "initial schema"
+
+def upgrade(conn):
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS roles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            german_name TEXT UNIQUE NOT NULL
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            firstname TEXT,
+            lastname TEXT,
+            password TEXT NOT NULL,
+            role INTEGER,
+            class INTEGER,
+            FOREIGN KEY(role) REFERENCES roles(id)
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS classes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            german_name TEXT UNIQUE NOT NULL
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tutoring (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user INTEGER NOT NULL,
+            subjects TEXT,
+            FOREIGN KEY(user) REFERENCES users(id)
+        )
+        """
+    )
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS push_subscriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            endpoint TEXT NOT NULL,
+            p256dh TEXT NOT NULL,
+            auth TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            UNIQUE(endpoint)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS wlan_codes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_ids INTEGER NOT NULL,
+            code TEXT NOT NULL,
+            expiry DATETIME NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS wlan_vouchers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,
+            class_id INTEGER,
+            role_id INTEGER,
+            expiry DATETIME NOT NULL,
+            claimed_by INTEGER,
+            claimed_at DATETIME,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(class_id) REFERENCES classes(id),
+            FOREIGN KEY(role_id) REFERENCES roles(id),
+            FOREIGN KEY(claimed_by) REFERENCES users(id)
+        )
+    """)
+    # partial indexes: the claim path only ever looks at free vouchers,
+    # the "already claimed?" check only at claimed ones
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_wlan_vouchers_free ON wlan_vouchers(class_id, role_id, id) WHERE claimed_by IS NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_wlan_vouchers_claimed_by ON wlan_vouchers(claimed_by) WHERE claimed_by IS NOT NULL")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS parentnotifications (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            body TEXT NOT NULL,
+            feedback TEXT NOT NULL,
+            attachments TEXT,
+            user_ids TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_keys (
+            user_id INTEGER PRIMARY KEY,
+            hashed_key TEXT NOT NULL,
+            kdf_salt TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    # kdf_salt was added later; NULL marks a legacy sha256 key
+    cursor.execute("PRAGMA table_info(user_keys)")
+    if "kdf_salt" not in [c["name"] for c in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE user_keys ADD COLUMN kdf_salt TEXT")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS key_rotations (
+            user_id INTEGER PRIMARY KEY,
+            new_hashed_key TEXT NOT NULL,
+            new_kdf_salt TEXT NOT NULL,
+            last_secret_id INTEGER NOT NULL DEFAULT 0,
+            processed INTEGER NOT NULL DEFAULT 0,
+            started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS unlock_sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            wrapped_key TEXT NOT NULL,
+            last_used REAL NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS secrets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            encrypted_value TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            UNIQUE(user_id, name)
+        )
+    """)
+
+    # seed subjects
+    subjects = {
+        "german": "Deutsch",
+        "english": "Englisch",
+        "french": "Französisch",
+        "latin": "Latein",
+        "spanish": "Spanisch",
+        "italian": "Italienisch",
+        "maths": "Mathematik",
+        "physics": "Physik",
+        "chemistry": "Chemie",
+        "biology": "Biologie",
+        "cs": "Informatik",
+        "nut": "Natur und Technik",
+        "history": "Geschichte",
+        "geography": "Geographie",
+        "economics": "Wirtschaft und Recht",
+        "politics": "Politik und Gesellschaft",
+        "business-cs": "Wirtschaftsinformatik",
+        "art": "Kunst",
+        "music": "Musik",
+        "pe": "Sport",
+        "catholic": "Katholische Religionslehre",
+        "evangelic": "Evangelische Religionslehre",
+        "ethics": "Ethik"
+    }
+    for s in subjects.keys():
+        cursor.execute("INSERT OR IGNORE INTO subjects(name, german_name) VALUES(?, ?)", (s, subjects[s],))
+
+    # seed roles
+    roles = {
+        "student": "Schüler",
+        "teacher": "Lehrer",
+        "parent": "Elternteil",
+        "administration": "Verwaltung"
+    }
+    for r in roles.keys():
+        cursor.execute("INSERT OR IGNORE INTO roles(name, german_name) VALUES(?, ?)", (r, roles[r],))
+
+    # standard user
+    cursor.execute("INSERT OR IGNORE INTO users (username, firstname, lastname, password, role, class) VALUES ('admin', 'Max', 'Mustermann', '$argon2id$v=19$m=65536,t=3,p=4$rv8/JsLAAwnC8sC/T2cabw$bMBb9Xycyd5MMFXvEF3ni2KCcfROc/jMrIM9sGk70U8', '4', NULL)") # pw: AdminPW (change!)
@@ -0,0 +1,29 @@
+# indexes for the lookups the services do on every request. built one at a
+# time outside a single big transaction, see migrations.create_index.
+from migrations import create_index
+
+DESCRIPTION = "indexes for service queries"
+TRANSACTIONAL = False
+
+def upgrade(conn):
+    # get_class_s / get_classes_s / delete_class_s
+    create_index(conn, "CREATE INDEX IF NOT EXISTS idx_users_class_role ON users(class, role)")
+    # get_users_s orders by role, lastname, firstname
+    create_index(conn, "CREATE INDEX IF NOT EXISTS idx_users_role_name ON users(role, lastname, firstname)")
+    # push_user / push status
+    create_index(conn, "CREATE INDEX IF NOT EXISTS idx_push_subscriptions_user_id ON push_subscriptions(user_id)")
+    # get_profile / get_subjects_s / edit_profile
+    create_index(conn, "CREATE INDEX IF NOT EXISTS idx_tutoring_user ON tutoring(user)")
+    create_index(conn, "CREATE INDEX IF NOT EXISTS idx_parentnotifications_created_at ON parentnotifications(created_at)")
+    # expiry cleanup in get_wlan_codes / delete_expired_wlan_vouchers_s
+    create_index(conn, "CREATE INDEX IF NOT EXISTS idx_wlan_codes_expiry ON wlan_codes(expiry)")
+    create_index(conn, "CREATE INDEX IF NOT EXISTS idx_wlan_vouchers_expiry ON wlan_vouchers(expiry)")
+    # claim_wlan_voucher_s walks the free vouchers in id order and stops at the
+    # first match; the (class_id, role_id, id) index could not serve that order
+    create_index(conn, "CREATE INDEX IF NOT EXISTS idx_wlan_vouchers_free_id ON wlan_vouchers(id) WHERE claimed_by IS NULL")
+    conn.execute("DROP INDEX IF EXISTS idx_wlan_vouchers_free")
+    create_index(conn, "CREATE INDEX IF NOT EXISTS idx_unlock_sessions_user_id ON unlock_sessions(user_id)")
+    create_index(conn, "CREATE INDEX IF NOT EXISTS idx_unlock_sessions_last_used ON unlock_sessions(last_used)")
+
+    # give the planner statistics for the new indexes
+    conn.execute("ANALYZE")
@@ -0,0 +1,12 @@
+# class rosters page through members of one class and role in lastname order;
+# (class, role, lastname) serves the counts and every page from the index.
+# it also covers everything idx_users_class_role was used for.
+from migrations import create_index
+
+DESCRIPTION = "class roster index"
+TRANSACTIONAL = False
+
+def upgrade(conn):
+    create_index(conn, "CREATE INDEX IF NOT EXISTS idx_users_class_role_lastname ON users(class, role, lastname)")
+    conn.execute("DROP INDEX IF EXISTS idx_users_class_role")
+    conn.execute("ANALYZE users")
@@ -0,0 +1,27 @@
+# scheduled pushes, one row per recipient. the push scheduler picks up due
+# rows per user, so everything due for one user at a tick goes out as a
+# single push. rows are deleted once delivered or cancelled.
+DESCRIPTION = "push queue"
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS push_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            batch TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            body TEXT NOT NULL,
+            target TEXT NOT NULL,
+            topic TEXT,
+            urgency TEXT NOT NULL DEFAULT 'normal',
+            ttl INTEGER NOT NULL,
+            send_at DATETIME NOT NULL,
+            claimed_at DATETIME,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    # due rows in send_at order, and all rows of one user once picked
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_push_queue_send_at ON push_queue(send_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_push_queue_user_send_at ON push_queue(user_id, send_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_push_queue_batch ON push_queue(batch)")
@@ -0,0 +1,43 @@
+# which user has answered which parent notification, so the list endpoint
+# can return an answered flag without opening every feedback file. filled
+# from the existing feedback files once, feedback_s keeps it up to date.
+import json
+import os
+from pathlib import Path
+
+# the same lookup as parentnotification_service, kept here so the migration
+# does not change with the service
+FEEDBACK_DIR = os.getenv("FEEDBACK_DIR", "parent_notification_feedback")
+
+DESCRIPTION = "parent notification answers"
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS parentnotification_answers (
+            notification_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            answered_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY(notification_id, user_id),
+            FOREIGN KEY(notification_id) REFERENCES parentnotifications(id) ON DELETE CASCADE,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+
+    rows = []
+    for file in Path(FEEDBACK_DIR).glob("*.json"):
+        if not file.stem.isdigit():
+            continue
+        try:
+            data = json.loads(file.read_text(encoding="utf-8"))
+        except ValueError:
+            continue
+        for user_id in data.get("feedbacks", {}):
+            if user_id.isdigit():
+                rows.append((int(file.stem), int(user_id)))
+    conn.executemany(
+        """
+        INSERT OR IGNORE INTO parentnotification_answers (notification_id, user_id)
+        SELECT id, ? FROM parentnotifications WHERE id = ?
+        """,
+        [(user_id, notification_id) for notification_id, user_id in rows],
+    )
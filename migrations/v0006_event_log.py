@@ -0,0 +1,18 @@
+# events for the SSE channel (see events.py). services write a row in the
+# same transaction as the change it announces; every worker reads new rows
+# and fans them out to its own clients. ids are never reused, clients resume
+# with Last-Event-ID. old rows are pruned by the workers.
+DESCRIPTION = "event log"
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS event_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event TEXT NOT NULL,
+            data TEXT NOT NULL,
+            user_ids TEXT,
+            role TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_event_log_created_at ON event_log(created_at)")
@@ -0,0 +1,15 @@
+# parent notification attachments stored by content (see
+# services/attachment_service.py): one row per distinct file, however many
+# notifications point to it
+DESCRIPTION = "attachment store"
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS attachments (
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mime TEXT NOT NULL,
+            name TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    """)
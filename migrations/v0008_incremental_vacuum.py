@@ -0,0 +1,12 @@
+# auto_vacuum=INCREMENTAL lets the maintenance run (maintenance.py) hand free
+# pages back with PRAGMA incremental_vacuum. the mode of an existing database
+# only changes with a full VACUUM, which rewrites the file once and holds the
+# database for its duration
+DESCRIPTION = "incremental auto-vacuum"
+TRANSACTIONAL = False
+
+def upgrade(conn):
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
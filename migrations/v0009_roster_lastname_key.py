@@ -0,0 +1,12 @@
+# rosters order and page by COALESCE(lastname, '') so members without a
+# lastname are not lost between pages; the roster index has to use the same
+# expression to keep serving those pages
+from migrations import create_index
+
+DESCRIPTION = "roster index on COALESCE(lastname, '')"
+TRANSACTIONAL = False
+
+def upgrade(conn):
+    conn.execute("DROP INDEX IF EXISTS idx_users_class_role_lastname")
+    create_index(conn, "CREATE INDEX IF NOT EXISTS idx_users_class_role_lastname ON users(class, role, COALESCE(lastname, ''))")
+    conn.execute("ANALYZE users")
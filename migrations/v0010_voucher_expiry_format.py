@@ -0,0 +1,15 @@
+# voucher expiries are compared with CURRENT_TIMESTAMP as text. ISO times
+# like "2026-10-19T08:00:00" (or with an offset) sort after every time of
+# that day, so such a voucher could be claimed after it expired. uploads
+# store "YYYY-MM-DD HH:MM:SS" in UTC now; this brings the existing rows to
+# the same form. values that already start that way are left alone,
+# unparseable ones too
+
+DESCRIPTION = "voucher expiries in CURRENT_TIMESTAMP form"
+
+def upgrade(conn):
+    conn.execute("""
+        UPDATE wlan_vouchers
+        SET expiry = strftime('%Y-%m-%d %H:%M:%S', expiry)
+        WHERE substr(expiry, 1, 19) <> strftime('%Y-%m-%d %H:%M:%S', expiry)
+    """)
@@ -1,4 +1,5 @@
-from typing import Optional
+from datetime import datetime
+from typing import Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -10,9 +11,41 @@ class CreateUserRequest(BaseModel):
     role: int = Field(..., ge=1, le=4)
     class_id: Optional[int] = Field(None, alias="class", ge=0, le=9999)
 
+class BulkUserOperation(BaseModel):
+    # create needs username, firstname, lastname and role; update, move and
+    # delete need id. move sets class (null for none); update changes the
+    # fields that are given
+    op: Literal["create", "update", "move", "delete"]
+    id: Optional[int] = Field(None, ge=1)
+    username: Optional[str] = Field(None, min_length=1, max_length=50)
+    firstname: Optional[str] = Field(None, max_length=50)
+    lastname: Optional[str] = Field(None, max_length=50)
+    password: Optional[str] = Field(None, max_length=50)
+    role: Optional[int] = Field(None, ge=1, le=4)
+    class_id: Optional[int] = Field(None, alias="class", ge=0, le=9999)
+
+class BulkUsersRequest(BaseModel):
+    operations: list[BulkUserOperation] = Field(..., min_length=1, max_length=1000)
+    # apply nothing when any operation fails
+    atomic: bool = False
+
 class CreateClassRequest(BaseModel):
     name: str = Field(..., max_length=50, alias="className")
 
 class PushSubscription(BaseModel):
     endpoint: str = Field(..., max_length=500)
-    keys: dict[str, str]
\ No newline at end of file
+    keys: dict[str, str]
+
+class SchedulePushRequest(BaseModel):
+    title: str = Field(..., max_length=100)
+    body: str = Field(..., max_length=800)
+    # without a time the push goes out with the next queue run; times without
+    # a timezone are UTC
+    send_at: Optional[datetime] = None
+    # no audience means every user
+    user_ids: Optional[list[int]] = Field(None, min_length=1, max_length=5000)
+    class_id: Optional[int] = Field(None, ge=0, le=9999)
+    role_id: Optional[int] = Field(None, ge=1, le=4)
+    topic: Optional[str] = Field(None, max_length=32, pattern=r"^[A-Za-z0-9_-]+$")
+    urgency: Literal["very-low", "low", "normal", "high"] = "normal"
+    ttl: int = Field(24 * 60 * 60, ge=0, le=28 * 24 * 60 * 60)
@@ -0,0 +1,168 @@
+import cProfile
+import os
+import pstats
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException, Request
+
+from api.v1.deps import require_role
+
+# on-demand profiling of single requests. an admin adds "X-Profile: 1" or
+# "?profile=1" to a request; it then runs under cProfile and the stats are
+# written to PROFILE_DIR as a .pstats file (snakeviz, flameprof, gprof2dot and
+# py-spy's speedscope converter read these). GET /metrics/profiles lists them.
+# a request without the flag costs a look at the query string and headers.
+# off in production (ENV=production) unless PROFILING=1; PROFILING=0 leaves
+# the middleware out everywhere.
+# cProfile only sees the thread it is enabled on. the event loop thread is
+# profiled as a whole, so requests running at the same time show up there as
+# well; the work a profiled request hands to asyncio.to_thread (SQL, argon2,
+# encryption) is profiled in the worker thread by ProfilingExecutor, the
+# loop's default executor, and merged into the same file (the total time then
+# counts the loop's wait and the worker's run both). threads started
+# some other way (starlette's threadpool for sync dependencies and file
+# responses) are not profiled.
+
+PROFILING_ENABLED = os.getenv("PROFILING", "0" if os.getenv("ENV") == "production" else "1") != "0"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# older profiles are deleted beyond this
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+_PROFILE_HEADER = b"x-profile"
+_SLUG_RE = re.compile(r"[^A-Za-z0-9]+")
+# <timestamp>_<method>_<path slug>_<ms>ms, as written by _save
+_NAME_RE = re.compile(r"^(\d+)_([A-Z]+)_([A-Za-z0-9-]+)_(\d+)ms$")
+
+# cProfile can only run one profiler per thread
+_profiling = threading.Lock()
+_require_admin = require_role(4)
+# profilers of the current request's worker thread calls, None when the
+# request is not profiled
+_thread_profiles = ContextVar("thread_profiles", default=None)
+
+def _requested(scope) -> bool:
+    query = scope["query_string"]
+    # parsed only when it can be there at all
+    if b"profile" in query and parse_qs(query.decode("latin-1")).get("profile", [""])[-1] == "1":
+        return True
+    for name, value in scope["headers"]:
+        if name == _PROFILE_HEADER:
+            return value == b"1"
+    return False
+
+def profile_path(name: str) -> Path:
+    # only plain names from list_profiles(), no paths
+    if "/" in name or "\\" in name or not name.endswith(".pstats"):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path = Path(PROFILE_DIR) / name
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return path
+
+def list_profiles():
+    directory = Path(PROFILE_DIR)
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in sorted(directory.glob("*.pstats"), reverse=True):
+        match = _NAME_RE.match(path.stem)
+        if match is None:
+            # not ours (copied in by hand), skipped
+            continue
+        stamp, method, slug, duration = match.groups()
+        profiles.append({
+            "name": path.name,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(int(stamp) / 1000)),
+            "method": method,
+            "path": slug,
+            "duration_ms": int(duration),
+            "size": path.stat().st_size,
+        })
+    return profiles
+
+class ProfilingExecutor(ThreadPoolExecutor):
+    # asyncio.to_thread submits from the calling request's context, so a
+    # call of a profiled request runs under a profiler of its own here
+    def submit(self, fn, /, *args, **kwargs):
+        profiles = _thread_profiles.get()
+        if profiles is None:
+            return super().submit(fn, *args, **kwargs)
+
+        def profiled():
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+                profiles.append(profiler)
+
+        return super().submit(profiled)
+
+def install_executor(loop):
+    # from the lifespan hook, before any to_thread call
+    loop.set_default_executor(ProfilingExecutor())
+
+def _save(profiler, thread_profiles, scope, seconds):
+    directory = Path(PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = _SLUG_RE.sub("-", scope["path"]).strip("-")[:60] or "root"
+    name = f"{int(time.time() * 1000)}_{scope['method']}_{slug}_{int(seconds * 1000)}ms.pstats"
+    stats = pstats.Stats(profiler)
+    for thread_profiler in thread_profiles:
+        stats.add(thread_profiler)
+    stats.dump_stats(directory / name)
+
+    for old in sorted(directory.glob("*.pstats"), reverse=True)[PROFILE_KEEP:]:
+        old.unlink(missing_ok=True)
+    return name
+
+class ProfilingMiddleware:
+    # must sit inside SessionMiddleware, the admin check reads the session
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await _require_admin(Request(scope))
+        except HTTPException:
+            # not an admin, the flag is ignored
+            await self.app(scope, receive, send)
+            return
+
+        if not _profiling.acquire(blocking=False):
+            # another request is being profiled
+            await self.app(scope, receive, send)
+            return
+
+        profiler = cProfile.Profile()
+        thread_profiles = []
+        token = _thread_profiles.set(thread_profiles)
+        start = time.perf_counter()
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-profile", b"recorded")]
+            await send(message)
+
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_profile)
+            finally:
+                profiler.disable()
+                _thread_profiles.reset(token)
+            name = _save(profiler, thread_profiles, scope, time.perf_counter() - start)
+        finally:
+            _profiling.release()
+        print(f"Profiled {scope['method']} {scope['path']} -> {PROFILE_DIR}/{name}")
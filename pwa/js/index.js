@@ -86,27 +86,33 @@ async function wlanCodesCheck() {
 	const response = await fetch("/api/v1/wlan/");
 	const data = await response.json();
 	const appWlanBox = document.getElementById("app-wlan-box");
-
-	if (data.codes.length > 0) {
-		const badge = document.createElement("div");
-		badge.classList.add("badge");
-		badge.textContent = data.codes.length;
-		appWlanBox.appendChild(badge);
-	}
+	setBadge(appWlanBox, data.codes.length);
 }
 wlanCodesCheck();
 
 // check for pns
 async function pnCheck() {
-	const response = await fetch("/api/v1/parentnotification/");
-	const data = await response.json();
+	const notifications = await syncParentNotifications();
 	const appPNBox = document.getElementById("app-parentnotification-box");
+	setBadge(appPNBox, notifications.length);
+}
+pnCheck();
 
-	if (data.parent_notifications.length > 0) {
-		const badge = document.createElement("div");
+function setBadge(box, count) {
+	let badge = box.querySelector(".badge");
+	if (count === 0) {
+		if (badge) badge.remove();
+		return;
+	}
+	if (!badge) {
+		badge = document.createElement("div");
 		badge.classList.add("badge");
-		badge.textContent = data.parent_notifications.length;
-		appPNBox.appendChild(badge);
+		box.appendChild(badge);
 	}
+	badge.textContent = count;
 }
-pnCheck();
+
+listenForEvents({
+	wlan_code: wlanCodesCheck,
+	parentnotification: pnCheck
+});
@@ -12,3 +12,74 @@ async function getProfile() {
 		window.location.href = "/app/login.html";
 	}
 }
+
+// parent notifications are kept in localStorage, only newer ones are fetched
+async function syncParentNotifications() {
+	let cache = null;
+	try {
+		cache = JSON.parse(localStorage.getItem("parentNotifications"));
+	} catch (e) {}
+	if (!cache) cache = { user_id: null, cursor: 0, items: [] };
+
+	let hasMore = true;
+	while (hasMore) {
+		const response = await fetch(
+			`/api/v1/parentnotification/sync?since=${cache.cursor}`
+		);
+		if (!response.ok) break;
+		const data = await response.json();
+
+		if (cache.user_id !== data.user_id) {
+			// another user logged in on this device, start over
+			const stale = cache.cursor !== 0;
+			cache = { user_id: data.user_id, cursor: 0, items: [] };
+			if (stale) continue;
+		}
+
+		cache.items.push(...data.parent_notifications);
+		cache.cursor = data.cursor;
+		hasMore = data.has_more;
+	}
+
+	localStorage.setItem("parentNotifications", JSON.stringify(cache));
+	return cache.items;
+}
+
+function markParentNotificationAnswered(notificationId, userId) {
+	let cache = null;
+	try {
+		cache = JSON.parse(localStorage.getItem("parentNotifications"));
+	} catch (e) {}
+	// admins also get the feedback of other users
+	if (!cache || cache.user_id !== userId) return;
+
+	const notification = cache.items.find((n) => n.id === notificationId);
+	if (notification) notification.answered = 1;
+	localStorage.setItem("parentNotifications", JSON.stringify(cache));
+}
+
+// live updates from the server, so pages don't have to be reloaded.
+// handlers maps event names (wlan_code, parentnotification, feedback) to
+// functions taking the event data. EventSource reconnects on its own and
+// sends the last event id, missed events are delivered then
+function listenForEvents(handlers) {
+	if (!window.EventSource) return null;
+
+	const source = new EventSource("/api/v1/events/");
+	for (const [event, handler] of Object.entries(handlers)) {
+		source.addEventListener(event, (e) => handler(JSON.parse(e.data)));
+	}
+	return source;
+}
+
+// attachments are file names in /files (older notifications) or uploads
+// from the attachment store as { id, name }
+function attachmentLink(attachment) {
+	if (typeof attachment === "string") {
+		return { href: `/files/${attachment}`, name: attachment };
+	}
+	return {
+		href: `/api/v1/attachments/${attachment.id}?name=${encodeURIComponent(attachment.name)}`,
+		name: attachment.name
+	};
+}
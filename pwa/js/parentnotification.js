@@ -8,10 +8,9 @@ async function main() {
 	const foundSomeMain = document.getElementById("page-foundsome");
 	const notificationsEl = document.getElementById("notifications");
 
-	const response = await fetch("/api/v1/parentnotification/");
-	const data = await response.json();
+	const notifications = await syncParentNotifications();
 
-	if (data.parent_notifications.length > 0) {
+	if (notifications.length > 0) {
 		if (noneFoundMain) noneFoundMain.style.display = "none";
 		if (foundSomeMain) foundSomeMain.style.display = "block";
 	} else {
@@ -47,10 +46,8 @@ async function main() {
 		return output;
 	}
 
-	data.parent_notifications.forEach((notification) => {
-		const notificationEl = document.createElement("div");
-		notificationEl.classList.add("notification-el");
-
+	// the list has no bodies, a notification is loaded when it is opened
+	function buildContent(notification) {
 		// attachments
 		const att = JSON.parse(notification.attachments);
 		const attachments =
@@ -63,8 +60,8 @@ async function main() {
                     ${att
 						.map(
 							(a) => `
-                            <a href="/files/${a}" target="_blank">
-                                <button class="small">${a}</button>
+                            <a href="${attachmentLink(a).href}" target="_blank">
+                                <button class="small">${attachmentLink(a).name}</button>
                             </a>`
 						)
 						.join("")}
@@ -92,6 +89,18 @@ async function main() {
                 </details>`
 				: `<span class="mini-info">Keine Rückmeldung</span>`;
 
+		return `
+            <span class="body">${notification.body}</span>
+            ${attachmentsEl}
+            ${feedbackEl}
+        `;
+	}
+
+	notificationsEl.innerHTML = "";
+	notifications.forEach((notification) => {
+		const notificationEl = document.createElement("div");
+		notificationEl.classList.add("notification-el");
+
 		// date
 		const date = new Date(notification.created_at);
 		const dtString = date.toLocaleString("de-DE", {
@@ -102,17 +111,45 @@ async function main() {
 			minute: "2-digit",
 			hour12: false
 		});
+		const status = notification.has_feedback
+			? notification.answered
+				? " · beantwortet"
+				: " · Rückmeldung erbeten"
+			: "";
 		notificationEl.innerHTML = `
             <div>
                 <span class="title">${notification.title}</span>
-                <span class="body">${notification.body}</span>
             </div>
-            ${attachmentsEl}
-            ${feedbackEl}
-            <span class="mini-info">erstellt am ${dtString}</span>
+            <details class="subject-group">
+                <summary>Elternbrief öffnen</summary>
+                <div class="notification-content">Wird geladen...</div>
+            </details>
+            <span class="mini-info">erstellt am ${dtString}${status}</span>
         `;
+
+		const details = notificationEl.querySelector("details");
+		const content = notificationEl.querySelector(".notification-content");
+		details.addEventListener("toggle", async () => {
+			if (!details.open || details.dataset.loaded) return;
+			const response = await fetch(
+				`/api/v1/parentnotification/${notification.id}`
+			);
+			if (!response.ok) {
+				content.textContent = "Elternbrief konnte nicht geladen werden.";
+				return;
+			}
+			content.innerHTML = buildContent(await response.json());
+			details.dataset.loaded = "1";
+		});
 		notificationsEl.appendChild(notificationEl);
 	});
 }
 
 main();
+listenForEvents({
+	parentnotification: main,
+	feedback: (data) => {
+		markParentNotificationAnswered(data.notification_id, data.user_id);
+		main();
+	}
+});
@@ -78,6 +78,38 @@ async function main() {
 			});
 	}
 
+	// unlock once, then read with the session token
+	let unlockToken = sessionStorage.getItem("pw-unlock-token");
+
+	async function unlock() {
+		const key = prompt("Entschlüsselungs-Key: ");
+		if (!key) return null;
+
+		const response = await fetch("/api/v1/pw/unlock", {
+			method: "POST",
+			headers: {
+				"Content-Type": "application/json"
+			},
+			body: JSON.stringify({ unlock_key: key })
+		});
+		const data = await response.json();
+
+		if (!response.ok) {
+			alert(data.detail || "Fehler beim Entsperren.");
+			return null;
+		}
+
+		unlockToken = data.unlock_token;
+		sessionStorage.setItem("pw-unlock-token", unlockToken);
+		return unlockToken;
+	}
+
+	function readSecret(name) {
+		return fetch(`/api/v1/pw/read/${encodeURIComponent(name)}`, {
+			headers: { "X-Unlock-Token": unlockToken }
+		});
+	}
+
 	document.getElementById("create-pw").onclick = () => {
 		create_pw();
 	};
@@ -95,14 +127,15 @@ async function main() {
 			passwordsEl.appendChild(newEl);
 
 			document.getElementById(`view-${pw.name}`).onclick = async () => {
-				const key = prompt("Entschlüsselungs-Key: ");
-
-				if (!key) return; // User cancelled
+				if (!unlockToken && !(await unlock())) return; // User cancelled
 
 				try {
-					const response = await fetch(
-						`/api/v1/pw/read/${pw.name}?unlock_key=${encodeURIComponent(key)}`
-					);
+					let response = await readSecret(pw.name);
+					if (response.status === 401) {
+						// unlock session expired
+						if (!(await unlock())) return;
+						response = await readSecret(pw.name);
+					}
 					const data = await response.json();
 
 					if (response.ok) {
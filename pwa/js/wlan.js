@@ -19,6 +19,7 @@ async function main() {
 		if (foundSomeMain) foundSomeMain.style.display = "none";
 	}
 
+	codesEl.innerHTML = "";
 	data.codes.forEach((code) => {
 		const codeEl = document.createElement("div");
 		codeEl.classList.add("code-el");
@@ -42,3 +43,4 @@ async function main() {
 }
 
 main();
+listenForEvents({ wlan_code: main });
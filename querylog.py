@@ -0,0 +1,263 @@
+import glob
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+
+import metrics
+
+# SQL instrumentation for get_db(): connections record every statement with
+# its duration (execute plus fetches) and row count. when a connection is
+# closed its statements are
+#   - added to the current request's stats (Server-Timing header, N+1 warning),
+#   - added to this worker's top queries,
+#   - printed when slower than SLOW_QUERY_MS.
+# GET /metrics/queries shows the top queries of all workers on the host: each
+# worker's are written next to its metrics (METRICS_DIR/queries-<worker>.json,
+# see metrics.py) and added up when asked for.
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# the same statement this many times in one request is most likely a loop
+REPEATED_QUERY_WARN = int(os.getenv("REPEATED_QUERY_WARN", "10"))
+# distinct statements kept for the top queries view
+TOP_QUERIES_MAX = 500
+
+_request_queries = ContextVar("request_queries", default=None)
+
+_top_queries = {}  # normalized sql -> [count, total_s, max_s, rows]
+_top_queries_lock = threading.Lock()
+_reset_seen = None  # mtime of the last reset marker applied
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_PLACEHOLDER_LIST_RE = re.compile(r"\?(?:\s*,\s*\?)+")
+
+def normalize(sql: str) -> str:
+    # IN (?, ?, ?) lists built with f-strings count as one statement
+    return _PLACEHOLDER_LIST_RE.sub("?, ...", _WHITESPACE_RE.sub(" ", sql).strip())
+
+class RequestQueries:
+    __slots__ = ("connections", "queries", "seconds", "statements")
+
+    def __init__(self):
+        self.connections = 0
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements = {}  # normalized sql -> executions
+
+class InstrumentedCursor(sqlite3.Cursor):
+    _record = None
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record = self.connection._add_record(sql, time.perf_counter() - start, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record = self.connection._add_record(sql, time.perf_counter() - start, max(self.rowcount, 0))
+
+    # sqlite steps through the result while fetching, so that time counts too
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        if self._record is not None:
+            self._record[1] += time.perf_counter() - start
+            self._record[2] += row is not None
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if self._record is not None:
+            self._record[1] += time.perf_counter() - start
+            self._record[2] += len(rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        if self._record is not None:
+            self._record[1] += time.perf_counter() - start
+            self._record[2] += len(rows)
+        return rows
+
+class InstrumentedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._records = []  # [sql, seconds, rows]
+        stats = _request_queries.get()
+        if stats is not None:
+            stats.connections += 1
+
+    def _add_record(self, sql, seconds, rows):
+        record = [sql, seconds, rows]
+        self._records.append(record)
+        return record
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def flush(self):
+        # hands the recorded statements on; long-lived connections (the
+        # writer thread's) call this after each unit of work
+        records, self._records = self._records, []
+        _finish(records)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            super().close()
+
+def _finish(records):
+    if not records:
+        return
+    stats = _request_queries.get()
+    with _top_queries_lock:
+        for sql, seconds, rows in records:
+            key = normalize(sql)
+            entry = _top_queries.get(key)
+            if entry is None:
+                if len(_top_queries) >= TOP_QUERIES_MAX:
+                    # full, drop the statement with the least total time
+                    del _top_queries[min(_top_queries, key=lambda k: _top_queries[k][1])]
+                entry = _top_queries[key] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += rows
+
+            if stats is not None:
+                stats.queries += 1
+                stats.seconds += seconds
+                stats.statements[key] = stats.statements.get(key, 0) + 1
+
+            if seconds * 1000 >= SLOW_QUERY_MS:
+                print(f"Slow query ({seconds * 1000:.1f} ms, {rows} rows): {key}")
+
+def _snapshot():
+    # a reset from another worker clears this one's statements too
+    global _reset_seen
+    try:
+        reset_at = os.path.getmtime(os.path.join(metrics.METRICS_DIR, "queries.reset"))
+    except OSError:
+        reset_at = None
+    with _top_queries_lock:
+        if reset_at is not None and reset_at != _reset_seen:
+            _reset_seen = reset_at
+            _top_queries.clear()
+        return {sql: entry[:] for sql, entry in _top_queries.items()}
+
+def _merge(into, data):
+    for sql, (count, total, longest, rows) in data.items():
+        entry = into.get(sql)
+        if entry is None:
+            into[sql] = [count, total, longest, rows]
+        else:
+            entry[0] += count
+            entry[1] += total
+            entry[2] = max(entry[2], longest)
+            entry[3] += rows
+    return into
+
+def _fold(archive, data):
+    archive = _merge(archive or {}, data)
+    if len(archive) > TOP_QUERIES_MAX:
+        archive = dict(sorted(archive.items(), key=lambda i: i[1][1], reverse=True)[:TOP_QUERIES_MAX])
+    return archive
+
+metrics.register_worker_file("queries", _snapshot, _fold)
+
+def top_queries(sort="total", limit=50):
+    sort_keys = {
+        "total": lambda i: i["total_ms"],
+        "count": lambda i: i["count"],
+        "max": lambda i: i["max_ms"],
+        "mean": lambda i: i["mean_ms"],
+        "rows": lambda i: i["rows"],
+    }
+    if metrics.METRICS_DIR:
+        metrics.write_worker_file("queries")
+        archive, live = metrics.read_worker_files("queries")
+        merged = {}
+        for data in [archive or {}, *live.values()]:
+            _merge(merged, data)
+    else:
+        merged = _snapshot()
+    items = [
+        {
+            "sql": sql,
+            "count": count,
+            "total_ms": round(total * 1000, 3),
+            "mean_ms": round(total * 1000 / count, 3),
+            "max_ms": round(longest * 1000, 3),
+            "rows": rows,
+        }
+        for sql, (count, total, longest, rows) in merged.items()
+    ]
+    items.sort(key=sort_keys[sort], reverse=True)
+    return items[:limit]
+
+def reset_top_queries():
+    global _reset_seen
+    with _top_queries_lock:
+        _top_queries.clear()
+    if not metrics.METRICS_DIR:
+        return
+    # the marker's mtime tells the other workers to clear theirs when they
+    # next write their file; until then their old files are gone
+    os.makedirs(metrics.METRICS_DIR, exist_ok=True)
+    marker = os.path.join(metrics.METRICS_DIR, "queries.reset")
+    with open(marker, "w"):
+        pass
+    with _top_queries_lock:
+        _reset_seen = os.path.getmtime(marker)
+    for path in glob.glob(os.path.join(metrics.METRICS_DIR, "queries-*.json")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class QueryStatsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueries()
+        token = _request_queries.set(stats)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timing = (
+                    f'db;dur={stats.seconds * 1000:.2f};desc="{stats.queries} queries, {stats.connections} connections", '
+                    f"app;dur={(time.perf_counter() - start) * 1000:.2f}"
+                )
+                message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_queries.reset(token)
+            for sql, count in stats.statements.items():
+                if count >= REPEATED_QUERY_WARN:
+                    print(f"{scope['method']} {scope['path']} ran the same query {count} times: {sql}")
@@ -0,0 +1,93 @@
+import random
+import sqlite3
+import threading
+import time
+
+from limits.storage import Storage
+
+# rate limit counters in a local SQLite file, so all uvicorn workers on the
+# host count against the same limits. registered for sqlite:///<path> URIs.
+# only the fixed-window strategy (slowapi default) is supported; every hit is
+# a single UPSERT ... RETURNING in autocommit mode, atomic across processes.
+class SQLiteStorage(Storage):
+    STORAGE_SCHEME = ["sqlite"]
+
+    # share of incr() calls that also purge expired counters
+    PURGE_PROBABILITY = 0.001
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri[len("sqlite:///"):] if uri.startswith("sqlite:///") else uri[len("sqlite://"):]
+        self.timeout = float(options.get("timeout", 5.0))
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS limiter_counters (
+                key TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                expiry REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread, kept open: opening a connection costs
+        # more than the counter update itself
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # counters are disposable, losing the last few on a power cut is fine
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            """
+            INSERT INTO limiter_counters (key, count, expiry) VALUES (?1, ?2, ?3 + ?4)
+            ON CONFLICT(key) DO UPDATE SET
+                count = CASE WHEN expiry <= ?3 THEN ?2 ELSE count + ?2 END,
+                expiry = CASE WHEN expiry <= ?3 THEN ?3 + ?4 ELSE expiry END
+            RETURNING count
+            """,
+            (key, amount, now, expiry),
+        ).fetchone()
+
+        if random.random() < self.PURGE_PROBABILITY:
+            conn.execute("DELETE FROM limiter_counters WHERE expiry <= ?", (now,))
+        return row[0]
+
+    def get(self, key: str) -> int:
+        row = self._conn().execute(
+            "SELECT count FROM limiter_counters WHERE key = ? AND expiry > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT expiry FROM limiter_counters WHERE key = ? AND expiry > ?",
+            (key, now),
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            self._conn().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int | None:
+        return self._conn().execute("DELETE FROM limiter_counters").rowcount
+
+    def clear(self, key: str) -> None:
+        self._conn().execute("DELETE FROM limiter_counters WHERE key = ?", (key,))
@@ -6,6 +6,7 @@ from services.wlan_service import get_wlan_codes
 from services.tutoring_service import all_tutors_s
 from services.parentnotification_service import get_parentnotifications_s
 from definitions import templates
+from profiling import list_profiles
 
 def root_s(request, session_data):
     with get_db() as conn:
@@ -52,6 +53,7 @@ def root_s(request, session_data):
             "users": users[0:4],
             "wlan_codes": wlan_codes[0:4],
             "tutors": tutors[0:3],
-            "notifications": notifications[0:4]
+            "notifications": notifications[0:4],
+            "profiles": list_profiles()[0:4]
         }
-        return templates.TemplateResponse("dashboard.html", context)
\ No newline at end of file
+        return templates.TemplateResponse(request, "dashboard.html", context)
\ No newline at end of file
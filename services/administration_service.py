@@ -1,13 +1,41 @@
-import json
+import csv
+import io
+import os
 import secrets
 import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from fastapi import HTTPException
-from pywebpush import webpush
-from api.v1.deps import get_db, hash_password
-from definitions import VAPID_PRIVATE_KEY, VAPID_EMAIL
+from api.v1.deps import USER_DEPENDENTS, db_write, get_db, get_read_db, hash_password
+from services.push_service import deliver_push, enqueue_push, select_push_subscriptions
+from events import parse_user_ids, publish_event
+
+# roles and classes bulk operations are checked against. roles do not change
+# at runtime; classes created or deleted through this worker reset the cache,
+# other workers' changes show up after REFERENCE_CACHE_TTL seconds
+REFERENCE_CACHE_TTL = 30
+# argon2 releases the GIL, so new users' passwords are hashed side by side
+BULK_HASH_WORKERS = min(os.cpu_count() or 1, 8)
+
+_reference_ids = None  # (loaded at, role ids, class ids)
+
+def reference_ids():
+    global _reference_ids
+    cached = _reference_ids
+    if cached is None or time.monotonic() - cached[0] >= REFERENCE_CACHE_TTL:
+        with get_read_db() as conn:
+            roles = {r["id"] for r in conn.execute("SELECT id FROM roles").fetchall()}
+            classes = {r["id"] for r in conn.execute("SELECT id FROM classes").fetchall()}
+        cached = _reference_ids = (time.monotonic(), roles, classes)
+    return cached[1], cached[2]
+
+def invalidate_reference_ids():
+    global _reference_ids
+    _reference_ids = None
 
 def create_user_s(payload):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         # find role id
         cursor.execute("SELECT id FROM roles WHERE id = ?", (payload.role,))
@@ -21,90 +49,159 @@ def create_user_s(payload):
             cursor.execute("SELECT id FROM classes WHERE id = ?", (class_id,))
             if not cursor.fetchone():
                 raise HTTPException(status_code=400, detail="Invalid class")
-        # hash password
-        if (payload.password is None):
-            pw = secrets.token_hex(8)
-            hashed = hash_password(pw)
-        else:
-            hashed = hash_password(payload.password)
-        try:
-            cursor.execute(
-                "INSERT INTO users(username, firstname, lastname, password, role, class) VALUES(?,?,?,?,?,?)",
-                (payload.username, payload.firstname, payload.lastname, hashed, role_id, class_id),
-            )
-            conn.commit()
-            user_id = cursor.lastrowid
-        except sqlite3.IntegrityError:
-            raise HTTPException(status_code=400, detail="Username already exists")
-        return {"id": user_id, "username": payload.username, "role": payload.role, "password": pw if payload.password is None else "Provided by user"}
+    # hash password, outside the write job
+    if (payload.password is None):
+        pw = secrets.token_hex(8)
+        hashed = hash_password(pw)
+    else:
+        hashed = hash_password(payload.password)
+
+    def write(conn):
+        cursor = conn.execute(
+            "INSERT INTO users(username, firstname, lastname, password, role, class) VALUES(?,?,?,?,?,?)",
+            (payload.username, payload.firstname, payload.lastname, hashed, role_id, class_id),
+        )
+        return cursor.lastrowid
+
+    try:
+        user_id = db_write(write)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="Username already exists")
+    return {"id": user_id, "username": payload.username, "role": payload.role, "password": pw if payload.password is None else "Provided by user"}
     
 def create_class_s(payload):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute("INSERT INTO classes(name) VALUES(?)", (payload.name,))
-            conn.commit()
-            class_id = cursor.lastrowid
-        except sqlite3.IntegrityError:
-            raise HTTPException(status_code=400, detail="Class already exists")
-        return {"id": class_id, "name": payload.name}
+    try:
+        class_id = db_write(lambda conn: conn.execute("INSERT INTO classes(name) VALUES(?)", (payload.name,)).lastrowid)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="Class already exists")
+    invalidate_reference_ids()
+    return {"id": class_id, "name": payload.name}
     
 def push_all(title, body):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT endpoint, p256dh, auth FROM push_subscriptions")
-        subs = [{"endpoint":r["endpoint"], "keys":{"p256dh":r["p256dh"],"auth":r["auth"]}} for r in cursor.fetchall()]
-        
-        successful = 0
-        for sub_dict in subs:
-            try:
-                webpush(
-                    subscription_info=sub_dict,
-                    data=json.dumps({"title": title, "body": body, "icon": "/icon.png"}),
-                    vapid_private_key=VAPID_PRIVATE_KEY,
-                    vapid_claims={"sub": f"mailto:{VAPID_EMAIL}"}
-                )
-                successful += 1
-            except Exception as e:
-                print(f"Failed {sub_dict['endpoint'][:50]}... - {e}")
-        
-        return {"sent": successful, "failed": len(subs)-successful, "total": len(subs)}
+        subs = select_push_subscriptions(cursor)
+
+    return deliver_push(subs, title, body, "all")
     
 def push_user(user_id, title, body):
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        subs = select_push_subscriptions(cursor, user_ids=[user_id])
+
+    if not subs:
+        return {"sent": 0, "failed": 0, "total": 0, "error": "No subscription found"}
+
+    result = deliver_push(subs, title, body, "user")
+    result["target"] = f"USER #{user_id}"
+    return result
+
+def push_users(user_ids, title, body):
+    user_ids = list(dict.fromkeys(user_ids))
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        subs = select_push_subscriptions(cursor, user_ids=user_ids)
+
+    result = deliver_push(subs, title, body, "users")
+    result["target"] = f"{len(user_ids)} USERS"
+    return result
+
+def push_class(class_id, title, body, role_id=None):
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM classes WHERE id = ?", (class_id,))
+        class_row = cursor.fetchone()
+        if not class_row:
+            raise HTTPException(status_code=404, detail="Class not found")
+        subs = select_push_subscriptions(cursor, class_ids=[class_id], role_ids=None if role_id is None else [role_id])
+
+    result = deliver_push(subs, title, body, "class")
+    result["target"] = f"CLASS {class_row['name']}"
+    return result
+
+def push_role(role_id, title, body):
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM roles WHERE id = ?", (role_id,))
+        role_row = cursor.fetchone()
+        if not role_row:
+            raise HTTPException(status_code=404, detail="Role not found")
+        subs = select_push_subscriptions(cursor, role_ids=[role_id])
+
+    result = deliver_push(subs, title, body, "role")
+    result["target"] = f"ROLE {role_row['name']}"
+    return result
+    
+def schedule_push_s(payload):
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+
+        target = "ALL"
+        if payload.class_id is not None:
+            cursor.execute("SELECT name FROM classes WHERE id = ?", (payload.class_id,))
+            class_row = cursor.fetchone()
+            if not class_row:
+                raise HTTPException(status_code=404, detail="Class not found")
+            target = f"CLASS {class_row['name']}"
+        if payload.role_id is not None:
+            cursor.execute("SELECT name FROM roles WHERE id = ?", (payload.role_id,))
+            role_row = cursor.fetchone()
+            if not role_row:
+                raise HTTPException(status_code=404, detail="Role not found")
+            target = f"{target} / ROLE {role_row['name']}" if payload.class_id is not None else f"ROLE {role_row['name']}"
+        if payload.user_ids is not None:
+            target = f"{len(set(payload.user_ids))} USERS"
+
+        send_at = None
+        if payload.send_at is not None:
+            send_at = payload.send_at
+            if send_at.tzinfo is not None:
+                send_at = send_at.astimezone(timezone.utc)
+            send_at = send_at.strftime("%Y-%m-%d %H:%M:%S")
+
+    batch, queued = db_write(lambda conn: enqueue_push(
+        conn.cursor(), payload.title, payload.body, target,
+        send_at=send_at, topic=payload.topic, urgency=payload.urgency, ttl=payload.ttl,
+        class_ids=None if payload.class_id is None else [payload.class_id],
+        role_ids=None if payload.role_id is None else [payload.role_id],
+        user_ids=None if payload.user_ids is None else list(dict.fromkeys(payload.user_ids)),
+    ))
+    return {"status": "queued", "batch": batch, "recipients": queued, "send_at": send_at, "target": target}
+
+def get_push_queue_s():
     with get_db() as conn:
         cursor = conn.cursor()
+
         cursor.execute("""
-            SELECT endpoint, p256dh, auth FROM push_subscriptions 
-            WHERE user_id = ?
-        """, (user_id,))
-        
-        subs = [{"endpoint":r["endpoint"], "keys":{"p256dh":r["p256dh"],"auth":r["auth"]}} for r in cursor.fetchall()]
-        
-        if not subs:
-            return {"sent": 0, "failed": 0, "total": 0, "error": "No subscription found"}
-        
-        successful = 0
-        for sub_dict in subs:
-            try:
-                webpush(
-                    subscription_info=sub_dict,
-                    data=json.dumps({"title": title, "body": body, "icon": "/icon.png"}),
-                    vapid_private_key=VAPID_PRIVATE_KEY,
-                    vapid_claims={"sub": f"mailto:{VAPID_EMAIL}"}
-                )
-                successful += 1
-            except Exception as e:
-                print(f"Failed user {user_id}: {sub_dict['endpoint'][:50]}... - {e}")
-        
-        return {
-            "sent": successful,
-            "failed": len(subs) - successful,
-            "total": len(subs),
-            "target": f"USER #{user_id}"
-        }
+            SELECT
+                batch,
+                title,
+                target,
+                topic,
+                urgency,
+                MIN(send_at) AS send_at,
+                MIN(created_at) AS created_at,
+                COUNT(*) AS recipients,
+                COUNT(claimed_at) AS sending
+            FROM push_queue
+            GROUP BY batch
+            ORDER BY send_at ASC
+        """)
+        batches = cursor.fetchall()
+
+        return {"batches": batches}
+
+def cancel_push_batch_s(batch):
+    # rows already claimed by a queue run are on their way
+    cancelled = db_write(lambda conn: conn.execute("DELETE FROM push_queue WHERE batch = ? AND claimed_at IS NULL", (batch,)).rowcount)
+    if cancelled == 0:
+        raise HTTPException(status_code=404, detail="Push batch not found")
+    return {"status": "success", "cancelled": cancelled}
     
 def delete_class_s(class_id):
-    with get_db() as conn:
+    # the check and the delete run in one write job, nobody joins the class
+    # in between
+    def write(conn):
         cursor = conn.cursor()
 
         cursor.execute("SELECT COUNT(id) AS student_count FROM users WHERE class = ?", (class_id,))
@@ -112,7 +209,7 @@ def delete_class_s(class_id):
         if not count_row:
             raise HTTPException(status_code=404, detail="Class not found")
 
-        if count_row[0] > 0:
+        if count_row["student_count"] > 0:
             cursor.execute("""
                 SELECT id, firstname, lastname, username 
                 FROM users 
@@ -130,50 +227,284 @@ def delete_class_s(class_id):
                 ]
             )
 
-        cursor.execute("DELETE FROM classes WHERE id = ?", (class_id,))
+        try:
+            cursor.execute("DELETE FROM classes WHERE id = ?", (class_id,))
+        except sqlite3.IntegrityError:
+            raise HTTPException(status_code=409, detail="Class has WLAN vouchers, cannot delete")
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Class not found")
-        conn.commit()
-        return {"status": "success"}
+
+    db_write(write)
+    invalidate_reference_ids()
+    return {"status": "success"}
     
 def delete_user_s(user_id):
-    with get_db() as conn:
+    def write(conn):
         cursor = conn.cursor()
 
+        # foreign keys are enforced, so everything pointing at the user goes
+        # first (push_queue and parentnotification_answers cascade). claimed
+        # vouchers are deleted rather than handed out a second time
+        for table, column in USER_DEPENDENTS:
+            cursor.execute(f"DELETE FROM {table} WHERE {column} = ?", (user_id,))
         cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
         if cursor.rowcount == 0:
+            # rolls the job back to its savepoint
             raise HTTPException(status_code=404, detail="User not found")
-        conn.commit()
-        return {"status": "success"}
+
+    db_write(write)
+    return {"status": "success"}
     
-def reset_user_password_s(user_id):
-    with get_db() as conn:
+def _check_bulk_operation(op, role_ids, class_ids):
+    fields = op.model_fields_set
+    if op.op == "create":
+        missing = [f for f in ("username", "firstname", "lastname", "role") if getattr(op, f) is None]
+        if missing:
+            return f"Missing {', '.join(missing)}"
+        if op.id is not None:
+            return "create takes no id"
+    elif op.id is None:
+        return "Missing id"
+    if op.op == "move" and "class_id" not in fields:
+        return "Missing class"
+    if op.op == "update" and not fields & {"username", "firstname", "lastname", "role", "class_id"}:
+        return "Nothing to update"
+    if op.role is not None and op.role not in role_ids:
+        return f"Invalid role: {op.role}"
+    if op.class_id is not None and op.class_id not in class_ids:
+        return f"Invalid class: {op.class_id}"
+    return None
+
+def bulk_users_s(payload):
+    # every operation gets a result at its index. operations are checked
+    # against the cached roles and classes first, then against the users
+    # table inside one write job on the writer thread, which applies the rest
+    # with one executemany per kind of operation in a single transaction
+    role_ids, class_ids = reference_ids()
+    operations = payload.operations
+    results = [{"index": i, "op": op.op, "id": op.id} for i, op in enumerate(operations)]
+
+    seen_ids, seen_usernames = set(), set()
+    for op, result in zip(operations, results):
+        error = _check_bulk_operation(op, role_ids, class_ids)
+        if error is None and op.id is not None:
+            if op.id in seen_ids:
+                error = "User has another operation in this request"
+            seen_ids.add(op.id)
+        if error is None and op.op in ("create", "update") and op.username is not None:
+            if op.username in seen_usernames:
+                error = "Username used twice in this request"
+            seen_usernames.add(op.username)
+        if error:
+            result.update(status="error", detail=error)
+
+    # hashing is the slow part, done before the write job
+    creates = [(op, result) for op, result in zip(operations, results) if op.op == "create" and "status" not in result]
+    passwords = [op.password or secrets.token_hex(8) for op, _ in creates]
+    with ThreadPoolExecutor(max_workers=BULK_HASH_WORKERS) as pool:
+        hashes = dict(zip((result["index"] for _, result in creates), pool.map(hash_password, passwords)))
+    for (op, result), pw in zip(creates, passwords):
+        result["password"] = "Provided by user" if op.password else pw
+
+    def write(conn):
         cursor = conn.cursor()
+        pending = [(op, result) for op, result in zip(operations, results) if "status" not in result]
 
-        new_password = secrets.token_hex(8)
-        hashed = hash_password(new_password)
+        # the write transaction holds off other writers, what is checked here
+        # is what the statements below see
+        ids = [op.id for op, _ in pending if op.id is not None]
+        existing = set()
+        if ids:
+            placeholders = ", ".join("?" * len(ids))
+            cursor.execute(f"SELECT id FROM users WHERE id IN ({placeholders})", ids)
+            existing = {r["id"] for r in cursor.fetchall()}
+        usernames = [op.username for op, _ in pending if op.op in ("create", "update") and op.username is not None]
+        taken = {}
+        if usernames:
+            placeholders = ", ".join("?" * len(usernames))
+            cursor.execute(f"SELECT id, username FROM users WHERE username IN ({placeholders})", usernames)
+            taken = {r["username"]: r["id"] for r in cursor.fetchall()}
 
-        cursor.execute("UPDATE users SET password = ? WHERE id = ?", (hashed, user_id))
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="User not found")
-        conn.commit()
-        return {"status": "success", "new_password": new_password}
+        for op, result in pending:
+            if op.id is not None and op.id not in existing:
+                result.update(status="error", detail="User not found")
+            elif op.op in ("create", "update") and taken.get(op.username, op.id) != op.id:
+                result.update(status="error", detail="Username already exists")
+
+        ready = [(op, result) for op, result in pending if "status" not in result]
+        if payload.atomic and len(ready) < len(operations):
+            for _, result in ready:
+                result.update(status="skipped", detail="Another operation failed")
+            return
+
+        deletes = [(op.id,) for op, _ in ready if op.op == "delete"]
+        if deletes:
+            # as in delete_user_s
+            for table, column in USER_DEPENDENTS:
+                cursor.executemany(f"DELETE FROM {table} WHERE {column} = ?", deletes)
+            cursor.executemany("DELETE FROM users WHERE id = ?", deletes)
+
+        updates = [
+            (op.username, op.firstname, op.lastname, op.role, "class_id" in op.model_fields_set, op.class_id, op.id)
+            for op, _ in ready if op.op == "update"
+        ]
+        if updates:
+            # NULL keeps a field; class can be set to NULL, so it has a flag
+            cursor.executemany("""
+                UPDATE users SET
+                    username = COALESCE(?, username),
+                    firstname = COALESCE(?, firstname),
+                    lastname = COALESCE(?, lastname),
+                    role = COALESCE(?, role),
+                    class = CASE WHEN ? THEN ? ELSE class END
+                WHERE id = ?
+            """, updates)
+
+        moves = [(op.class_id, op.id) for op, _ in ready if op.op == "move"]
+        if moves:
+            cursor.executemany("UPDATE users SET class = ? WHERE id = ?", moves)
+
+        new_users = [
+            (op.username, op.firstname, op.lastname, hashes[result["index"]], op.role, op.class_id)
+            for op, result in ready if op.op == "create"
+        ]
+        if new_users:
+            cursor.executemany(
+                "INSERT INTO users (username, firstname, lastname, password, role, class) VALUES (?, ?, ?, ?, ?, ?)",
+                new_users,
+            )
+            placeholders = ", ".join("?" * len(new_users))
+            cursor.execute(f"SELECT id, username FROM users WHERE username IN ({placeholders})", [u[0] for u in new_users])
+            new_ids = {r["username"]: r["id"] for r in cursor.fetchall()}
+            for op, result in ready:
+                if op.op == "create":
+                    result["id"] = new_ids[op.username]
+
+        for _, result in ready:
+            result["status"] = "ok"
+
+    try:
+        db_write(write)
+    except sqlite3.IntegrityError:
+        # a role or class the cache still had
+        invalidate_reference_ids()
+        raise HTTPException(status_code=409, detail="Roles or classes changed, repeat the request")
+
+    for result in results:
+        if result["status"] != "ok":
+            result.pop("password", None)
+    applied = sum(1 for result in results if result["status"] == "ok")
+    return {"applied": applied, "failed": len(results) - applied, "results": results}
+
+def reset_user_password_s(user_id):
+    new_password = secrets.token_hex(8)
+    hashed = hash_password(new_password)
+
+    updated = db_write(lambda conn: conn.execute("UPDATE users SET password = ? WHERE id = ?", (hashed, user_id)).rowcount)
+    if updated == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"status": "success", "new_password": new_password}
     
 def add_wlan_code_s(users, code, expiry):
-    with get_db() as conn:
+    def write(conn):
         cursor = conn.cursor()
 
         cursor.execute("INSERT INTO wlan_codes (user_ids, code, expiry) VALUES (?, ?, ?)", (users, code, expiry),)
-        conn.commit()
+        publish_event(cursor, "wlan_code", {"id": cursor.lastrowid, "code": code, "expiry": expiry}, user_ids=parse_user_ids(users))
 
-        return {"status": "success", "code":{"code": code, "users": users, "expiry": expiry}}
+    db_write(write)
+    return {"status": "success", "code":{"code": code, "users": users, "expiry": expiry}}
     
 def delete_wlan_code_s(code_id):
+    deleted = db_write(lambda conn: conn.execute("DELETE FROM wlan_codes WHERE id = ?", (code_id,)).rowcount)
+    if deleted == 0:
+        raise HTTPException(status_code=404, detail="WLAN code not found")
+    return {"status": "success"}
+
+def normalize_expiry(value):
+    # voucher expiries are compared with CURRENT_TIMESTAMP as text, so they
+    # are stored in its form: UTC, "YYYY-MM-DD HH:MM:SS". times without a
+    # timezone are UTC
+    expiry = datetime.fromisoformat(value)
+    if expiry.tzinfo is not None:
+        expiry = expiry.astimezone(timezone.utc)
+    return expiry.strftime("%Y-%m-%d %H:%M:%S")
+
+def upload_wlan_vouchers_s(csv_text, expiry, class_id=None, role_id=None):
+    # CSV needs a "code" column; optional "expiry", "class_id" and "role_id"
+    # columns override the upload-wide defaults per row
+    reader = csv.DictReader(io.StringIO(csv_text))
+    if not reader.fieldnames or "code" not in reader.fieldnames:
+        raise HTTPException(status_code=400, detail="CSV needs a 'code' column")
+
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT id FROM classes")
+        class_ids = {r["id"] for r in cursor.fetchall()}
+        cursor.execute("SELECT id FROM roles")
+        role_ids = {r["id"] for r in cursor.fetchall()}
+
+        rows = []
+        for line, entry in enumerate(reader, start=2):
+            code = (entry.get("code") or "").strip()
+            if not code:
+                continue
+            row_expiry = (entry.get("expiry") or "").strip() or expiry
+            row_class = (entry.get("class_id") or "").strip() or class_id
+            row_role = (entry.get("role_id") or "").strip() or role_id
+            try:
+                row_class = int(row_class) if row_class is not None else None
+                row_role = int(row_role) if row_role is not None else None
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid class or role in line {line}")
+            if row_class is not None and row_class not in class_ids:
+                raise HTTPException(status_code=400, detail=f"Invalid class in line {line}: {row_class}")
+            if row_role is not None and row_role not in role_ids:
+                raise HTTPException(status_code=400, detail=f"Invalid role in line {line}: {row_role}")
+            if not row_expiry:
+                raise HTTPException(status_code=400, detail=f"Missing expiry in line {line}")
+            try:
+                row_expiry = normalize_expiry(row_expiry)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid expiry in line {line}: {row_expiry}")
+            rows.append((code, row_class, row_role, row_expiry))
+
+    def write(conn):
+        # one write job for the whole file, duplicates are skipped
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO wlan_vouchers (code, class_id, role_id, expiry) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        return conn.total_changes - before
+
+    inserted = db_write(write)
+    return {"status": "success", "inserted": inserted, "duplicates": len(rows) - inserted}
+
+def get_wlan_voucher_pool_s():
     with get_db() as conn:
         cursor = conn.cursor()
 
-        cursor.execute("DELETE FROM wlan_codes WHERE id = ?", (code_id,))
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="WLAN code not found")
-        conn.commit()
-        return {"status": "success"}
\ No newline at end of file
+        cursor.execute("""
+            SELECT
+                v.class_id,
+                c.name AS class_name,
+                v.role_id,
+                r.name AS role_name,
+                COUNT(CASE WHEN v.claimed_by IS NULL AND v.expiry > CURRENT_TIMESTAMP THEN 1 END) AS free,
+                COUNT(v.claimed_by) AS claimed,
+                COUNT(CASE WHEN v.claimed_by IS NULL AND v.expiry <= CURRENT_TIMESTAMP THEN 1 END) AS expired
+            FROM wlan_vouchers v
+            LEFT JOIN classes c ON v.class_id = c.id
+            LEFT JOIN roles r ON v.role_id = r.id
+            GROUP BY v.class_id, v.role_id
+            ORDER BY c.name ASC, v.role_id ASC
+        """)
+        pools = cursor.fetchall()
+
+        return {"pools": pools}
+
+def delete_expired_wlan_vouchers_s():
+    deleted = db_write(lambda conn: conn.execute("DELETE FROM wlan_vouchers WHERE expiry <= CURRENT_TIMESTAMP").rowcount)
+    return {"status": "success", "deleted": deleted}
\ No newline at end of file
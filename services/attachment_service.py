@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from pathlib import Path
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, Response
+from api.v1.deps import db_write, get_read_db
+
+# attachments are stored under their SHA-256, so a file sent with several
+# notifications is kept once: ATTACHMENT_DIR/ab/abcdef... . parent
+# notifications reference them as {"id": <sha256>, "name": <file name>} in
+# their attachments list. the content behind an id never changes, so
+# downloads can be cached for good.
+
+ATTACHMENT_DIR = os.getenv("ATTACHMENT_DIR", "attachments")
+ATTACHMENT_MAX_SIZE = int(os.getenv("ATTACHMENT_MAX_SIZE", str(25 * 1024 * 1024)))
+ATTACHMENT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# the upload is collected up to this size before it is written out, each
+# write is a trip to a thread
+WRITE_BUFFER_SIZE = 1024 * 1024
+# shown in the browser, everything else is downloaded
+INLINE_TYPES = {"application/pdf", "image/png", "image/jpeg", "image/gif", "image/webp", "text/plain"}
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+def attachment_path(sha256):
+    return Path(ATTACHMENT_DIR) / sha256[:2] / sha256
+
+def _mime_type(name, content_type):
+    mime = mimetypes.guess_type(name)[0]
+    if mime is None and content_type:
+        mime = content_type.split(";")[0].strip().lower()
+    if not mime or mime.startswith("multipart/") or mime == "application/x-www-form-urlencoded":
+        mime = "application/octet-stream"
+    return mime
+
+def _move_into_place(tmp_path, sha256):
+    # True if the content was stored already
+    path = attachment_path(sha256)
+    if path.exists():
+        return True
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # same content, same bytes: a concurrent upload of the same file
+    # replacing this one is harmless
+    os.replace(tmp_path, path)
+    return False
+
+async def store_attachment_s(request, name):
+    # the request body is the file. it is hashed while it is written to a
+    # temporary file, which then moves to its content address
+    name = Path(name.replace("\\", "/")).name.strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="Missing file name")
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > ATTACHMENT_MAX_SIZE:
+        raise HTTPException(status_code=413, detail="Attachment too large")
+
+    tmp_dir = Path(ATTACHMENT_DIR) / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        buffer = bytearray()
+        # file writes happen off the event loop
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > ATTACHMENT_MAX_SIZE:
+                    raise HTTPException(status_code=413, detail="Attachment too large")
+                digest.update(chunk)
+                buffer += chunk
+                if len(buffer) >= WRITE_BUFFER_SIZE:
+                    await asyncio.to_thread(f.write, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(f.write, bytes(buffer))
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty attachment")
+
+        sha256 = digest.hexdigest()
+        stored = await asyncio.to_thread(_move_into_place, tmp_path, sha256)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+    mime = _mime_type(name, request.headers.get("content-type"))
+    # waiting for the writer thread happens off the event loop
+    await asyncio.to_thread(db_write, lambda conn: conn.execute(
+        "INSERT OR IGNORE INTO attachments (sha256, size, mime, name) VALUES (?, ?, ?, ?)",
+        (sha256, size, mime, name),
+    ))
+
+    return {"id": sha256, "name": name, "size": size, "mime": mime, "deduplicated": stored}
+
+def get_attachment_s(request, sha256, name=None):
+    if not _SHA256_RE.match(sha256):
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT size, mime, name FROM attachments WHERE sha256 = ?", (sha256,))
+        row = cursor.fetchone()
+    path = attachment_path(sha256)
+    if not row or not path.is_file():
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    etag = f'"{sha256}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": ATTACHMENT_CACHE_CONTROL,
+        "X-Content-Type-Options": "nosniff",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    # FileResponse answers Range and If-Range requests against the ETag
+    return FileResponse(
+        path,
+        headers=headers,
+        media_type=row["mime"],
+        filename=Path(name).name if name else row["name"],
+        content_disposition_type="inline" if row["mime"] in INLINE_TYPES else "attachment",
+    )
@@ -1,7 +1,18 @@
+import base64
+import json
 import os
-from pathlib import Path
+import sqlite3
 
-from api.v1.deps import get_db, hash_password
+from fastapi import HTTPException
+from api.v1.deps import db_write, get_db, hash_password
+from file_index import FileIndex
+
+STUDENT_ROLE = 1
+CLASS_MEMBERS_PAGE_SIZE = 50
+FILES_PAGE_SIZE = 100
+FILE_SORTS = ("name", "size", "mtime")
+
+public_files = FileIndex(os.getenv("PUBLIC_FILES_DIR", "public_files"))
 
 def get_subjects_s(session_data):
     with get_db() as conn:
@@ -46,65 +57,105 @@ def get_classes_s(session_data):
 
         return {"classes": classes}
     
+def encode_roster_cursor(member):
+    # lastname is nullable, members without one sort (and page) as ""
+    return base64.urlsafe_b64encode(json.dumps([member["lastname"] or "", member["id"]]).encode()).decode()
+
+def decode_roster_cursor(cursor_value):
+    try:
+        lastname, user_id = json.loads(base64.urlsafe_b64decode(cursor_value.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(lastname, str) or not isinstance(user_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return lastname, user_id
+
+def select_class_members(cursor, class_id, roles, after=None, limit=CLASS_MEMBERS_PAGE_SIZE):
+    # one page of members in (lastname, id) order, keyset paginated: "after" is
+    # the cursor of the last member of the previous page. NULL lastnames count
+    # as "" (a NULL would drop out of the keyset comparison). with a single
+    # role the rows come straight from idx_users_class_role_lastname, which
+    # indexes the same COALESCE expression
+    placeholders = ",".join("?" for _ in roles)
+    params = [class_id, *roles]
+    keyset = ""
+    if after:
+        keyset = "AND (COALESCE(lastname, ''), id) > (?, ?)"
+        params.extend(decode_roster_cursor(after))
+    cursor.execute(f"""
+        SELECT
+            id,
+            username,
+            firstname,
+            lastname,
+            role
+        FROM users
+        WHERE class = ? AND role IN ({placeholders}) {keyset}
+        ORDER BY COALESCE(lastname, '') ASC, id ASC
+        LIMIT ?;
+    """, (*params, limit + 1))
+    members = cursor.fetchall()
+
+    next_cursor = None
+    if len(members) > limit:
+        members = members[:limit]
+        next_cursor = encode_roster_cursor(members[-1])
+    return members, next_cursor
+
+def other_role_ids(cursor):
+    cursor.execute("SELECT id FROM roles WHERE id != ? ORDER BY id", (STUDENT_ROLE,))
+    return [r["id"] for r in cursor.fetchall()]
+
 def get_class_s(class_id, session_data):
     with get_db() as conn:
         cursor = conn.cursor()
 
+        # one pass over the class's index entries for both counts
         cursor.execute("""
             SELECT
                 c.id,
                 c.name,
-                COUNT(u.id) AS student_count,
-                COUNT(u2.id) AS others_count
+                COUNT(CASE WHEN u.role = ? THEN 1 END) AS student_count,
+                COUNT(CASE WHEN u.role != ? THEN 1 END) AS others_count
             FROM classes c
-            LEFT JOIN users u
-                ON u.class = c.id
-                AND u.role = 1
-            LEFT JOIN users u2
-                ON u2.class = c.id
-                AND NOT u2.role = 1
+            LEFT JOIN users u ON u.class = c.id
             WHERE c.id = ?
-            GROUP BY c.id, c.name
-            ORDER BY c.name ASC;
-        """, (class_id,))
+            GROUP BY c.id, c.name;
+        """, (STUDENT_ROLE, STUDENT_ROLE, class_id))
         class_info = cursor.fetchone()
         if not class_info:
             return {"error": "Class not found"}
-        
-        cursor.execute("""
-            SELECT
-                id,
-                username,
-                firstname,
-                lastname
-            FROM users
-            WHERE class = ? AND role = 1
-            ORDER BY lastname ASC
-            LIMIT 50;
-        """, (class_id,))
-        students = cursor.fetchall()
 
-        cursor.execute("""
-            SELECT
-                id,
-                username,
-                firstname,
-                lastname
-            FROM users
-            WHERE class = ? AND NOT role = 1
-            ORDER BY lastname ASC
-            LIMIT 50;
-        """, (class_id,))
-        others = cursor.fetchall()
+        students, students_next = select_class_members(cursor, class_id, [STUDENT_ROLE])
+        others, others_next = select_class_members(cursor, class_id, other_role_ids(cursor))
 
         return {
             "class": class_info,
             "students": students,
-            "others": others
+            "students_next": students_next,
+            "others": others,
+            "others_next": others_next
         }
+
+def get_class_members_s(class_id, roles=None, others=False, after=None, limit=CLASS_MEMBERS_PAGE_SIZE):
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT id FROM classes WHERE id = ?", (class_id,))
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Class not found")
+
+        if others:
+            roles = other_role_ids(cursor)
+        elif not roles:
+            cursor.execute("SELECT id FROM roles ORDER BY id")
+            roles = [r["id"] for r in cursor.fetchall()]
+
+        members, next_cursor = select_class_members(cursor, class_id, roles, after, limit)
+        return {"members": members, "next": next_cursor}
     
 def update_class_s(class_id, new_name):
-    with get_db() as conn:
+    def write(conn):
         cursor = conn.cursor()
 
         cursor.execute("SELECT id FROM classes WHERE id = ?", (class_id,))
@@ -112,9 +163,10 @@ def update_class_s(class_id, new_name):
             return {"error": "Class not found"}
 
         cursor.execute("UPDATE classes SET name = ? WHERE id = ?", (new_name, class_id))
-        conn.commit()
 
         return {"success": True}
+
+    return db_write(write)
     
 def get_users_s(all = False, page: int = 1):
     page = max(1, page)  # Ensure page is at least 1
@@ -187,17 +239,22 @@ def get_user_s(user_id):
         return {"user": user}
     
 def update_user_s(user_id, new_role, new_class, new_username, new_firstname, new_lastname):
-    with get_db() as conn:
+    def write(conn):
         cursor = conn.cursor()
 
         cursor.execute("SELECT id FROM users WHERE id = ?", (user_id,))
         if not cursor.fetchone():
             return {"error": "User not found"}
 
-        cursor.execute("UPDATE users SET role = ?, class = ?, username = ?, firstname = ?, lastname = ? WHERE id = ?", (new_role, new_class, new_username, new_firstname, new_lastname, user_id))
-        conn.commit()
+        try:
+            cursor.execute("UPDATE users SET role = ?, class = ?, username = ?, firstname = ?, lastname = ? WHERE id = ?", (new_role, new_class, new_username, new_firstname, new_lastname, user_id))
+        except sqlite3.IntegrityError:
+            # unknown role (foreign key) or a taken username
+            return {"error": "Invalid role or username already exists"}
 
         return {"success": True}
+
+    return db_write(write)
     
 def get_roles_s():
     with get_db() as conn:
@@ -224,7 +281,7 @@ def get_wlan_code_s(code_id):
         return {"code": code_dict}
     
 def update_wlan_code_s(code_id, new_expiry, new_user_ids):
-    with get_db() as conn:
+    def write(conn):
         cursor = conn.cursor()
 
         cursor.execute("SELECT id, code, user_ids, expiry FROM wlan_codes WHERE id = ?", (code_id,))
@@ -233,11 +290,24 @@ def update_wlan_code_s(code_id, new_expiry, new_user_ids):
             return {"error": "WLAN code not found"}
         
         cursor.execute("UPDATE wlan_codes SET expiry = ?, user_ids = ? WHERE id = ?", (new_expiry, new_user_ids, code_id))
-        conn.commit()
 
         return {"success": True, "new_expiry": new_expiry}
+
+    return db_write(write)
     
-def get_files_s(session_data):
-    path = Path("public_files/")
-    files = [p.name for p in path.iterdir() if p.is_file()]
-    return {"files": files}
\ No newline at end of file
+def get_files_s(session_data, all=False, page=1, sort="name", order="asc", search=None):
+    if sort not in FILE_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(FILE_SORTS)}")
+    page = max(1, page)
+    items_per_page = FILES_PAGE_SIZE if all == False else 9999999999999
+
+    files, total_items = public_files.page(page, items_per_page, sort, order, search)
+    return {
+        "files": files,
+        "pagination": {
+            "page": page,
+            "items_per_page": items_per_page,
+            "total_items": total_items,
+            "total_pages": (total_items + items_per_page - 1) // items_per_page
+        }
+    }
\ No newline at end of file
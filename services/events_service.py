@@ -0,0 +1,14 @@
+from fastapi.responses import StreamingResponse
+from events import event_stream, hub
+
+def open_event_stream_s(session_data, last_event_id=None):
+    client = hub.connect(session_data["user_id"], session_data["role"])
+    return StreamingResponse(
+        event_stream(client, last_event_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # nginx would buffer the stream otherwise
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -1,5 +1,7 @@
 import json
+import time
 import untis
+from metrics import IMPORT_DURATION, IMPORT_ITEMS
 from services.administration_service import create_class_s, create_user_s
 from payloads import CreateClassRequest, CreateUserRequest
 
@@ -8,12 +10,15 @@ def get_untis_classes_s():
     return classes
 
 def import_untis_classes_s():
+    start = time.perf_counter()
     classes = untis.get_classes()
 
     for cl in classes["result"]:
         payload = CreateClassRequest(className=cl["name"])
         create_class_s(payload)
+        IMPORT_ITEMS.inc("classes")
 
+    IMPORT_DURATION.observe(time.perf_counter() - start, "classes")
     return {"status": "success"}
 
 def get_untis_users_s():
@@ -21,6 +26,7 @@ def get_untis_users_s():
     return users
 
 def import_untis_users_s():
+    start = time.perf_counter()
     users = untis.get_users()
     pwT = "MusterPWLehrer"
     pwS = "MusterPW"
@@ -39,6 +45,7 @@ def import_untis_users_s():
             **{"class": None}
         )
         create_user_s(payload)
+        IMPORT_ITEMS.inc("teachers")
 
     for student in users["students"]["result"]:
         fore = student["foreName"]
@@ -54,5 +61,7 @@ def import_untis_users_s():
             **{"class": None}
         )
         create_user_s(payload)
+        IMPORT_ITEMS.inc("students")
 
+    IMPORT_DURATION.observe(time.perf_counter() - start, "users")
     return {"status": "success"}
\ No newline at end of file
@@ -0,0 +1,45 @@
+import io
+import pstats
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+import maintenance
+import metrics
+import profiling
+import querylog
+
+QUERY_SORTS = ("total", "count", "max", "mean", "rows")
+
+def get_metrics_s():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def get_top_queries_s(sort="total", limit=50):
+    if sort not in QUERY_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(QUERY_SORTS)}")
+    return {"queries": querylog.top_queries(sort, limit), "slow_query_ms": querylog.SLOW_QUERY_MS}
+
+def reset_top_queries_s():
+    querylog.reset_top_queries()
+    return {"status": "success"}
+
+def get_profiles_s():
+    return {"profiles": profiling.list_profiles()}
+
+def get_profile_s(name, format="pstats", sort="cumulative", limit=50):
+    path = profiling.profile_path(name)
+    if format == "pstats":
+        return FileResponse(path, media_type="application/octet-stream", filename=name)
+    if format != "text":
+        raise HTTPException(status_code=400, detail="format must be pstats or text")
+    if sort not in ("cumulative", "tottime", "ncalls"):
+        raise HTTPException(status_code=400, detail="sort must be one of cumulative, tottime, ncalls")
+
+    out = io.StringIO()
+    pstats.Stats(str(path), stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return PlainTextResponse(out.getvalue())
+
+def get_database_s():
+    # current sizes; the report is from the last run in this worker
+    return {"sizes": maintenance.database_sizes(), "last_maintenance": maintenance.last_report}
+
+def run_maintenance_s(full=True):
+    return maintenance.run_maintenance(full=full)
@@ -4,13 +4,27 @@ import os
 import portalocker
 from pathlib import Path
 import tempfile
-from api.v1.deps import get_db
+from fastapi import HTTPException
+from api.v1.deps import db_write, get_read_db
+from events import parse_user_ids, publish_event
+
+FEEDBACK_DIR = os.getenv("FEEDBACK_DIR", "parent_notification_feedback")
+PN_SYNC_PAGE_SIZE = 100
+
+# user_ids is "all" (optionally followed by more ids) or a ";" separated id list
+PN_AUDIENCE_SQL = "(pn.user_ids = 'all' OR pn.user_ids LIKE 'all;%' OR instr(';' || pn.user_ids || ';', ?) > 0)"
 
 def get_parentnotifications_s(session_data, filter_user_id=True):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
 
-        cursor.execute("""
+        audience = ""
+        params = ()
+        if filter_user_id:
+            audience = f"WHERE {PN_AUDIENCE_SQL}"
+            params = (f";{session_data['user_id']};",)
+
+        cursor.execute(f"""
             SELECT
                 pn.id,
                 pn.title,
@@ -20,70 +34,136 @@ def get_parentnotifications_s(session_data, filter_user_id=True):
                 pn.user_ids,
                 pn.created_at
             FROM parentnotifications pn
+            {audience}
             ORDER BY pn.created_at ASC
-        """)
+        """, params)
         notifications = cursor.fetchall()
 
-        if filter_user_id:
-            for notification in notifications:
-                user_ids = notification["user_ids"].split(";")
-                if user_ids[0] == "all": pass
-                else:
-                    if str(session_data["user_id"]) in user_ids: pass
-                    else: notifications.remove(notification)
-                    
-
         return {"parent_notifications": notifications}
     
+def sync_parentnotifications_s(session_data, since=0, limit=PN_SYNC_PAGE_SIZE):
+    # ids only grow, so a client that keeps the highest id it has seen gets
+    # just the newer notifications. the list has no bodies, the PWA loads a
+    # notification with get_parentnotification_s when it is opened
+    user_id = session_data["user_id"]
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute(f"""
+            SELECT
+                pn.id,
+                pn.title,
+                pn.created_at,
+                pn.feedback NOT IN ('', '[]') AS has_feedback,
+                CASE WHEN json_valid(pn.attachments) THEN json_array_length(pn.attachments) ELSE 0 END AS attachment_count,
+                EXISTS (
+                    SELECT 1 FROM parentnotification_answers a
+                    WHERE a.notification_id = pn.id AND a.user_id = ?
+                ) AS answered
+            FROM parentnotifications pn
+            WHERE pn.id > ? AND {PN_AUDIENCE_SQL}
+            ORDER BY pn.id ASC
+            LIMIT ?
+        """, (user_id, since, f";{user_id};", limit + 1))
+        notifications = cursor.fetchall()
+
+        has_more = len(notifications) > limit
+        notifications = notifications[:limit]
+        return {
+            "user_id": user_id,
+            "parent_notifications": notifications,
+            "cursor": notifications[-1]["id"] if notifications else since,
+            "has_more": has_more,
+        }
+
+def get_parentnotification_s(session_data, notification_id):
+    user_id = session_data["user_id"]
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute(f"""
+            SELECT
+                pn.id,
+                pn.title,
+                pn.body,
+                pn.feedback,
+                pn.attachments,
+                pn.created_at,
+                EXISTS (
+                    SELECT 1 FROM parentnotification_answers a
+                    WHERE a.notification_id = pn.id AND a.user_id = ?
+                ) AS answered
+            FROM parentnotifications pn
+            WHERE pn.id = ? AND {PN_AUDIENCE_SQL}
+        """, (user_id, notification_id, f";{user_id};"))
+        notification = cursor.fetchone()
+        if not notification:
+            raise HTTPException(status_code=404, detail="Notification not found")
+
+        return notification
+    
 def feedback_s(session_data, notification_id, feedback):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id FROM parentnotifications WHERE id = ?", (notification_id,))
         check_row = cursor.fetchone()
         if not check_row:
             return {"error": "Notification not found"}
         
-        file = Path(f"parent_notification_feedback/{notification_id}.json")
-        file.parent.mkdir(exist_ok=True)
+    file = Path(FEEDBACK_DIR) / f"{notification_id}.json"
+    file.parent.mkdir(exist_ok=True)
 
-        if not os.path.exists(file):
-            with open(file, 'w') as f:
-                f.write("")
-        
-        with open(file, 'r+', encoding='utf-8') as f:
-            portalocker.lock(f, portalocker.LOCK_EX)
-            
-            f.seek(0)
-            
-            try:
-                data = json.load(f)
-            except:
-                data = {}
-            
-            if "feedbacks" not in data:
-                data["feedbacks"] = {}
-            
-            user_id = str(session_data["user_id"])
-            data["feedbacks"][user_id] = feedback
-            
-            f.seek(0)
-            f.truncate()
-            json.dump(data, f, indent=4)
-            f.flush()
-            
-            portalocker.unlock(f)
+    if not os.path.exists(file):
+        with open(file, 'w') as f:
+            f.write("")
     
+    with open(file, 'r+', encoding='utf-8') as f:
+        portalocker.lock(f, portalocker.LOCK_EX)
+        
+        f.seek(0)
+        
+        try:
+            data = json.load(f)
+        except:
+            data = {}
+        
+        if "feedbacks" not in data:
+            data["feedbacks"] = {}
+        
+        user_id = str(session_data["user_id"])
+        data["feedbacks"][user_id] = feedback
+        
+        f.seek(0)
+        f.truncate()
+        json.dump(data, f, indent=4)
+        f.flush()
+        
+        portalocker.unlock(f)
+
+    def write(conn):
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO parentnotification_answers (notification_id, user_id) VALUES (?, ?)",
+            (notification_id, session_data["user_id"]),
+        )
+        # for the dashboard, and the user's other devices
+        publish_event(
+            cursor, "feedback", {"notification_id": notification_id, "user_id": session_data["user_id"]},
+            user_ids=[session_data["user_id"]], role="administration",
+        )
+
+    db_write(write)
     return {"status": "success"}
 
 def get_feedback_s(session_data, notification_id):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id, title FROM parentnotifications WHERE id = ?", (notification_id,))
         check_row = cursor.fetchone()
         if not check_row:
             return {"error": "Notification not found"}
         
-        file = Path(f"parent_notification_feedback/{notification_id}.json")
+        file = Path(FEEDBACK_DIR) / f"{notification_id}.json"
 
         if not os.path.exists(file):
             return {"notification": notification_id, "notification_title": check_row["title"], "error": "Notification feedback not found"}
@@ -94,8 +174,9 @@ def get_feedback_s(session_data, notification_id):
         return {"notification": notification_id, "notification_title": check_row["title"], "data": data}
     
 def create_parentnotification_s(session_data, title, body, feedback, attachments, user_ids):
-    with get_db() as conn:
+    def write(conn):
         cursor = conn.cursor()
-
         cursor.execute("INSERT INTO parentnotifications (title, body, feedback, attachments, user_ids) VALUES (?, ?, ?, ?, ?)", (title, body, feedback, attachments, user_ids,))
-        conn.commit()
\ No newline at end of file
+        publish_event(cursor, "parentnotification", {"id": cursor.lastrowid, "title": title}, user_ids=parse_user_ids(user_ids))
+
+    db_write(write)
\ No newline at end of file
@@ -1,39 +1,72 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
 import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
 from fastapi import HTTPException
-from api.v1.deps import get_db
+from py_vapid import Vapid
+from pywebpush import WebPushException, webpush
+from api.v1.deps import db_write, get_read_db
+from definitions import VAPID_PRIVATE_KEY, VAPID_EMAIL
+from metrics import PUSH_FAILED, PUSH_SENT
+
+logger = logging.getLogger(__name__)
+
+# parallel requests to the push services per delivery run
+PUSH_CONCURRENCY = int(os.getenv("PUSH_CONCURRENCY", "8"))
+PUSH_TIMEOUT = 10
+# VAPID tokens are valid for 12 hours, runs are far shorter
+VAPID_TOKEN_LIFETIME = 12 * 60 * 60
+# how long the push service keeps a message for an offline device (TTL header)
+PUSH_TTL = int(os.getenv("PUSH_TTL", str(24 * 60 * 60)))
+PUSH_URGENCIES = ("very-low", "low", "normal", "high")
+
+# the push queue is worked off every PUSH_QUEUE_INTERVAL seconds; everything
+# due for a user within one interval goes out as one push
+PUSH_QUEUE_INTERVAL = int(os.getenv("PUSH_QUEUE_INTERVAL", "30"))
+# users per run, large broadcasts are spread over several runs
+PUSH_QUEUE_BATCH = int(os.getenv("PUSH_QUEUE_BATCH", "2000"))
+# rows claimed longer ago than this belong to a worker that died mid-run
+PUSH_CLAIM_TIMEOUT = 10 * 60
+# titles listed in the body of a coalesced push
+PUSH_COALESCE_TITLES = 5
 
 def subscribe(session_data, payload):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute("""
-                INSERT INTO push_subscriptions (user_id, endpoint, p256dh, auth)
-                VALUES (?, ?, ?, ?)
-            """, (
-                session_data["user_id"],
-                payload.endpoint,
-                payload.keys["p256dh"],
-                payload.keys["auth"]
-            ))
-            conn.commit()
-            return {"status": "subscribed", "user_id": session_data["user_id"]}
-        except sqlite3.IntegrityError:
-            raise HTTPException(409, "Subscription already exists")
+    def write(conn):
+        conn.execute("""
+            INSERT INTO push_subscriptions (user_id, endpoint, p256dh, auth)
+            VALUES (?, ?, ?, ?)
+        """, (
+            session_data["user_id"],
+            payload.endpoint,
+            payload.keys["p256dh"],
+            payload.keys["auth"]
+        ))
+
+    try:
+        db_write(write)
+    except sqlite3.IntegrityError:
+        raise HTTPException(409, "Subscription already exists")
+    return {"status": "subscribed", "user_id": session_data["user_id"]}
         
 def unsubscribe(session_data, endpoint):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
+    def write(conn):
+        cursor = conn.execute(
             "DELETE FROM push_subscriptions WHERE user_id = ? AND endpoint = ?",
             (session_data["user_id"], endpoint)
         )
-        conn.commit()
-        deleted = cursor.rowcount
-        return {"deleted": deleted > 0}
+        return cursor.rowcount
+
+    deleted = db_write(write)
+    return {"deleted": deleted > 0}
     
 def status(session_data):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -62,4 +95,190 @@ def status(session_data):
             "last_subscription": result["last_subscription"]
         }
         
-        return status
\ No newline at end of file
+        return status
+
+def _audience_conditions(class_ids=None, role_ids=None, user_ids=None):
+    # each given filter narrows the audience, ids within one filter are
+    # alternatives. returns " AND ..." fragments on users u and their params
+    conditions = ""
+    params = []
+    for column, ids in (("u.class", class_ids), ("u.role", role_ids), ("u.id", user_ids)):
+        if ids is not None:
+            placeholders = ",".join("?" for _ in ids)
+            conditions += f" AND {column} IN ({placeholders})"
+            params.extend(ids)
+    return conditions, params
+
+def select_push_subscriptions(cursor, class_ids=None, role_ids=None, user_ids=None):
+    # every subscription of the audience in one query
+    conditions, params = _audience_conditions(class_ids, role_ids, user_ids)
+
+    cursor.execute(f"""
+        SELECT ps.id, ps.user_id, ps.endpoint, ps.p256dh, ps.auth
+        FROM push_subscriptions ps
+        JOIN users u ON u.id = ps.user_id
+        WHERE 1{conditions}
+    """, params)
+    return cursor.fetchall()
+
+def deliver_push(subscriptions, title, body, target, ttl=PUSH_TTL, urgency="normal", topic=None):
+    # one delivery run: the payload is serialized and the VAPID key parsed once,
+    # requests share a session and go out PUSH_CONCURRENCY at a time.
+    # subscriptions the push service reports as gone (404/410) are removed.
+    # a newer message with the same topic replaces an undelivered older one
+    # at the push service
+    if not subscriptions:
+        return {"sent": 0, "failed": 0, "expired": 0, "total": 0}
+    if not VAPID_PRIVATE_KEY:
+        raise HTTPException(status_code=503, detail="Push is not configured")
+
+    data = json.dumps({"title": title, "body": body, "icon": "/icon.png"})
+    vapid = Vapid.from_string(private_key=VAPID_PRIVATE_KEY)
+    session = requests.Session()
+    claims = {}
+    headers = {"Urgency": urgency}
+    if topic:
+        headers["Topic"] = topic
+
+    def vapid_claims(endpoint):
+        url = urlparse(endpoint)
+        audience = f"{url.scheme}://{url.netloc}"
+        if audience not in claims:
+            claims[audience] = {
+                "sub": f"mailto:{VAPID_EMAIL}",
+                "aud": audience,
+                "exp": int(time.time()) + VAPID_TOKEN_LIFETIME,
+            }
+        return claims[audience]
+
+    def send(sub):
+        try:
+            webpush(
+                subscription_info={"endpoint": sub["endpoint"], "keys": {"p256dh": sub["p256dh"], "auth": sub["auth"]}},
+                data=data,
+                vapid_private_key=vapid,
+                vapid_claims=vapid_claims(sub["endpoint"]),
+                timeout=PUSH_TIMEOUT,
+                ttl=ttl,
+                headers=headers,
+                requests_session=session,
+            )
+            return None
+        except WebPushException as e:
+            status_code = e.response.status_code if e.response is not None else 0
+            if status_code not in (404, 410):
+                logger.warning("Failed user %s: %s... - %s", sub["user_id"], sub["endpoint"][:50], e)
+            return status_code
+        except Exception as e:
+            logger.warning("Failed user %s: %s... - %s", sub["user_id"], sub["endpoint"][:50], e)
+            return 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(PUSH_CONCURRENCY, len(subscriptions))) as pool:
+            errors = list(pool.map(send, subscriptions))
+    finally:
+        session.close()
+
+    expired = [sub["id"] for sub, error in zip(subscriptions, errors) if error in (404, 410)]
+    if expired:
+        # nobody waits for the cleanup
+        db_write(lambda conn: conn.executemany("DELETE FROM push_subscriptions WHERE id = ?", [(i,) for i in expired]), wait=False)
+
+    failed = sum(1 for error in errors if error is not None)
+    sent = len(subscriptions) - failed
+    PUSH_SENT.inc(target, amount=sent)
+    PUSH_FAILED.inc(target, amount=failed)
+    return {"sent": sent, "failed": failed, "expired": len(expired), "total": len(subscriptions)}
+
+def enqueue_push(cursor, title, body, target, send_at=None, topic=None, urgency="normal", ttl=PUSH_TTL, class_ids=None, role_ids=None, user_ids=None):
+    # one queue row per user of the audience that has a subscription, all
+    # under one batch id. send_at is a UTC "YYYY-MM-DD HH:MM:SS" string, None
+    # sends with the next queue run
+    conditions, params = _audience_conditions(class_ids, role_ids, user_ids)
+    batch = secrets.token_hex(8)
+
+    cursor.execute(f"""
+        INSERT INTO push_queue (batch, user_id, title, body, target, topic, urgency, ttl, send_at)
+        SELECT ?, u.id, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP)
+        FROM users u
+        WHERE EXISTS (SELECT 1 FROM push_subscriptions ps WHERE ps.user_id = u.id){conditions}
+    """, (batch, title, body, target, topic, urgency, ttl, send_at, *params))
+    return batch, cursor.rowcount
+
+def coalesce_pushes(messages):
+    # all due messages of one user as a single push: one message goes out as
+    # is, several are summarized by their titles, newest first
+    if len(messages) == 1:
+        m = messages[0]
+        return (m["title"], m["body"], m["topic"], m["urgency"], m["ttl"])
+
+    messages = sorted(messages, key=lambda m: (m["send_at"], m["id"]), reverse=True)
+    titles = [m["title"] for m in messages[:PUSH_COALESCE_TITLES]]
+    if len(messages) > PUSH_COALESCE_TITLES:
+        titles.append(f"und {len(messages) - PUSH_COALESCE_TITLES} weitere")
+    topics = {m["topic"] for m in messages}
+    return (
+        f"{len(messages)} neue Benachrichtigungen",
+        "\n".join(titles),
+        topics.pop() if len(topics) == 1 else None,
+        max((m["urgency"] for m in messages), key=PUSH_URGENCIES.index),
+        max(m["ttl"] for m in messages),
+    )
+
+def run_push_queue(limit=PUSH_QUEUE_BATCH):
+    # claims every due row of up to `limit` users, coalesces them per user
+    # and delivers one run per distinct payload. several workers can run this
+    # at once, the claim update makes sure a row is only sent by one of them
+    if not VAPID_PRIVATE_KEY:
+        return None
+    now = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    stale = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - PUSH_CLAIM_TIMEOUT))
+
+    rows = db_write(lambda conn: conn.execute("""
+            UPDATE push_queue SET claimed_at = ?
+            WHERE send_at <= ? AND (claimed_at IS NULL OR claimed_at < ?)
+            AND user_id IN (
+                SELECT DISTINCT user_id FROM push_queue
+                WHERE send_at <= ? AND (claimed_at IS NULL OR claimed_at < ?)
+                LIMIT ?
+            )
+            RETURNING id, user_id, title, body, topic, urgency, ttl, send_at
+        """, (now, now, stale, now, stale, limit)).fetchall())
+    if not rows:
+        return {"users": 0, "messages": 0, "pushes": 0, "sent": 0, "failed": 0}
+
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row["user_id"], []).append(row)
+    # most runs are one broadcast, which is one payload for everybody
+    payloads = {}
+    for user_id, messages in by_user.items():
+        payloads.setdefault(coalesce_pushes(messages), []).append(user_id)
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        deliveries = [
+            (payload, select_push_subscriptions(cursor, user_ids=user_ids))
+            for payload, user_ids in payloads.items()
+        ]
+
+    sent = failed = 0
+    for (title, body, topic, urgency, ttl), subs in deliveries:
+        result = deliver_push(subs, title, body, "scheduled", ttl=ttl, urgency=urgency, topic=topic)
+        sent += result["sent"]
+        failed += result["failed"]
+
+    db_write(lambda conn: conn.executemany("DELETE FROM push_queue WHERE id = ?", [(row["id"],) for row in rows]))
+
+    return {"users": len(by_user), "messages": len(rows), "pushes": sum(len(subs) for _, subs in deliveries), "sent": sent, "failed": failed}
+
+async def push_scheduler():
+    # started from the app lifespan, one per worker
+    while True:
+        await asyncio.sleep(PUSH_QUEUE_INTERVAL)
+        try:
+            result = await asyncio.to_thread(run_push_queue)
+        except Exception as e:
+            print(f"Push queue run failed: {e}")
+            continue
+        if result and result["messages"]:
+            print(f"Push queue: {result['messages']} messages for {result['users']} users, {result['sent']} sent, {result['failed']} failed")
@@ -1,75 +1,386 @@
 import sqlite3
 import base64
 import hashlib
-from cryptography.fernet import Fernet
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from argon2.low_level import Type, hash_secret_raw
+from cryptography.fernet import Fernet, InvalidToken
 import os
-from api.v1.deps import get_db
+from api.v1.deps import db_write, get_read_db, hash_password, ph, verify_password
+from metrics import HASH_DURATION
 from fastapi import HTTPException
 
-def get_cipher(unlock_key: str) -> Fernet:
-    key = base64.urlsafe_b64encode(hashlib.sha256(unlock_key.encode()).digest())
-    return Fernet(key)
+# unlock sessions: an opaque "<id>.<secret>" token, dropped after UNLOCK_SESSION_TTL
+# seconds without use. the unlock_sessions table holds the derived key wrapped
+# with the token secret, so any worker can serve the token while the database
+# alone reveals nothing; each worker keeps the unwrapped ciphers in a bounded
+# LRU cache.
+UNLOCK_SESSION_TTL = int(os.getenv("PW_UNLOCK_SESSION_TTL", 15 * 60))
+UNLOCK_SESSION_MAX = int(os.getenv("PW_UNLOCK_SESSION_MAX", 1024))
+# last_used is written back at most this often per session
+UNLOCK_SESSION_TOUCH_INTERVAL = 60
+
+# secrets re-encrypted per committed batch when the unlock key changes
+ROTATION_BATCH_SIZE = int(os.getenv("PW_ROTATION_BATCH_SIZE", 500))
+
+EXPORT_FORMAT = "bogy-pw-export"
+EXPORT_VERSION = 1
+
+_unlock_ciphers = OrderedDict()  # session id -> (token secret, cipher)
+_unlock_ciphers_lock = threading.Lock()
+
+def derive_key(unlock_key: str, salt: bytes) -> bytes:
+    # argon2id with the same cost parameters as the login password hasher
+    with HASH_DURATION.time("derive"):
+        raw = hash_secret_raw(
+            secret=unlock_key.encode(),
+            salt=salt,
+            time_cost=ph.time_cost,
+            memory_cost=ph.memory_cost,
+            parallelism=ph.parallelism,
+            hash_len=32,
+            type=Type.ID,
+        )
+    return base64.urlsafe_b64encode(raw)
+
+def get_key(unlock_key: str, kdf_salt: str | None = None) -> bytes:
+    if kdf_salt is None:
+        # legacy keys (created before the argon2 KDF) are a plain sha256
+        return base64.urlsafe_b64encode(hashlib.sha256(unlock_key.encode()).digest())
+    return derive_key(unlock_key, base64.b64decode(kdf_salt))
+
+def get_cipher(unlock_key: str, kdf_salt: str | None = None) -> Fernet:
+    return Fernet(get_key(unlock_key, kdf_salt))
+
+def new_user_key(unlock_key: str):
+    # returns (hashed_key, kdf_salt) for the user_keys table
+    kdf_salt = base64.b64encode(os.urandom(16)).decode()
+    return hash_password(unlock_key), kdf_salt
+
+def check_unlock_key(key_row, unlock_key: str) -> bool:
+    if not key_row:
+        return False
+    if key_row["kdf_salt"] is None:
+        return hashlib.sha256(unlock_key.encode()).hexdigest() == key_row["hashed_key"]
+    return verify_password(unlock_key, key_row["hashed_key"])
+
+def get_user_key_row(cursor, user_id: int):
+    cursor.execute(
+        """
+        SELECT k.hashed_key, k.kdf_salt, r.user_id IS NOT NULL AS rotating
+        FROM user_keys k
+        LEFT JOIN key_rotations r ON r.user_id = k.user_id
+        WHERE k.user_id = ?
+        """,
+        (user_id,)
+    )
+    return cursor.fetchone()
+
+def ensure_not_rotating(key_row):
+    if key_row and key_row["rotating"]:
+        raise HTTPException(status_code=409, detail="Unlock key change in progress, repeat the key change to resume")
+
+def key_state(key_row):
+    # what a cipher was resolved against, None for a user without a key
+    return (key_row["hashed_key"], key_row["kdf_salt"]) if key_row else None
+
+def ensure_key_unchanged(conn, user_id: int, resolved_state):
+    # in the write job of a secret write. the cipher was resolved on a read
+    # connection; a key change that started (or even finished) since would
+    # leave the value encrypted with a key the user no longer has
+    key_row = get_user_key_row(conn.cursor(), user_id)
+    ensure_not_rotating(key_row)
+    if key_state(key_row) != resolved_state:
+        raise HTTPException(status_code=409, detail="Unlock key changed, unlock again")
 
 def verify_unlock_key(user_id: int, unlock_key: str) -> bool:
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT hashed_key FROM user_keys WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
-        return bool(row and hashlib.sha256(unlock_key.encode()).hexdigest() == row["hashed_key"])
+        return check_unlock_key(get_user_key_row(cursor, user_id), unlock_key)
 
 def has_user_key(user_id: int) -> bool:
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT 1 FROM user_keys WHERE user_id = ?", (user_id,))
         return cursor.fetchone() is not None
 
-def encrypt_secret_s(value: str, unlock_key: str) -> str:
-    cipher = get_cipher(unlock_key)
+def encrypt_secret_s(value: str, cipher: Fernet) -> str:
     return cipher.encrypt(value.encode()).decode()
 
-def decrypt_secret_s(encrypted_value: str, unlock_key: str) -> str:
-    cipher = get_cipher(unlock_key)
+def decrypt_secret_s(encrypted_value: str, cipher: Fernet) -> str:
     return cipher.decrypt(encrypted_value.encode()).decode()
 
-def create_secret_s(user_id: int, name: str, value: str, unlock_key: str):
-    with get_db() as conn:
+def _run_key_rotation(user_id: int, old_cipher: Fernet, new_cipher: Fernet) -> int:
+    # re-encrypts the secrets in id order, one write job (and commit) per
+    # batch. the key_rotations row records how far we got, so an interrupted
+    # rotation is picked up where it stopped; user_keys switches over only at
+    # the end. batches are read and re-encrypted off the writer thread. secret
+    # writes check the key state in their own write job (ensure_key_unchanged),
+    # so none lands while the rotation row exists; each batch job still checks
+    # that its rows were not changed since they were read
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        # Check if user has a key set
-        cursor.execute("SELECT hashed_key FROM user_keys WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
-        stored_hash = row["hashed_key"] if row else None
-        
-        if stored_hash:
-            # Verify the key matches
-            if hashlib.sha256(unlock_key.encode()).hexdigest() != stored_hash:
-                raise HTTPException(status_code=400, detail="Invalid unlock key")
-        else:
-            # Set the key for the first time
-            hashed_key = hashlib.sha256(unlock_key.encode()).hexdigest()
+        cursor.execute("SELECT last_secret_id, processed FROM key_rotations WHERE user_id = ?", (user_id,))
+        rotation = cursor.fetchone()
+    last_id, processed = rotation["last_secret_id"], rotation["processed"]
+
+    while True:
+        with get_read_db() as conn:
+            cursor = conn.cursor()
             cursor.execute(
-                "INSERT INTO user_keys (user_id, hashed_key) VALUES (?, ?)",
-                (user_id, hashed_key)
+                "SELECT id, name, encrypted_value FROM secrets WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (user_id, last_id, ROTATION_BATCH_SIZE)
+            )
+            rows = cursor.fetchall()
+        if not rows:
+            break
+
+        read_values = {row["id"]: row["encrypted_value"] for row in rows}
+        updates = []
+        for row in rows:
+            try:
+                decrypted = decrypt_secret_s(row["encrypted_value"], old_cipher)
+                updates.append((encrypt_secret_s(decrypted, new_cipher), row["id"]))
+            except Exception:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Failed to re-encrypt secret {row['name']} after {processed} secrets, repeat the key change to resume"
+                )
+
+        last_id = rows[-1]["id"]
+        processed += len(rows)
+
+        def write_batch(conn):
+            cursor = conn.cursor()
+            placeholders = ",".join("?" for _ in read_values)
+            cursor.execute(f"SELECT id, encrypted_value FROM secrets WHERE id IN ({placeholders})", tuple(read_values))
+            # deleted secrets are fine, the UPDATE skips them
+            if any(r["encrypted_value"] != read_values[r["id"]] for r in cursor.fetchall()):
+                raise HTTPException(status_code=409, detail="Secrets changed during the key change, repeat the key change to resume")
+            cursor.executemany(
+                "UPDATE secrets SET encrypted_value = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                updates
             )
-        
-        encrypted_value = encrypt_secret_s(value, unlock_key)
-        try:
             cursor.execute(
+                "UPDATE key_rotations SET last_secret_id = ?, processed = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?",
+                (last_id, processed, user_id)
+            )
+
+        db_write(write_batch)
+
+    def finish(conn):
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO user_keys (user_id, hashed_key, kdf_salt)
+            SELECT user_id, new_hashed_key, new_kdf_salt FROM key_rotations WHERE user_id = ?
+            """,
+            (user_id,)
+        )
+        cursor.execute("DELETE FROM key_rotations WHERE user_id = ?", (user_id,))
+
+    db_write(finish)
+    return processed
+
+def _start_key_rotation(user_id: int, new_hashed_key: str, new_kdf_salt: str):
+    def write(conn):
+        try:
+            conn.execute(
+                "INSERT INTO key_rotations (user_id, new_hashed_key, new_kdf_salt) VALUES (?, ?, ?)",
+                (user_id, new_hashed_key, new_kdf_salt)
+            )
+        except sqlite3.IntegrityError:
+            raise HTTPException(status_code=409, detail="Unlock key change already in progress")
+        # cached ciphers cannot read secrets that were already re-encrypted
+        return _delete_unlock_sessions(conn, user_id)
+
+    _forget_ciphers(db_write(write))
+
+# unlock sessions
+
+def _token_cipher(token_secret: str) -> Fernet:
+    # the token secret is random, a plain hash is enough to turn it into a key
+    return Fernet(base64.urlsafe_b64encode(hashlib.sha256(token_secret.encode()).digest()))
+
+def _cache_cipher(session_id: str, token_secret: str, cipher: Fernet):
+    with _unlock_ciphers_lock:
+        _unlock_ciphers[session_id] = (token_secret, cipher)
+        _unlock_ciphers.move_to_end(session_id)
+        while len(_unlock_ciphers) > UNLOCK_SESSION_MAX:
+            _unlock_ciphers.popitem(last=False)
+
+def _get_unlock_session(cursor, user_id: int, unlock_token: str):
+    session_id, _, token_secret = unlock_token.partition(".")
+    cursor.execute(
+        "SELECT wrapped_key, last_used FROM unlock_sessions WHERE id = ? AND user_id = ?",
+        (session_id, user_id)
+    )
+    row = cursor.fetchone()
+    now = time.time()
+    if not row or now - row["last_used"] > UNLOCK_SESSION_TTL:
+        return None
+    if now - row["last_used"] > UNLOCK_SESSION_TOUCH_INTERVAL:
+        # nobody waits for the touch
+        db_write(lambda conn: conn.execute("UPDATE unlock_sessions SET last_used = ? WHERE id = ?", (now, session_id)), wait=False)
+
+    with _unlock_ciphers_lock:
+        cached = _unlock_ciphers.get(session_id)
+        if cached is not None and hmac.compare_digest(cached[0], token_secret):
+            _unlock_ciphers.move_to_end(session_id)
+            return cached[1]
+
+    # first use on this worker
+    try:
+        key = _token_cipher(token_secret).decrypt(row["wrapped_key"].encode())
+    except InvalidToken:
+        return None
+    cipher = Fernet(key)
+    _cache_cipher(session_id, token_secret, cipher)
+    return cipher
+
+def _create_unlock_session(user_id: int, key: bytes) -> str:
+    session_id = secrets.token_urlsafe(16)
+    token_secret = secrets.token_urlsafe(32)
+    now = time.time()
+    wrapped_key = _token_cipher(token_secret).encrypt(key).decode()
+
+    def write(conn):
+        conn.execute("DELETE FROM unlock_sessions WHERE last_used < ?", (now - UNLOCK_SESSION_TTL,))
+        conn.execute(
+            "INSERT INTO unlock_sessions (id, user_id, wrapped_key, last_used) VALUES (?, ?, ?, ?)",
+            (session_id, user_id, wrapped_key, now)
+        )
+
+    db_write(write)
+    _cache_cipher(session_id, token_secret, Fernet(key))
+    return f"{session_id}.{token_secret}"
+
+def _delete_unlock_sessions(conn, user_id: int) -> list[str]:
+    # in a write job; the ids go to _forget_ciphers once it is committed
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM unlock_sessions WHERE user_id = ? RETURNING id", (user_id,))
+    return [r["id"] for r in cursor.fetchall()]
+
+def _forget_ciphers(session_ids: list[str]):
+    # other workers notice the missing row on the next lookup
+    with _unlock_ciphers_lock:
+        for session_id in session_ids:
+            _unlock_ciphers.pop(session_id, None)
+
+def drop_unlock_sessions(user_id: int):
+    _forget_ciphers(db_write(lambda conn: _delete_unlock_sessions(conn, user_id)))
+
+def resolve_cipher(cursor, user_id: int, unlock_key: str | None = None, unlock_token: str | None = None) -> Fernet:
+    # an unlock token skips key verification and key derivation entirely
+    if unlock_token:
+        cipher = _get_unlock_session(cursor, user_id, unlock_token)
+        if cipher is None:
+            raise HTTPException(status_code=401, detail="Unlock session expired")
+        return cipher
+
+    if not unlock_key:
+        raise HTTPException(status_code=400, detail="Unlock key or unlock token required")
+    key_row = get_user_key_row(cursor, user_id)
+    ensure_not_rotating(key_row)
+    if not check_unlock_key(key_row, unlock_key):
+        raise HTTPException(status_code=400, detail="Invalid unlock key")
+    return get_cipher(unlock_key, key_row["kdf_salt"])
+
+def unlock_s(user_id: int, unlock_key: str):
+    with get_read_db() as conn:
+        key_row = get_user_key_row(conn.cursor(), user_id)
+    ensure_not_rotating(key_row)
+    if not check_unlock_key(key_row, unlock_key):
+        raise HTTPException(status_code=400, detail="Invalid unlock key")
+
+    if key_row["kdf_salt"] is None:
+        # move legacy sha256 keys over to the argon2 KDF on first unlock
+        hashed_key, kdf_salt = new_user_key(unlock_key)
+        key = get_key(unlock_key, kdf_salt)
+        _start_key_rotation(user_id, hashed_key, kdf_salt)
+        _run_key_rotation(user_id, get_cipher(unlock_key), Fernet(key))
+    else:
+        key = get_key(unlock_key, key_row["kdf_salt"])
+
+    unlock_token = _create_unlock_session(user_id, key)
+    return {"unlock_token": unlock_token, "expires_in": UNLOCK_SESSION_TTL}
+
+def lock_s(user_id: int, unlock_token: str):
+    session_id = unlock_token.partition(".")[0]
+    locked = db_write(
+        lambda conn: conn.execute("DELETE FROM unlock_sessions WHERE id = ? AND user_id = ?", (session_id, user_id)).rowcount > 0
+    )
+    if locked:
+        with _unlock_ciphers_lock:
+            _unlock_ciphers.pop(session_id, None)
+    return {"locked": locked}
+
+# secrets
+
+def resolve_or_new_cipher(cursor, user_id: int, unlock_key: str | None = None, unlock_token: str | None = None):
+    # returns (cipher, new key); a new key is (hashed_key, kdf_salt) for
+    # set_user_key in the caller's write job, None if the user has one
+    # Check if user has a key set
+    if get_user_key_row(cursor, user_id):
+        return resolve_cipher(cursor, user_id, unlock_key, unlock_token), None
+
+    if not unlock_key:
+        raise HTTPException(status_code=400, detail="Unlock key required")
+    # Set the key for the first time
+    hashed_key, kdf_salt = new_user_key(unlock_key)
+    return get_cipher(unlock_key, kdf_salt), (hashed_key, kdf_salt)
+
+def set_user_key(conn, user_id: int, new_key):
+    if new_key is not None:
+        conn.execute(
+            "INSERT INTO user_keys (user_id, hashed_key, kdf_salt) VALUES (?, ?, ?)",
+            (user_id, *new_key)
+        )
+
+def select_secrets(cursor, user_id: int, names: list[str] | None = None):
+    if names is None:
+        cursor.execute(
+            "SELECT id, name, encrypted_value, created_at, updated_at FROM secrets WHERE user_id = ? ORDER BY name",
+            (user_id,)
+        )
+    else:
+        placeholders = ",".join("?" for _ in names)
+        cursor.execute(
+            f"SELECT id, name, encrypted_value, created_at, updated_at FROM secrets WHERE user_id = ? AND name IN ({placeholders}) ORDER BY name",
+            (user_id, *names)
+        )
+    return cursor.fetchall()
+
+def create_secret_s(user_id: int, name: str, value: str, unlock_key: str | None = None, unlock_token: str | None = None):
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        # read before the cipher: a key change in between fails the write
+        resolved_state = key_state(get_user_key_row(cursor, user_id))
+        cipher, new_key = resolve_or_new_cipher(cursor, user_id, unlock_key, unlock_token)
+    encrypted_value = encrypt_secret_s(value, cipher)
+
+    def write(conn):
+        ensure_key_unchanged(conn, user_id, resolved_state)
+        set_user_key(conn, user_id, new_key)
+        try:
+            return conn.execute(
                 "INSERT INTO secrets (user_id, name, encrypted_value) VALUES (?, ?, ?)",
                 (user_id, name, encrypted_value)
-            )
-            return {"id": cursor.lastrowid, "name": name, "created": True}
+            ).lastrowid
         except sqlite3.IntegrityError:
             raise HTTPException(status_code=400, detail="Secret with this name already exists")
 
-def get_secret_s(user_id: int, name: str, unlock_key: str):
-    with get_db() as conn:
+    return {"id": db_write(write), "name": name, "created": True}
+
+def get_secret_s(user_id: int, name: str, unlock_key: str | None = None, unlock_token: str | None = None):
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        # Verify unlock key
-        cursor.execute("SELECT hashed_key FROM user_keys WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
-        if not row or hashlib.sha256(unlock_key.encode()).hexdigest() != row["hashed_key"]:
-            raise HTTPException(status_code=400, detail="Invalid unlock key")
-        
+        cipher = resolve_cipher(cursor, user_id, unlock_key, unlock_token)
+
         cursor.execute(
             "SELECT id, name, encrypted_value, created_at, updated_at FROM secrets WHERE user_id = ? AND name = ?",
             (user_id, name)
@@ -78,7 +389,7 @@ def get_secret_s(user_id: int, name: str, unlock_key: str):
         if not row:
             raise HTTPException(status_code=404, detail="Secret not found")
         try:
-            decrypted_value = decrypt_secret_s(row["encrypted_value"], unlock_key)
+            decrypted_value = decrypt_secret_s(row["encrypted_value"], cipher)
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid unlock key")
         return {
@@ -89,37 +400,120 @@ def get_secret_s(user_id: int, name: str, unlock_key: str):
             "updated_at": row["updated_at"]
         }
 
-def update_secret_s(user_id: int, name: str, value: str, unlock_key: str):
-    with get_db() as conn:
+def read_secrets_batch_s(user_id: int, names: list[str] | None = None, unlock_key: str | None = None, unlock_token: str | None = None):
+    # one key check and one query for the whole set; names=None reads everything
+    if names is not None:
+        names = list(dict.fromkeys(names))
+
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        # Verify unlock key
-        cursor.execute("SELECT hashed_key FROM user_keys WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
-        if not row or hashlib.sha256(unlock_key.encode()).hexdigest() != row["hashed_key"]:
+        cipher = resolve_cipher(cursor, user_id, unlock_key, unlock_token)
+        rows = select_secrets(cursor, user_id, names)
+
+    results = []
+    for row in rows:
+        try:
+            decrypted_value = decrypt_secret_s(row["encrypted_value"], cipher)
+        except Exception:
             raise HTTPException(status_code=400, detail="Invalid unlock key")
-        
-        encrypted_value = encrypt_secret_s(value, unlock_key)
-        cursor.execute(
+        results.append({
+            "id": row["id"],
+            "name": row["name"],
+            "value": decrypted_value,
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        })
+
+    found = {r["name"] for r in results}
+    missing = [n for n in names if n not in found] if names is not None else []
+    return {"secrets": results, "count": len(results), "missing": missing}
+
+def export_secrets_s(user_id: int, export_key: str, names: list[str] | None = None, unlock_key: str | None = None, unlock_token: str | None = None):
+    secrets_data = read_secrets_batch_s(user_id, names, unlock_key, unlock_token)["secrets"]
+
+    # the export is bound to its own passphrase, not to the server-side key,
+    # so it can be imported again after the unlock key was changed
+    salt = os.urandom(16)
+    payload = json.dumps([{"name": s["name"], "value": s["value"]} for s in secrets_data])
+    return {
+        "format": EXPORT_FORMAT,
+        "version": EXPORT_VERSION,
+        "kdf": "argon2id",
+        "salt": base64.b64encode(salt).decode(),
+        "count": len(secrets_data),
+        "data": Fernet(derive_key(export_key, salt)).encrypt(payload.encode()).decode()
+    }
+
+def import_secrets_s(user_id: int, export: dict, export_key: str, overwrite: bool = False, unlock_key: str | None = None, unlock_token: str | None = None):
+    if export.get("format") != EXPORT_FORMAT or export.get("version") != EXPORT_VERSION:
+        raise HTTPException(status_code=400, detail="Unsupported export format")
+    try:
+        export_cipher = Fernet(derive_key(export_key, base64.b64decode(export["salt"])))
+        entries = json.loads(export_cipher.decrypt(export["data"].encode()))
+    except (InvalidToken, KeyError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid export key or corrupted export")
+
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        resolved_state = key_state(get_user_key_row(cursor, user_id))
+        cipher, new_key = resolve_or_new_cipher(cursor, user_id, unlock_key, unlock_token)
+    rows = [(user_id, e["name"], encrypt_secret_s(e["value"], cipher)) for e in entries]
+
+    def write(conn):
+        ensure_key_unchanged(conn, user_id, resolved_state)
+        set_user_key(conn, user_id, new_key)
+        cursor = conn.cursor()
+        before = conn.total_changes
+        if overwrite:
+            cursor.executemany(
+                """
+                INSERT INTO secrets (user_id, name, encrypted_value) VALUES (?, ?, ?)
+                ON CONFLICT(user_id, name) DO UPDATE SET
+                    encrypted_value = excluded.encrypted_value,
+                    updated_at = CURRENT_TIMESTAMP
+                """,
+                rows
+            )
+        else:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO secrets (user_id, name, encrypted_value) VALUES (?, ?, ?)",
+                rows
+            )
+        return conn.total_changes - before
+
+    imported = db_write(write)
+    return {"imported": imported, "skipped": len(rows) - imported, "total": len(rows)}
+
+def update_secret_s(user_id: int, name: str, value: str, unlock_key: str | None = None, unlock_token: str | None = None):
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        resolved_state = key_state(get_user_key_row(cursor, user_id))
+        cipher = resolve_cipher(cursor, user_id, unlock_key, unlock_token)
+    encrypted_value = encrypt_secret_s(value, cipher)
+
+    def write(conn):
+        ensure_key_unchanged(conn, user_id, resolved_state)
+        return conn.execute(
             "UPDATE secrets SET encrypted_value = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ? AND name = ?",
             (encrypted_value, user_id, name)
-        )
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Secret not found")
-        return {"name": name, "updated": True}
+        ).rowcount
+
+    updated = db_write(write)
+    if updated == 0:
+        raise HTTPException(status_code=404, detail="Secret not found")
+    return {"name": name, "updated": True}
 
 def delete_secret_s(user_id: int, name: str):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "DELETE FROM secrets WHERE user_id = ? AND name = ?",
-            (user_id, name)
-        )
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Secret not found")
-        return {"name": name, "deleted": True}
+    deleted = db_write(lambda conn: conn.execute(
+        "DELETE FROM secrets WHERE user_id = ? AND name = ?",
+        (user_id, name)
+    ).rowcount)
+    if deleted == 0:
+        raise HTTPException(status_code=404, detail="Secret not found")
+    return {"name": name, "deleted": True}
 
 def list_secrets_s(user_id: int):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "SELECT id, name, created_at, updated_at FROM secrets WHERE user_id = ?",
@@ -129,38 +523,33 @@ def list_secrets_s(user_id: int):
         return [{"id": row["id"], "name": row["name"], "created_at": row["created_at"], "updated_at": row["updated_at"]} for row in rows]
 
 def change_unlock_key_s(user_id: int, old_unlock_key: str, new_unlock_key: str):
-    if not verify_unlock_key(user_id, old_unlock_key):
-        raise HTTPException(status_code=400, detail="Invalid old unlock key")
-    
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        # Get all secrets
-        cursor.execute("SELECT id, name, encrypted_value FROM secrets WHERE user_id = ?", (user_id,))
-        rows = cursor.fetchall()
-        
-        # Re-encrypt all with new key
-        for row in rows:
-            try:
-                decrypted = decrypt_secret_s(row["encrypted_value"], old_unlock_key)
-                new_encrypted = encrypt_secret_s(decrypted, new_unlock_key)
-                cursor.execute(
-                    "UPDATE secrets SET encrypted_value = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-                    (new_encrypted, row["id"])
-                )
-            except Exception:
-                raise HTTPException(status_code=500, detail=f"Failed to re-encrypt secret {row['name']}")
-        
-        # Update the stored hash
-        new_hashed_key = hashlib.sha256(new_unlock_key.encode()).hexdigest()
-        cursor.execute(
-            "INSERT OR REPLACE INTO user_keys (user_id, hashed_key) VALUES (?, ?)",
-            (user_id, new_hashed_key)
-        )
-        
-        return {"changed": True, "count": len(rows)}
-    
+        key_row = get_user_key_row(cursor, user_id)
+        cursor.execute("SELECT new_hashed_key, new_kdf_salt FROM key_rotations WHERE user_id = ?", (user_id,))
+        rotation = cursor.fetchone()
+    if not check_unlock_key(key_row, old_unlock_key):
+        raise HTTPException(status_code=400, detail="Invalid old unlock key")
+
+    if rotation:
+        # resuming an interrupted rotation, it has to target the same key
+        if not verify_password(new_unlock_key, rotation["new_hashed_key"]):
+            raise HTTPException(status_code=409, detail="Unlock key change to a different key in progress")
+        new_kdf_salt = rotation["new_kdf_salt"]
+    else:
+        new_hashed_key, new_kdf_salt = new_user_key(new_unlock_key)
+        _start_key_rotation(user_id, new_hashed_key, new_kdf_salt)
+
+    count = _run_key_rotation(
+        user_id,
+        get_cipher(old_unlock_key, key_row["kdf_salt"]),
+        get_cipher(new_unlock_key, new_kdf_salt),
+    )
+
+    return {"changed": True, "count": count, "resumed": rotation is not None}
+
 def get_key_status_s(user_id):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
 
         cursor.execute("SELECT hashed_key FROM user_keys WHERE user_id = ?", (user_id,))
@@ -168,4 +557,4 @@ def get_key_status_s(user_id):
         if not row:
             return {"key_set": False}
         else:
-            return {"key_set": True}
\ No newline at end of file
+            return {"key_set": True}
@@ -1,69 +1,63 @@
 import sqlite3
 from fastapi import HTTPException
 from fastapi.responses import RedirectResponse
-from api.v1.deps import get_db
+from api.v1.deps import db_write, get_read_db
 from services.data_service import get_subjects_s
 
-def register(request, session_data):
-    with get_db() as conn:
-        q = request.query_params
+def _subject_ids(request):
+    # validated before the write, on a read connection
+    with get_read_db() as conn:
         cursor = conn.cursor()
 
-        subject_names = request.query_params.getlist("subject")
         subject_ids = []
-        for name in subject_names:
+        for name in request.query_params.getlist("subject"):
             cursor.execute("SELECT id FROM subjects WHERE name = ?", (name,))
             s = cursor.fetchone()
             if not s:
                 raise HTTPException(status_code=400, detail=f"Invalid subject: {name}")
             subject_ids.append(str(s["id"]))
+        return subject_ids
 
-        subjects_field = ",".join(subject_ids) if subject_ids else None
+def register(request, session_data):
+    subject_ids = _subject_ids(request)
+    subjects_field = ",".join(subject_ids) if subject_ids else None
 
-        try:
-            cursor.execute(
-                "INSERT INTO tutoring(user, subjects) VALUES(?,?)",
-                (session_data["user_id"], subjects_field),
-            )
-            conn.commit()
-            tutoring_id = cursor.lastrowid
-        except sqlite3.IntegrityError:
-            raise HTTPException(status_code=400, detail="Could not create tutoring entry")
+    def write(conn):
+        conn.execute(
+            "INSERT INTO tutoring(user, subjects) VALUES(?,?)",
+            (session_data["user_id"], subjects_field),
+        )
 
-        return RedirectResponse(url="/app/tutoring_registering_success.html", status_code=302)
+    try:
+        db_write(write)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="Could not create tutoring entry")
+
+    return RedirectResponse(url="/app/tutoring_registering_success.html", status_code=302)
     
 def edit_profile(request, session_data):
-    with get_db() as conn:
-        subject_names = request.query_params.getlist("subject")
-        cursor = conn.cursor()
-
-        subject_ids = []
-        for name in subject_names:
-            cursor.execute("SELECT id FROM subjects WHERE name = ?", (name,))
-            s = cursor.fetchone()
-            if not s:
-                raise HTTPException(status_code=400, detail=f"Invalid subject: {name}")
-            subject_ids.append(str(s["id"]))
-
-        subjects_field = ",".join(subject_ids) if subject_ids else None
+    subject_ids = _subject_ids(request)
+    subjects_field = ",".join(subject_ids) if subject_ids else None
 
+    def write(conn):
+        cursor = conn.cursor()
         cursor.execute("SELECT id FROM tutoring WHERE user = ?", (session_data["user_id"],))
         existing = cursor.fetchone()
-        try:
-            if existing:
-                cursor.execute("UPDATE tutoring SET subjects = ? WHERE user = ?", (subjects_field, session_data["user_id"]))
-                tutoring_id = existing["id"]
-            else:
-                cursor.execute("INSERT INTO tutoring(user, subjects) VALUES(?,?)", (session_data["user_id"], subjects_field))
-                tutoring_id = cursor.lastrowid
-            conn.commit()
-        except sqlite3.IntegrityError:
-            raise HTTPException(status_code=400, detail="Could not update tutoring entry")
-
-        return {"id": tutoring_id, "user": session_data["user_id"], "subjects": subject_ids}
+        if existing:
+            cursor.execute("UPDATE tutoring SET subjects = ? WHERE user = ?", (subjects_field, session_data["user_id"]))
+            return existing["id"]
+        cursor.execute("INSERT INTO tutoring(user, subjects) VALUES(?,?)", (session_data["user_id"], subjects_field))
+        return cursor.lastrowid
+
+    try:
+        tutoring_id = db_write(write)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="Could not update tutoring entry")
+
+    return {"id": tutoring_id, "user": session_data["user_id"], "subjects": subject_ids}
     
 def search_tutors_s(request):
-    with get_db() as conn:
+    with get_read_db() as conn:
         # collect requested subject names from query params
         subject_names = request.query_params.getlist("subject")
         if not subject_names:
@@ -148,7 +142,7 @@ def search_tutors_s(request):
         return {"results": results, "count": len(results)}
     
 def all_tutors_s():
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
 
         cursor.execute("SELECT id, name, german_name FROM subjects")
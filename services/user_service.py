@@ -1,9 +1,9 @@
 from fastapi import HTTPException
 from fastapi.responses import RedirectResponse
-from api.v1.deps import get_db, verify_password
+from api.v1.deps import get_read_db, verify_password
 
 def login_s(request, username, pw):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "SELECT u.id, u.username, u.firstname, u.lastname, u.password, r.name as role, u.class as class "
@@ -25,7 +25,7 @@ def login_s(request, username, pw):
     return RedirectResponse(url="/app/index.html", status_code=302)
 
 def get_profile(session_data):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute(
             """
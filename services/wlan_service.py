@@ -1,12 +1,13 @@
-from api.v1.deps import get_db
+from fastapi import HTTPException
+from api.v1.deps import db_write, get_read_db
+from events import parse_user_ids, publish_event
 
 def get_wlan_codes(session_data):
-    with get_db() as conn:
-        cursor = conn.cursor()
+    # expired codes are left out below anyway, nobody waits for the cleanup
+    db_write(lambda conn: conn.execute("DELETE FROM wlan_codes WHERE expiry <= CURRENT_TIMESTAMP"), wait=False)
 
-        # remove expired codes first
-        cursor.execute("DELETE FROM wlan_codes WHERE expiry <= CURRENT_TIMESTAMP")
-        conn.commit()
+    with get_read_db() as conn:
+        cursor = conn.cursor()
 
         uid = str(session_data["user_id"])
         exact = uid
@@ -30,10 +31,58 @@ def get_wlan_codes(session_data):
         return {"codes": codes}
     
 def add_wlan_code_s(users, code, expiry):
-    with get_db() as conn:
+    def write(conn):
         cursor = conn.cursor()
-
         cursor.execute("INSERT INTO wlan_codes (user_ids, code, expiry) VALUES (?, ?, ?)", (users, code, expiry),)
-        conn.commit()
+        publish_event(cursor, "wlan_code", {"id": cursor.lastrowid, "code": code, "expiry": expiry}, user_ids=parse_user_ids(users))
+
+    db_write(write)
+    return {"status": "success", "code":{"code": code, "users": users, "expiry": expiry}}
+
+def claim_wlan_voucher_s(session_data):
+    user_id = session_data["user_id"]
+
+    def write(conn):
+        cursor = conn.cursor()
+
+        # a single UPDATE picks and marks the next free voucher, so concurrent
+        # claims never hand out the same code and never hold a read lock that
+        # has to be upgraded. the NOT EXISTS keeps it at one voucher per user.
+        # expiries are stored in CURRENT_TIMESTAMP form (normalize_expiry),
+        # so comparing them as text is exact and keeps the expiry index usable
+        cursor.execute(
+            """
+            UPDATE wlan_vouchers
+            SET claimed_by = ?, claimed_at = CURRENT_TIMESTAMP
+            WHERE id = (
+                SELECT id FROM wlan_vouchers
+                WHERE claimed_by IS NULL
+                AND expiry > CURRENT_TIMESTAMP
+                AND (class_id IS NULL OR class_id = ?)
+                AND (role_id IS NULL OR role_id = (SELECT id FROM roles WHERE name = ?))
+                ORDER BY id
+                LIMIT 1
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM wlan_vouchers
+                WHERE claimed_by = ? AND expiry > CURRENT_TIMESTAMP
+            )
+            RETURNING id, code, expiry
+            """,
+            (user_id, session_data.get("class"), session_data.get("role"), user_id),
+        )
+        row = cursor.fetchone()
+        if row:
+            return {"status": "claimed", "code": {"id": row["id"], "code": row["code"], "expiry": row["expiry"]}}
+
+        cursor.execute(
+            "SELECT id, code, expiry FROM wlan_vouchers WHERE claimed_by = ? AND expiry > CURRENT_TIMESTAMP",
+            (user_id,),
+        )
+        row = cursor.fetchone()
+        if row:
+            return {"status": "already_claimed", "code": {"id": row["id"], "code": row["code"], "expiry": row["expiry"]}}
+
+        raise HTTPException(status_code=404, detail="No WLAN voucher available")
 
-        return {"status": "success", "code":{"code": code, "users": users, "expiry": expiry}}
\ No newline at end of file
+    return db_write(write)
\ No newline at end of file
@@ -57,6 +57,34 @@ function showResults(fetch, response, data) {
 	`);
 }
 
+function classMemberCard(member) {
+	return `<div class="element-card mini mini-user-card">
+							<span>${member.username}</span>
+							<span>${member.firstname} ${member.lastname}</span>
+						</div>`;
+}
+
+// class members come in pages of 50, the button fetches the next one
+function setupLoadMoreMembers(buttonId, containerId, classId, filter) {
+	const button = document.getElementById(buttonId);
+	if (!button) return;
+
+	button.onclick = async () => {
+		const cursor = encodeURIComponent(button.getAttribute("data-cursor"));
+		const response = await fetch(
+			`/api/v1/data/class/${classId}/members?${filter}&after=${cursor}`
+		);
+		if (!response.ok) return;
+		const data = await response.json();
+
+		document
+			.getElementById(containerId)
+			.insertAdjacentHTML("beforeend", data.members.map(classMemberCard).join(""));
+		if (data.next) button.setAttribute("data-cursor", data.next);
+		else button.remove();
+	};
+}
+
 async function clickOnClassCard(id) {
 	closeModal();
 
@@ -77,33 +105,23 @@ async function clickOnClassCard(id) {
 		<span>Schüler:</span>
 			${
 				data.class.student_count >= 1
-					? `<div class="element-card-mini-container">` +
-						data.students
-							.map(
-								(student) =>
-									`<div class="element-card mini mini-user-card">
-							<span>${student.username}</span>
-							<span>${student.firstname} ${student.lastname}</span>
-						</div>`
-							)
-							.join("") +
-						`</div>`
+					? `<div class="element-card-mini-container" id="class-students">` +
+						data.students.map(classMemberCard).join("") +
+						`</div>` +
+						(data.students_next
+							? `<button id="more-students-btn" data-cursor="${data.students_next}">Weitere laden</button>`
+							: "")
 					: "Keine<br />"
 			}
 		<span>Andere Benutzer:</span>
 			${
 				data.class.others_count >= 1
-					? `<div class="element-card-mini-container">` +
-						data.others
-							.map(
-								(other) =>
-									`<div class="element-card mini mini-user-card">
-							<span>${other.username}</span>
-							<span>${other.firstname} ${other.lastname}</span>
-						</div>`
-							)
-							.join("") +
-						`</div>`
+					? `<div class="element-card-mini-container" id="class-others">` +
+						data.others.map(classMemberCard).join("") +
+						`</div>` +
+						(data.others_next
+							? `<button id="more-others-btn" data-cursor="${data.others_next}">Weitere laden</button>`
+							: "")
 					: "Keine<br /><br />"
 			}
 		<button id="save-class-btn">Änderungen speichern</button>
@@ -113,6 +131,9 @@ async function clickOnClassCard(id) {
 	`);
 
 	if (response.ok) {
+		setupLoadMoreMembers("more-students-btn", "class-students", classId, "role=1");
+		setupLoadMoreMembers("more-others-btn", "class-others", classId, "others=true");
+
 		document.getElementById("save-class-btn").onclick = async () => {
 			const modalH2 = document.getElementById("modal-h2");
 			const classId = modalH2.getAttribute("data-class-id");
@@ -1383,8 +1404,8 @@ async function clickOnParentNotificationCard(id) {
 				? `<div class="element-card-mini-container">${attachments
 						.map(
 							(file) => `
-							<a href="/files/${file}" target="_blank">
-								<button class="small">${file}</button>
+							<a href="${attachmentLink(file).href}" target="_blank">
+								<button class="small">${attachmentLink(file).name}</button>
 							</a>
 						`
 						)
@@ -1434,7 +1455,7 @@ async function addParentNotification() {
 	const response = await fetch("/api/v1/data/get-users?all=true");
 	const data = await response.json();
 
-	const filesResponse = await fetch("/api/v1/data/get-files");
+	const filesResponse = await fetch("/api/v1/data/get-files?all=true");
 	const filesData = await filesResponse.json();
 
 	openModal(`
@@ -1461,12 +1482,14 @@ async function addParentNotification() {
 		${filesData.files
 			.map(
 				(file) =>
-					`<option value="${file}">
-						${file}
+					`<option value="${file.name}">
+						${file.name}
 					</option>`
 			)
 			.join("")}
 	</select>
+	<label for="attachment-upload">Neue Anhänge hochladen:</label>
+	<input type="file" id="attachment-upload" multiple />
 	<label>Rückmeldung:</label>
 	<div style="display: flex;" id="feedbacks">
 		<div class="feedback-preview" style="cursor: pointer;" id="add-feedback-field">
@@ -1488,7 +1511,7 @@ async function addParentNotification() {
 
 		document.getElementById("fetch-hint-2").onclick = () => {
 			showResults(
-				"/api/v1/data/get-files",
+				"/api/v1/data/get-files?all=true",
 				filesResponse,
 				JSON.stringify(filesData, null, 4)
 			);
@@ -1584,12 +1607,17 @@ async function addParentNotification() {
 		)
 			.map((opt) => opt.value)
 			.join(";");
-		const attachments = JSON.stringify(
-			Array.from(
+		const uploaded = await uploadAttachments(
+			document.getElementById("attachment-upload").files
+		);
+		if (uploaded === null) return;
+		const attachments = JSON.stringify([
+			...Array.from(
 				document.getElementById("attachments").selectedOptions,
 				(opt) => opt.value
-			)
-		);
+			),
+			...uploaded
+		]);
 		const feedbacksEl = document.getElementById("feedback-fields");
 
 		let feedbacks = [];
@@ -1742,10 +1770,53 @@ btnDetailsParentNotification.onclick = async () => {
 	clickOnParentNotificationDetailsBtn();
 };
 
+// attachments are file names in /files (older notifications) or uploads
+// from the attachment store as { id, name }
+function attachmentLink(attachment) {
+	if (typeof attachment === "string") {
+		return { href: `/files/${attachment}`, name: attachment };
+	}
+	return {
+		href: `/api/v1/attachments/${attachment.id}?name=${encodeURIComponent(attachment.name)}`,
+		name: attachment.name
+	};
+}
+
+// the file is sent as the request body, the server stores it by content
+async function uploadAttachments(files) {
+	const uploaded = [];
+	for (const file of files) {
+		const response = await fetch(
+			`/api/v1/attachments/?name=${encodeURIComponent(file.name)}`,
+			{
+				method: "POST",
+				headers: {
+					"Content-Type": file.type || "application/octet-stream"
+				},
+				body: file
+			}
+		);
+		if (!response.ok) {
+			closeModal();
+			openModal(`
+				<h2>Fehler beim Hochladen</h2>
+				<p>Der Anhang ${file.name} konnte nicht hochgeladen werden.</p>
+				<button onclick="closeModal()">OK</button>
+			`);
+			return null;
+		}
+		const result = await response.json();
+		uploaded.push({ id: result.id, name: result.name });
+	}
+	return uploaded;
+}
+
 // push
 async function sendPush() {
 	const response = await fetch("/api/v1/data/get-users?all=true");
 	const data = await response.json();
+	const classes = await (await fetch("/api/v1/data/get-classes")).json();
+	const roles = await (await fetch("/api/v1/data/roles")).json();
 
 	openModal(`
 		<h2>Push-Benachrichtigung senden ${DEV_MODE ? `<span class="fetch-hint" id="fetch-hint-1"></span>` : ""}</h2>
@@ -1754,11 +1825,16 @@ async function sendPush() {
 		<label for="push-message">Nachricht:</label>
 		<textarea id="push-message" ${DEV_MODE ? `placeholder="push-message"` : ""}></textarea>
 		<div class="push-users-container">
-			<input type="checkbox" id="push-send-all" />
-			<label for="push-send-all">An alle Benutzer senden</label>
-			<div id="push-users-container">
+			<label for="push-target">Senden an:</label>
+			<select id="push-target">
+				<option value="users">Ausgewählte Benutzer</option>
+				<option value="class">Eine Klasse</option>
+				<option value="role">Eine Benutzergruppe</option>
+				<option value="all">Alle Benutzer</option>
+			</select>
+			<div id="push-users-container" class="push-target-container">
 				<label for="push-users">Empfänger:</label>
-				<select id="push-users">
+				<select id="push-users" multiple>
 					${data.users
 						.map(
 							(user) =>
@@ -1769,7 +1845,21 @@ async function sendPush() {
 						.join("")}
 				</select>
 			</div>
+			<div id="push-class-container" class="push-target-container" style="display: none">
+				<label for="push-class">Klasse:</label>
+				<select id="push-class">
+					${classes.classes.map((cls) => `<option value="${cls.id}">${cls.name}</option>`).join("")}
+				</select>
+			</div>
+			<div id="push-role-container" class="push-target-container" style="display: none">
+				<label for="push-role">Benutzergruppe:</label>
+				<select id="push-role">
+					${roles.roles.map((role) => `<option value="${role.id}">${role.german_name}</option>`).join("")}
+				</select>
+			</div>
 		</div>
+		<label for="push-send-at">Senden am (leer = sofort):</label>
+		<input type="datetime-local" id="push-send-at" />
 		<button id="send-push-btn">Push-Benachrichtigung senden</button>
 	`);
 
@@ -1777,7 +1867,7 @@ async function sendPush() {
 		new Choices("#push-users", {
 			searchEnabled: true,
 			itemSelectText: "",
-			removeItemButton: false,
+			removeItemButton: true,
 			shouldSort: false,
 			placeholderValue: "Auswählen...",
 			classNames: {
@@ -1796,45 +1886,67 @@ async function sendPush() {
 		};
 	}
 
-	document.getElementById("push-send-all").onchange = (e) => {
-		const pushUsersSelectContainer = document.getElementById(
-			"push-users-container"
-		);
-		if (e.target.checked) {
-			pushUsersSelectContainer.style.display = "none";
-		} else {
-			pushUsersSelectContainer.style.display = "block";
+	document.getElementById("push-target").onchange = (e) => {
+		for (const container of document.querySelectorAll(".push-target-container")) {
+			container.style.display = "none";
 		}
+		const container = document.getElementById(`push-${e.target.value}-container`);
+		if (container) container.style.display = "block";
 	};
 
 	document.getElementById("send-push-btn").onclick = async () => {
 		const title = document.getElementById("push-title").value;
 		const message = document.getElementById("push-message").value;
-		const sendToAll = document.getElementById("push-send-all").checked;
-		const selectedUser = document.getElementById("push-users").value;
+		const target = document.getElementById("push-target").value;
+
+		const sendAt = document.getElementById("push-send-at").value;
+
+		// one request per audience, the server resolves the recipients
+		let url = "/api/v1/administration/send-all";
+		const payload = { title: title, body: message };
+		if (target === "users") {
+			url = "/api/v1/administration/send-users";
+			payload.user_ids = Array.from(
+				document.getElementById("push-users").selectedOptions
+			).map((option) => parseInt(option.value));
+		} else if (target === "class") {
+			url = "/api/v1/administration/send-class";
+			payload.class_id = parseInt(document.getElementById("push-class").value);
+		} else if (target === "role") {
+			url = "/api/v1/administration/send-role";
+			payload.role_id = parseInt(document.getElementById("push-role").value);
+		}
+		if (sendAt) {
+			// queued, the server sends it at the given time
+			url = "/api/v1/administration/schedule-push";
+			payload.send_at = new Date(sendAt).toISOString();
+		}
 
-		const response = await fetch(
-			sendToAll
-				? "/api/v1/administration/send-all"
-				: "/api/v1/administration/send-user",
-			{
-				method: "POST",
-				headers: {
-					"Content-Type": "application/json"
-				},
-				body: JSON.stringify({
-					title: title,
-					body: message,
-					user_id: selectedUser
-				})
-			}
-		);
+		const response = await fetch(url, {
+			method: "POST",
+			headers: {
+				"Content-Type": "application/json"
+			},
+			body: JSON.stringify(payload)
+		});
+
+		if (response.ok && sendAt) {
+			const result = await response.json();
+			closeModal();
+			openModal(`
+				<h2>Push-Benachrichtigung geplant</h2>
+				<p>Die Push-Benachrichtigung wird am ${new Date(sendAt).toLocaleString("de-DE")} an ${result.recipients} Benutzer gesendet.</p>
+				<button onclick="closeModal()">OK</button>
+			`);
+			return;
+		}
 
 		if (response.ok) {
+			const result = await response.json();
 			closeModal();
 			openModal(`
 				<h2>Push-Benachrichtigung gesendet</h2>
-				<p>Die Push-Benachrichtigung wurde erfolgreich gesendet.</p>
+				<p>Die Push-Benachrichtigung wurde an ${result.sent} von ${result.total} Geräten gesendet.</p>
 				<button onclick="closeModal()">OK</button>
 			`);
 		} else {
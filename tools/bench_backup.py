@@ -0,0 +1,132 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# backup throughput and what a running backup does to request latency. a
+# load thread keeps reading and writing through get_db() while backups with
+# different step sizes run:
+#   python -m tools.bench_backup [--pad-mb 200] [--seconds 3]
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("RATELIMIT_STORAGE_URI", "memory://")
+os.environ.setdefault("SESSION_SECRET_KEY", "bench")
+
+from api.v1 import deps  # noqa: E402
+import backup  # noqa: E402
+from tools import seed  # noqa: E402
+
+# (label, pages per step, sleep between steps, hold a read transaction)
+VARIANTS = [
+    ("all pages at once", -1, 0, True),
+    ("1024 pages/step", 1024, 0.005, True),
+    ("256 pages/step (default)", 256, 0.005, True),
+    ("64 pages/step", 64, 0.005, True),
+    ("256 pages/step, no read txn", 256, 0.005, False),
+]
+
+def pad(db_path, megabytes):
+    # filler so the copy takes long enough to measure
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE bench_padding (data BLOB)")
+    conn.executemany("INSERT INTO bench_padding VALUES (?)", ((os.urandom(4000),) for _ in range(megabytes * 256)))
+    conn.commit()
+    conn.close()
+
+class Load(threading.Thread):
+    # alternating reads and small writes, like requests would do
+    def __init__(self, user_ids):
+        super().__init__(daemon=True)
+        self.user_ids = user_ids
+        self.latencies = []
+        self.errors = 0
+        self.running = True
+
+    def run(self):
+        i = 0
+        while self.running:
+            user_id = self.user_ids[i % len(self.user_ids)]
+            start = time.perf_counter()
+            try:
+                with deps.get_db() as conn:
+                    conn.execute("SELECT id, username, firstname, lastname FROM users WHERE id = ?", (user_id,)).fetchone()
+                    if i % 4 == 0:
+                        conn.execute("UPDATE users SET lastname = lastname WHERE id = ?", (user_id,))
+                        conn.commit()
+            except sqlite3.OperationalError:
+                self.errors += 1
+            self.latencies.append((time.perf_counter() - start) * 1000)
+            i += 1
+            time.sleep(0.001)
+
+def run_backup(db_path, target_path, pages, sleep, snapshot):
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+
+    source = sqlite3.connect(db_path, isolation_level=None)
+    target = sqlite3.connect(target_path)
+    try:
+        if snapshot:
+            backup.copy_database(source, target, pages, sleep, progress)
+        else:
+            source.backup(target, pages=pages, sleep=sleep, progress=progress)
+    finally:
+        target.close()
+        source.close()
+    return steps
+
+def percentiles(values):
+    values = sorted(values)
+    return statistics.median(values), values[int(len(values) * 0.99) - 1], values[-1]
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m tools.bench_backup")
+    parser.add_argument("--pad-mb", type=int, default=200, help="filler data added to the seeded database")
+    parser.add_argument("--seconds", type=float, default=3, help="length of the baseline measurement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bogy-bench-") as workdir:
+        db_path = os.path.join(workdir, "data.db")
+        seed.generate(db_path, os.path.join(workdir, "feedback"))
+        pad(db_path, args.pad_mb)
+        size = os.path.getsize(db_path) / 1024 / 1024
+        with deps.get_db() as conn:
+            user_ids = [r["id"] for r in conn.execute("SELECT id FROM users").fetchall()]
+        print(f"database: {size:.0f} MiB")
+
+        load = Load(user_ids)
+        load.start()
+        time.sleep(args.seconds)
+        baseline = list(load.latencies)
+        p50, p99, worst = percentiles(baseline)
+        print(f"{'':32} {'seconds':>8} {'MiB/s':>8} {'steps':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'writes':>7}")
+        print(f"{'no backup':32} {'':>8} {'':>8} {'':>7} {p50:>8.2f} {p99:>8.2f} {worst:>8.2f} {len(baseline) // 4:>7}")
+
+        for label, pages, sleep, snapshot in VARIANTS:
+            target = os.path.join(workdir, "copy.db")
+            before = len(load.latencies)
+            start = time.perf_counter()
+            steps = run_backup(db_path, target, pages, sleep, snapshot)
+            seconds = time.perf_counter() - start
+            during = load.latencies[before:]
+            os.remove(target)
+            p50, p99, worst = percentiles(during)
+            print(f"{label:32} {seconds:>8.2f} {size / seconds:>8.0f} {steps:>7} {p50:>8.2f} {p99:>8.2f} {worst:>8.2f} {len(during) // 4:>7}")
+
+        load.running = False
+        load.join()
+        if load.errors:
+            print(f"{load.errors} requests failed with a locked database")
+
+if __name__ == "__main__":
+    main()
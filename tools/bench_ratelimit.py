@@ -0,0 +1,79 @@
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# limiter cost per request: slowapi's fixed-window hit against the in-memory
+# storage and against the SQLite storage the workers share
+# (ratelimit_storage.py), in one process and from several processes at once.
+# "counted" is what one worker sees for a key every process hit; with the
+# in-memory storage each process only counts its own hits.
+#   python -m tools.bench_ratelimit [--hits 20000] [--processes 4]
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from limits import RateLimitItemPerMinute, storage  # noqa: E402
+from limits.strategies import FixedWindowRateLimiter  # noqa: E402
+import ratelimit_storage  # noqa: E402,F401  registers sqlite://
+
+# high enough that no hit is refused, refused hits cost the same anyway
+LIMIT = RateLimitItemPerMinute(10 ** 9)
+# one key per client address, like get_remote_address
+CLIENTS = 100
+SHARED_KEY = "shared"
+
+def hit_loop(uri, hits, start_at=None):
+    limiter = FixedWindowRateLimiter(storage.storage_from_string(uri))
+    if start_at is not None:
+        # all processes start hitting at the same moment
+        time.sleep(max(0.0, start_at - time.time()))
+    latencies = []
+    for i in range(hits):
+        start = time.perf_counter()
+        limiter.hit(LIMIT, f"10.0.{i % CLIENTS // 256}.{i % 256}", "/api/v1/user/login")
+        latencies.append(time.perf_counter() - start)
+    limiter.hit(LIMIT, SHARED_KEY)
+    return latencies, limiter.get_window_stats(LIMIT, SHARED_KEY)
+
+def report(label, latencies, seconds, counted):
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1e6
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1e6
+    print(f"{label:30} {len(latencies) / seconds:>10.0f} {p50:>8.1f} {p99:>8.1f} {counted:>8}")
+
+def single(uri, hits):
+    start = time.perf_counter()
+    latencies, stats = hit_loop(uri, hits)
+    return latencies, time.perf_counter() - start, LIMIT.amount - stats.remaining
+
+def multi(uri, hits, processes):
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes) as pool:
+        start_at = time.time() + 1.0
+        results = pool.starmap(hit_loop, [(uri, hits, start_at)] * processes)
+        seconds = time.time() - start_at
+    latencies = [latency for result, _ in results for latency in result]
+    # the process that hit the shared key last saw all hits before its own
+    return latencies, seconds, max(LIMIT.amount - stats.remaining for _, stats in results)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m tools.bench_ratelimit")
+    parser.add_argument("--hits", type=int, default=20000, help="hits per process")
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bogy-bench-") as workdir:
+        print(f"{args.hits} hits per process, {CLIENTS} client keys")
+        print(f"{'':30} {'hits/s':>10} {'p50 us':>8} {'p99 us':>8} {'counted':>8}")
+        for label, uri in (("memory", "memory://"), ("sqlite", f"sqlite:///{os.path.join(workdir, 'single.db')}")):
+            report(f"{label}, 1 process", *single(uri, args.hits))
+        for label, uri in (("memory", "memory://"), ("sqlite", f"sqlite:///{os.path.join(workdir, 'multi.db')}")):
+            report(f"{label}, {args.processes} processes", *multi(uri, args.hits, args.processes))
+
+if __name__ == "__main__":
+    main()
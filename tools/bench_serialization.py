@@ -0,0 +1,91 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# compares the ways a get_users_s-style result can be fetched and turned into
+# a JSON body, for a large user list:
+#   python -m tools.bench_serialization [--users 10000] [--rounds 20]
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("RATELIMIT_STORAGE_URI", "memory://")
+os.environ.setdefault("SESSION_SECRET_KEY", "bench")
+
+import orjson  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from api.v1.deps import dict_row  # noqa: E402
+from definitions import FastJSONResponse  # noqa: E402
+from tools import seed  # noqa: E402
+
+USERS_QUERY = """
+    SELECT
+        u.id,
+        u.username,
+        u.firstname,
+        u.lastname,
+        r.name AS role_name,
+        r.german_name AS german_role_name,
+        c.name AS class_name
+    FROM users u
+    LEFT JOIN classes c ON u.class = c.id
+    LEFT JOIN roles r ON u.role = r.id
+    ORDER BY u.role ASC, u.lastname ASC, u.firstname ASC
+"""
+
+def fetch(db_path, row_factory):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = row_factory
+    try:
+        return {"users": conn.execute(USERS_QUERY).fetchall(), "pagination": {"page": 1}}
+    finally:
+        conn.close()
+
+# each variant: (row factory, content -> body bytes)
+VARIANTS = {
+    # what the app did before: sqlite3.Row through jsonable_encoder and json.dumps
+    "row + jsonable_encoder + json": (sqlite3.Row, lambda c: JSONResponse(jsonable_encoder(c)).body),
+    "row + jsonable_encoder + orjson": (sqlite3.Row, lambda c: FastJSONResponse(jsonable_encoder(c)).body),
+    "dict_row + jsonable_encoder + orjson": (dict_row, lambda c: FastJSONResponse(jsonable_encoder(c)).body),
+    # returned as a response directly, what the list endpoints do now
+    "dict_row + orjson": (dict_row, lambda c: FastJSONResponse(c).body),
+    "row + orjson default": (sqlite3.Row, lambda c: FastJSONResponse(c).body),
+}
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m tools.bench_serialization")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bogy-bench-") as workdir:
+        db_path = os.path.join(workdir, "users.db")
+        classes = 40
+        seed.generate(
+            db_path, os.path.join(workdir, "feedback"),
+            classes=classes, students_per_class=args.users // classes, teachers=0, tutors=0,
+            wlan_codes=0, wlan_vouchers=0, notifications=0,
+        )
+
+        print(f"{'variant':40} {'fetch ms':>10} {'encode ms':>10} {'total ms':>10} {'KiB':>8}")
+        for name, (row_factory, encode) in VARIANTS.items():
+            fetch_times, encode_times = [], []
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                content = fetch(db_path, row_factory)
+                fetched = time.perf_counter()
+                body = encode(content)
+                fetch_times.append((fetched - start) * 1000)
+                encode_times.append((time.perf_counter() - fetched) * 1000)
+            f, e = statistics.median(fetch_times), statistics.median(encode_times)
+            print(f"{name:40} {f:>10.2f} {e:>10.2f} {f + e:>10.2f} {len(body) / 1024:>8.0f}")
+
+if __name__ == "__main__":
+    main()
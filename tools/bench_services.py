@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# micro-benchmarks for the service layer: calls the functions in services/
+# directly against seeded databases of several sizes (see tools.seed), so one
+# can see how each hot path scales. results can be saved and compared:
+#   python -m tools.bench_services --out bench.json
+#   python -m tools.bench_services --compare bench.json [--threshold 1.25]
+#   python -m tools.bench_services --sizes small --only all_tutors_s,get_users_s_all
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# services import definitions, which reads these at import time
+os.environ.setdefault("RATELIMIT_STORAGE_URI", "memory://")
+os.environ.setdefault("SESSION_SECRET_KEY", "bench")
+os.chdir(ROOT)
+
+from api.v1 import deps  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from tools import seed  # noqa: E402
+import services.import_service as import_service  # noqa: E402
+import services.parentnotification_service as parentnotification_service  # noqa: E402
+from services.administration_service import upload_wlan_vouchers_s  # noqa: E402
+from services.data_service import get_users_s  # noqa: E402
+from services.pw_service import encrypt_secret_s, get_cipher, new_user_key, change_unlock_key_s  # noqa: E402
+from services.tutoring_service import all_tutors_s, search_tutors_s  # noqa: E402
+from services.wlan_service import claim_wlan_voucher_s, get_wlan_codes  # noqa: E402
+
+SIZES = {
+    "small": {
+        "dataset": dict(classes=8, students_per_class=25, teachers=20, tutors=30, wlan_codes=50, wlan_vouchers=200, notifications=40),
+        "secrets": 50,
+        "untis_users": 10,
+    },
+    "medium": {
+        "dataset": dict(classes=32, students_per_class=28, teachers=80, tutors=120, wlan_codes=200, wlan_vouchers=2000, notifications=150),
+        "secrets": 500,
+        "untis_users": 30,
+    },
+    "large": {
+        "dataset": dict(classes=96, students_per_class=30, teachers=240, tutors=600, wlan_codes=1000, wlan_vouchers=10000, notifications=600),
+        "secrets": 3000,
+        "untis_users": 90,
+    },
+}
+
+BENCHMARKS = {}
+
+def benchmark(name, rounds):
+    # registers a benchmark. the decorated function gets the size context and
+    # returns the callable to time; everything before the return is setup
+    def register(func):
+        BENCHMARKS[name] = (func, rounds)
+        return func
+    return register
+
+def query_request(query):
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": query.encode()})
+
+def first_student(conn):
+    return conn.execute("SELECT id FROM users WHERE role = 1 ORDER BY id LIMIT 1").fetchone()["id"]
+
+@benchmark("search_tutors_s", rounds=50)
+def bench_search_tutors(ctx):
+    request = query_request("subject=maths&subject=physics&subject=english")
+    return lambda: search_tutors_s(request)
+
+@benchmark("all_tutors_s", rounds=50)
+def bench_all_tutors(ctx):
+    return all_tutors_s
+
+@benchmark("get_parentnotifications_s", rounds=50)
+def bench_get_parentnotifications(ctx):
+    session_data = {"user_id": ctx["student_id"]}
+    return lambda: parentnotification_service.get_parentnotifications_s(session_data)
+
+@benchmark("get_wlan_codes", rounds=100)
+def bench_get_wlan_codes_student(ctx):
+    session_data = {"user_id": ctx["student_id"]}
+    return lambda: get_wlan_codes(session_data)
+
+@benchmark("claim_wlan_voucher_s", rounds=100)
+def bench_claim_wlan_voucher(ctx):
+    # a different student per call, so every call hands out a voucher; the
+    # extra vouchers without a class make sure the pool does not run dry.
+    # one more student checks first that a voucher uploaded with an ISO
+    # expiry (T form, expired a minute ago) is not handed out
+    rounds = BENCHMARKS["claim_wlan_voucher_s"][1] + 2
+    with deps.get_db() as conn:
+        students = conn.execute(
+            """
+            SELECT u.id, u.class, r.name AS role FROM users u JOIN roles r ON r.id = u.role
+            WHERE u.role = 1 AND NOT EXISTS (SELECT 1 FROM wlan_vouchers v WHERE v.claimed_by = u.id)
+            ORDER BY u.id LIMIT ?
+            """,
+            (rounds,),
+        ).fetchall()
+        conn.executemany(
+            "INSERT OR IGNORE INTO wlan_vouchers (code, expiry) VALUES (?, ?)",
+            [(f"BENCH-{n:06d}", seed.FUTURE) for n in range(rounds)],
+        )
+    sessions = iter([{"user_id": s["id"], "class": s["class"], "role": s["role"]} for s in students])
+
+    expired = (datetime.now(timezone.utc) - timedelta(minutes=1)).strftime("%Y-%m-%dT%H:%M:%S")
+    upload_wlan_vouchers_s("code\nBENCH-EXPIRED\n", expired)
+    with deps.get_db() as conn:
+        # first in line for the claim
+        conn.execute("UPDATE wlan_vouchers SET id = -1 WHERE code = 'BENCH-EXPIRED'")
+    claimed = claim_wlan_voucher_s(next(sessions))["code"]["code"]
+    if claimed == "BENCH-EXPIRED":
+        raise SystemExit("claim_wlan_voucher_s handed out an expired voucher")
+    return lambda: claim_wlan_voucher_s(next(sessions))
+
+@benchmark("get_users_s_all", rounds=20)
+def bench_get_users_all(ctx):
+    return lambda: get_users_s(all=True)
+
+@benchmark("get_users_s_page", rounds=100)
+def bench_get_users_page(ctx):
+    return lambda: get_users_s(page=2)
+
+@benchmark("feedback_s", rounds=50)
+def bench_feedback(ctx):
+    # the "all" notifications carry the most answers, so the biggest file
+    session_data = {"user_id": ctx["student_id"]}
+    answer = {"0": "yes", "1": "Wir kommen."}
+    return lambda: parentnotification_service.feedback_s(session_data, ctx["notification_id"], answer)
+
+@benchmark("change_unlock_key_s", rounds=3)
+def bench_change_unlock_key(ctx):
+    # one user with ctx["secrets"] secrets, rotated back and forth between two keys
+    user_id = ctx["student_id"]
+    keys = ["bench-key-a", "bench-key-b"]
+    hashed_key, kdf_salt = new_user_key(keys[0])
+    cipher = get_cipher(keys[0], kdf_salt)
+    with deps.get_db() as conn:
+        conn.execute("DELETE FROM secrets WHERE user_id = ?", (user_id,))
+        conn.execute("DELETE FROM key_rotations WHERE user_id = ?", (user_id,))
+        conn.execute(
+            "INSERT OR REPLACE INTO user_keys (user_id, hashed_key, kdf_salt) VALUES (?, ?, ?)",
+            (user_id, hashed_key, kdf_salt),
+        )
+        conn.executemany(
+            "INSERT INTO secrets (user_id, name, encrypted_value) VALUES (?, ?, ?)",
+            [(user_id, f"secret-{n}", encrypt_secret_s(f"value-{n}", cipher)) for n in range(ctx["secrets"])],
+        )
+
+    def run():
+        change_unlock_key_s(user_id, keys[0], keys[1])
+        keys.reverse()
+    return run
+
+@benchmark("import_untis_users_s", rounds=3)
+def bench_import_untis_users(ctx):
+    # untis is stubbed, this measures user creation (one password hash each)
+    counter = [0]
+    count = ctx["untis_users"]
+
+    def get_users():
+        counter[0] += 1
+        people = [{"foreName": f"Bench{counter[0]}", "longName": f"Person {n}"} for n in range(count)]
+        return {"teachers": {"result": people[: count // 10]}, "students": {"result": people[count // 10:]}}
+
+    import_service.untis = types.SimpleNamespace(get_users=get_users)
+    return import_service.import_untis_users_s
+
+def run_benchmark(func, rounds):
+    func()  # warm-up, also fills the page cache
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "rounds": rounds,
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+    }
+
+def run_size(size, names, workdir):
+    spec = SIZES[size]
+    db_path = os.path.join(workdir, f"{size}.db")
+    feedback_dir = os.path.join(workdir, f"{size}-feedback")
+    dataset = seed.generate(db_path, feedback_dir, **spec["dataset"])
+    parentnotification_service.FEEDBACK_DIR = feedback_dir
+
+    with deps.get_db() as conn:
+        ctx = {
+            "student_id": first_student(conn),
+            "notification_id": conn.execute("SELECT MIN(id) AS id FROM parentnotifications WHERE user_ids = 'all'").fetchone()["id"],
+            "secrets": spec["secrets"],
+            "untis_users": spec["untis_users"],
+        }
+
+    results = {}
+    original_untis = import_service.untis
+    try:
+        for name in names:
+            setup, rounds = BENCHMARKS[name]
+            results[name] = run_benchmark(setup(ctx), rounds)
+            print(f"  {size:6} {name:26} {results[name]['median_ms']:>10.3f} ms")
+    finally:
+        import_service.untis = original_untis
+    return {"dataset": dataset, "benchmarks": results}
+
+def print_table(results, sizes):
+    print(f"\n{'median ms':26}" + "".join(f"{s:>12}" for s in sizes))
+    names = results[sizes[0]]["benchmarks"].keys()
+    for name in names:
+        row = [results[s]["benchmarks"][name]["median_ms"] for s in sizes]
+        print(f"{name:26}" + "".join(f"{v:>12.3f}" for v in row))
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for size, result in results.items():
+        base = baseline.get(size, {}).get("benchmarks", {})
+        for name, b in result["benchmarks"].items():
+            if name in base and base[name]["median_ms"] > 0:
+                ratio = b["median_ms"] / base[name]["median_ms"]
+                if ratio > threshold:
+                    regressions.append(f"{size} {name}: {base[name]['median_ms']:.3f} -> {b['median_ms']:.3f} ms ({ratio:.2f}x)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m tools.bench_services")
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"comma separated, from {', '.join(SIZES)}")
+    parser.add_argument("--only", help="comma separated benchmark names")
+    parser.add_argument("--out", help="write results as JSON (e.g. a new baseline)")
+    parser.add_argument("--compare", help="baseline JSON to compare medians against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="median ratio counted as regression")
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(",")
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            sys.exit(f"unknown benchmark {name}, available: {', '.join(BENCHMARKS)}")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bogy-bench-") as workdir:
+        for size in sizes:
+            results[size] = run_size(size, names, workdir)
+
+    print_table(results, sizes)
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\nresults written to {args.out}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text(encoding="utf-8")), args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
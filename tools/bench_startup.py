@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# worker startup: importing the app, the schema step of the lifespan hook
+# (migrations.ensure_schema) on a fresh database, and the same step once the
+# database is up to date. every worker is its own process, as under
+# uvicorn --workers; they start the schema step at the same moment, so the
+# first start shows the others waiting on the migration lock.
+#   python -m tools.bench_startup [--workers 4] [--rounds 3]
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def child(start_at):
+    # one worker: prints its import and schema step times as JSON
+    sys.path.insert(0, str(ROOT))
+    start = time.perf_counter()
+    import main  # noqa: F401
+    import migrations
+    import_s = time.perf_counter() - start
+
+    time.sleep(max(0.0, start_at - time.time()))
+    start = time.perf_counter()
+    migrations.ensure_schema()
+    print(json.dumps({"import_s": import_s, "schema_s": time.perf_counter() - start}))
+
+def run_workers(db_path, workers, delay):
+    env = {
+        **os.environ,
+        "DB_PATH": db_path,
+        "RATELIMIT_STORAGE_URI": "memory://",
+        "SESSION_SECRET_KEY": "bench",
+        "METRICS_DIR": "",
+    }
+    start_at = time.time() + delay
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-m", "tools.bench_startup", "--child", str(start_at)],
+            cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True,
+        )
+        for _ in range(workers)
+    ]
+    results = []
+    for proc in procs:
+        out, _ = proc.communicate()
+        if proc.returncode != 0:
+            sys.exit(f"worker failed with exit code {proc.returncode}")
+        # migrations print what they apply, the times are the last line
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    return results
+
+def ms(seconds):
+    return f"{seconds * 1000:>9.1f}"
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m tools.bench_startup")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--delay", type=float, default=5.0, help="seconds the workers get to import before the schema step")
+    parser.add_argument("--child", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        child(args.child)
+        return
+
+    imports, first, waiting, warm = [], [], [], []
+    with tempfile.TemporaryDirectory(prefix="bogy-bench-") as workdir:
+        for n in range(args.rounds):
+            db_path = os.path.join(workdir, f"round{n}.db")
+            cold = sorted(r["schema_s"] for r in run_workers(db_path, args.workers, args.delay))
+            # the slowest worker ran the migrations (the others waited for it)
+            first.append(cold[-1])
+            waiting.extend(cold[:-1])
+            results = run_workers(db_path, args.workers, args.delay)
+            imports.extend(r["import_s"] for r in results)
+            warm.extend(r["schema_s"] for r in results)
+
+    print(f"{args.workers} workers, {args.rounds} rounds")
+    print(f"{'':34} {'p50 ms':>9} {'max ms':>9}")
+    rows = [
+        ("import main (workers at once)", imports),
+        ("first start, migrating worker", first),
+        ("first start, waiting workers", waiting),
+        ("warm start (no-op)", warm),
+    ]
+    for label, values in rows:
+        if values:
+            print(f"{label:34} {ms(statistics.median(values))} {ms(max(values))}")
+
+if __name__ == "__main__":
+    main()
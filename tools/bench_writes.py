@@ -0,0 +1,93 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# small concurrent writes (feedback answers) the old way, one connection and
+# one commit per write through get_db(), against the writer thread's group
+# commit through db_write():
+#   python -m tools.bench_writes [--threads 32] [--writes 200]
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("RATELIMIT_STORAGE_URI", "memory://")
+os.environ.setdefault("SESSION_SECRET_KEY", "bench")
+# every contended commit would be reported as slow
+os.environ.setdefault("SLOW_QUERY_MS", "60000")
+
+from api.v1 import deps  # noqa: E402
+from metrics import DB_WRITE_BATCH  # noqa: E402
+from tools import seed  # noqa: E402
+
+ANSWER_SQL = "INSERT OR REPLACE INTO parentnotification_answers (notification_id, user_id) VALUES (?, ?)"
+
+def per_connection(notification_id, user_id):
+    with deps.get_db() as conn:
+        conn.execute(ANSWER_SQL, (notification_id, user_id))
+        conn.commit()
+
+def group_commit(notification_id, user_id):
+    deps.db_write(lambda conn: conn.execute(ANSWER_SQL, (notification_id, user_id)))
+
+def batch_count():
+    entry = DB_WRITE_BATCH.values().get(())
+    return sum(entry[0]) if entry else 0
+
+def run(write, threads, writes, notification_ids, user_ids):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(n):
+        nonlocal errors
+        for i in range(writes):
+            start = time.perf_counter()
+            try:
+                write(notification_ids[i % len(notification_ids)], user_ids[(n * writes + i) % len(user_ids)])
+            except sqlite3.OperationalError:
+                with lock:
+                    errors += 1
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return seconds, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1], errors
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m tools.bench_writes")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--writes", type=int, default=200, help="writes per thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bogy-bench-") as workdir:
+        deps.DB_PATH = os.path.join(workdir, "data.db")
+        seed.generate(deps.DB_PATH, os.path.join(workdir, "feedback"))
+        with deps.get_db() as conn:
+            notification_ids = [r["id"] for r in conn.execute("SELECT id FROM parentnotifications").fetchall()]
+            user_ids = [r["id"] for r in conn.execute("SELECT id FROM users").fetchall()]
+
+        total = args.threads * args.writes
+        print(f"{total} writes from {args.threads} threads")
+        print(f"{'':24} {'seconds':>8} {'writes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'locked':>7} {'commits':>8}")
+        for label, write in (("connection per write", per_connection), ("writer thread", group_commit)):
+            batches = batch_count()
+            seconds, p50, p99, errors = run(write, args.threads, args.writes, notification_ids, user_ids)
+            commits = total - errors if write is per_connection else int(batch_count() - batches)
+            print(f"{label:24} {seconds:>8.2f} {total / seconds:>9.0f} {p50:>8.2f} {p99:>8.2f} {errors:>7} {commits:>8}")
+        deps.db_writer.stop()
+
+if __name__ == "__main__":
+    main()
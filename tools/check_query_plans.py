@@ -0,0 +1,209 @@
+import argparse
+import ast
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+# runs EXPLAIN QUERY PLAN for every SQL literal passed to execute()/executemany()
+# in services/ against a migrated and seeded throwaway database, and fails when
+# a statement scans one of the large tables. run from the repository root:
+#   python -m tools.check_query_plans [-v]
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from api.v1 import deps  # noqa: E402
+import migrations  # noqa: E402
+
+LARGE_TABLES = {
+    "users",
+    "push_subscriptions",
+    "tutoring",
+    "parentnotifications",
+    "secrets",
+    "wlan_codes",
+    "wlan_vouchers",
+    "unlock_sessions",
+    "key_rotations",
+}
+
+# (service file, function) -> why a full scan is what we want there
+ALLOWED_SCANS = {
+    ("administration_service.py", "get_wlan_voucher_pool_s"): "aggregates the whole pool",
+    ("data_service.py", "get_users_s"): "pages through all users in index order",
+    ("parentnotification_service.py", "get_parentnotifications_s"): "lists every notification",
+    ("push_service.py", "select_push_subscriptions"): "checked without filters, push_all sends to every subscription",
+    ("push_service.py", "enqueue_push"): "checked without filters, a broadcast queues every subscribed user",
+    ("tutoring_service.py", "search_tutors_s"): "subjects are a CSV column, every tutor is checked",
+    ("tutoring_service.py", "all_tutors_s"): "lists every tutor",
+    ("wlan_service.py", "claim_wlan_voucher_s"): "walks the free-voucher index, stops at the first match",
+}
+
+SKIPPED_PREFIXES = ("PRAGMA", "CREATE", "DROP", "ALTER", "BEGIN", "COMMIT", "ROLLBACK", "ANALYZE", "VACUUM")
+
+ALIAS_RE = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+TABLE_SLOT = "{table}"
+TABLE_SLOT_RE = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+\{table\}", re.IGNORECASE)
+SQL_KEYWORDS = {"where", "on", "left", "join", "inner", "group", "order", "limit", "set", "values", "using", "indexed"}
+
+def find_statements(services_dir):
+    for path in sorted(services_dir.glob("*.py")):
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        # module-level SQL fragments like PN_AUDIENCE_SQL are put in as written
+        constants = {
+            node.targets[0].id: node.value.value
+            for node in tree.body
+            if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name)
+            and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+        }
+        # top-level functions only: statements in nested write jobs
+        # (db_write) belong to the service function around them
+        for func in tree.body:
+            if not isinstance(func, ast.FunctionDef):
+                continue
+            for call in ast.walk(func):
+                if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute)):
+                    continue
+                if call.func.attr not in ("execute", "executemany") or not call.args:
+                    continue
+                arg = call.args[0]
+                if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                    sql = arg.value
+                elif isinstance(arg, ast.JoinedStr):
+                    # f-strings build placeholder lists like IN ({placeholders})
+                    # or add optional clauses, which are checked left out
+                    sql = "".join(fstring_part(v, constants) for v in arg.values)
+                    if TABLE_SLOT_RE.search(sql):
+                        # table names filled in at runtime, nothing to plan
+                        continue
+                else:
+                    continue
+                if sql.strip().upper().startswith(SKIPPED_PREFIXES):
+                    continue
+                yield path.name, func.name, call.lineno, sql
+
+def fstring_part(value, constants):
+    if isinstance(value, ast.Constant):
+        return value.value
+    # loops over table lists (USER_DEPENDENTS) name their variable `table`
+    if isinstance(value.value, ast.Name) and value.value.id == "table":
+        return TABLE_SLOT
+    if isinstance(value.value, ast.Name) and "placeholders" in value.value.id:
+        return "?"
+    if isinstance(value.value, ast.Name) and value.value.id in constants:
+        return constants[value.value.id]
+    return ""
+
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in ALIAS_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+def explain(conn, sql):
+    try:
+        return conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    except sqlite3.ProgrammingError as e:
+        # bind NULL for every parameter, the plan does not depend on values
+        count = int(re.search(r"uses (\d+)", str(e)).group(1))
+        return conn.execute(f"EXPLAIN QUERY PLAN {sql}", (None,) * count).fetchall()
+
+def seed(conn):
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO classes (name) VALUES (?)", [(f"{g}{c}",) for g in range(5, 13) for c in "abcd"])
+    cursor.executemany(
+        "INSERT INTO users (username, firstname, lastname, password, role, class) VALUES (?, ?, ?, 'x', ?, ?)",
+        # every seventh user without a lastname, like imported accounts
+        [(f"user{i}", f"First{i}", None if i % 7 == 0 else f"Last{i % 500}", 1 if i % 10 else 2, i % 32 + 1) for i in range(3000)]
+    )
+    cursor.executemany("INSERT INTO tutoring (user, subjects) VALUES (?, '1,7')", [(i,) for i in range(1, 3000, 20)])
+    cursor.executemany(
+        "INSERT INTO push_subscriptions (user_id, endpoint, p256dh, auth) VALUES (?, ?, 'k', 'a')",
+        [(i, f"https://push.example/{i}") for i in range(1, 3000, 2)]
+    )
+    cursor.executemany(
+        "INSERT INTO parentnotifications (title, body, feedback, attachments, user_ids) VALUES (?, 'b', '[]', '[]', 'all')",
+        [(f"n{i}",) for i in range(300)]
+    )
+    cursor.executemany(
+        "INSERT INTO wlan_codes (user_ids, code, expiry) VALUES (?, ?, '2999-01-01 00:00:00.000')",
+        [(str(i), f"code{i}") for i in range(1, 3000, 3)]
+    )
+    cursor.executemany(
+        "INSERT INTO wlan_vouchers (code, class_id, expiry, claimed_by) VALUES (?, ?, '2999-01-01 00:00:00.000', ?)",
+        [(f"v{i}", i % 32 + 1, i if i < 2000 else None) for i in range(1, 5000)]
+    )
+    cursor.executemany(
+        "INSERT INTO secrets (user_id, name, encrypted_value) VALUES (?, ?, 'x')",
+        [(i % 3000 + 1, f"s{i}") for i in range(6000)]
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+
+def check_rosters(limit=7):
+    # keyset paging has to return every member exactly once, members without
+    # a lastname included
+    from services.data_service import select_class_members
+
+    failures = []
+    with deps.get_read_db() as conn:
+        cursor = conn.cursor()
+        for class_id in (1, 2, 3):
+            for roles in ([1], [2, 3, 4]):
+                cursor.execute(
+                    f"SELECT id FROM users WHERE class = ? AND role IN ({', '.join('?' * len(roles))})",
+                    (class_id, *roles),
+                )
+                expected = sorted(r["id"] for r in cursor.fetchall())
+                seen, after = [], None
+                while True:
+                    members, after = select_class_members(cursor, class_id, roles, after, limit)
+                    seen.extend(m["id"] for m in members)
+                    if after is None:
+                        break
+                if sorted(seen) != expected:
+                    failures.append(f"class {class_id} roles {roles}: {len(seen)} of {len(expected)} members paged")
+    return failures
+
+def check(verbose=False):
+    with tempfile.TemporaryDirectory() as tmp:
+        deps.DB_PATH = os.path.join(tmp, "plans.db")
+        migrations.migrate()
+
+        conn = sqlite3.connect(deps.DB_PATH)
+        seed(conn)
+
+        failures = []
+        count = 0
+        for file, func, line, sql in find_statements(ROOT / "services"):
+            count += 1
+            aliases = table_aliases(sql)
+            for row in explain(conn, sql):
+                detail = row[3]
+                if verbose:
+                    print(f"{file}:{line} {func}: {detail}")
+                if not detail.startswith("SCAN "):
+                    continue
+                table = aliases.get(detail.split()[1], detail.split()[1])
+                if table in LARGE_TABLES and (file, func) not in ALLOWED_SCANS:
+                    failures.append(f"{file}:{line} {func}: {detail}")
+        conn.close()
+        roster_failures = check_rosters()
+
+    for failure in failures:
+        print(f"FULL SCAN {failure}")
+    for failure in roster_failures:
+        print(f"ROSTER {failure}")
+    print(f"{count} statements checked, {len(failures)} full scan(s) of large tables, {len(roster_failures)} roster paging error(s)")
+    return not failures and not roster_failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m tools.check_query_plans")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan line")
+    args = parser.parse_args()
+    sys.exit(0 if check(args.verbose) else 1)
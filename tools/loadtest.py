@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# in-process load driver: seeds a synthetic school (tools.seed), then replays
+# traffic mixes with httpx against the ASGI app and reports latency
+# percentiles and throughput per endpoint.
+#   python -m tools.loadtest --scenario all --users 50 --out baseline.json
+#   python -m tools.loadtest --scenario all --users 50 --compare baseline.json
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+try:
+    import httpx
+except ImportError:
+    sys.exit("tools.loadtest needs httpx (pip install -r requirements-dev.txt)")
+
+from tools import seed  # noqa: E402
+
+ADMIN = ("admin", "AdminPW")
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+class Recorder:
+    def __init__(self, users):
+        self.samples = {}  # endpoint -> [(seconds, status)]
+        # scenarios that leave the logins out of the timing meet here, and
+        # the first one through sets started
+        self.logged_in = asyncio.Barrier(users)
+        self.started = None
+
+    async def request(self, client, method, url, label=None, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        self.samples.setdefault(label or f"{method} {url}", []).append((elapsed, response.status_code))
+        return response
+
+    def report(self, wall):
+        endpoints = {}
+        for label, samples in sorted(self.samples.items()):
+            latencies = sorted(s[0] * 1000 for s in samples)
+            errors = sum(1 for s in samples if s[1] >= 400)
+            endpoints[label] = {
+                "count": len(samples),
+                "errors": errors,
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p95_ms": round(percentile(latencies, 95), 3),
+                "p99_ms": round(percentile(latencies, 99), 3),
+                "rps": round(len(samples) / wall, 1) if wall else 0.0,
+            }
+        return endpoints
+
+async def login(recorder, client, username, password):
+    response = await recorder.request(
+        client, "POST", "/api/v1/user/login", data={"username": username, "pw": password}
+    )
+    if response.status_code != 302 or response.headers.get("location") != "/app/index.html":
+        raise RuntimeError(f"login failed for {username}")
+
+# scenarios, one coroutine per virtual user
+
+async def morning_login_burst(app, recorder, username, iterations):
+    # everyone opens the app at 7:50: login, then the start page
+    for _ in range(iterations):
+        async with make_client(app) as client:
+            await login(recorder, client, username, seed.SEED_PASSWORD)
+            await pwa_index_once(recorder, client)
+
+async def pwa_index_loads(app, recorder, username, iterations):
+    async with make_client(app) as client:
+        await login(recorder, client, username, seed.SEED_PASSWORD)
+        recorder.samples.pop("POST /api/v1/user/login", None)
+        for _ in range(iterations):
+            await pwa_index_once(recorder, client)
+
+async def pwa_index_once(recorder, client):
+    # what pwa/index.html and its scripts request
+    await recorder.request(client, "GET", "/app/index.html")
+    await recorder.request(client, "GET", "/api/v1/user/profile")
+    await recorder.request(client, "GET", "/api/v1/push/status")
+    await recorder.request(client, "GET", "/api/v1/wlan/")
+    await recorder.request(client, "GET", "/api/v1/parentnotification/")
+
+async def admin_dashboard(app, recorder, username, iterations):
+    async with make_client(app) as client:
+        await login(recorder, client, *ADMIN)
+        recorder.samples.pop("POST /api/v1/user/login", None)
+        for _ in range(iterations):
+            # the server-rendered page, then the refresh static/admin_dashboard.js does
+            await recorder.request(client, "GET", "/dashboard/")
+            await recorder.request(client, "GET", "/api/v1/data/get-classes")
+            await recorder.request(client, "GET", "/api/v1/data/get-users?all=true")
+            await recorder.request(client, "GET", "/api/v1/wlan/")
+            await recorder.request(client, "GET", "/api/v1/tutoring/all-tutors")
+            await recorder.request(client, "GET", "/api/v1/parentnotification/list")
+
+async def voucher_claims(app, recorder, username, iterations):
+    # a class is told to fetch its WLAN vouchers: everybody is logged in,
+    # then all claim at once; repeated claims get the voucher they already
+    # have. req/s of POST /api/v1/wlan/claim is claims per second
+    async with make_client(app) as client:
+        await login(recorder, client, username, seed.SEED_PASSWORD)
+        if await recorder.logged_in.wait() == 0:
+            recorder.samples.pop("POST /api/v1/user/login", None)
+            recorder.started = time.perf_counter()
+        for _ in range(iterations):
+            await recorder.request(client, "POST", "/api/v1/wlan/claim")
+
+SCENARIOS = {
+    "login_burst": morning_login_burst,
+    "pwa_index": pwa_index_loads,
+    "admin_dashboard": admin_dashboard,
+    "voucher_claims": voucher_claims,
+}
+
+def make_client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest")
+
+async def run_scenario(app, name, usernames, iterations):
+    func = SCENARIOS[name]
+    if name == "admin_dashboard":
+        # only a handful of admins are ever on the dashboard at once
+        usernames = usernames[:5]
+    recorder = Recorder(len(usernames))
+    start = time.perf_counter()
+    await asyncio.gather(*(func(app, recorder, u, iterations) for u in usernames))
+    wall = time.perf_counter() - (recorder.started or start)
+    return {"wall_s": round(wall, 3), "users": len(usernames), "endpoints": recorder.report(wall)}
+
+def print_report(results):
+    for name, result in results["scenarios"].items():
+        print(f"\n{name}: {result['users']} users, {result['wall_s']} s")
+        print(f"  {'endpoint':48} {'count':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+        for label, e in result["endpoints"].items():
+            print(f"  {label:48} {e['count']:>6} {e['errors']:>4} {e['p50_ms']:>8.2f} {e['p95_ms']:>8.2f} {e['p99_ms']:>8.2f} {e['rps']:>8.1f}")
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name, {}).get("endpoints", {})
+        for label, e in result["endpoints"].items():
+            if label in base and base[label]["p95_ms"] > 0:
+                ratio = e["p95_ms"] / base[label]["p95_ms"]
+                if ratio > threshold:
+                    regressions.append(f"{name} {label}: p95 {base[label]['p95_ms']:.2f} -> {e['p95_ms']:.2f} ms ({ratio:.2f}x)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m tools.loadtest")
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "all"], default="all")
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=5, help="rounds per virtual user")
+    parser.add_argument("--out", help="write results as JSON (e.g. a new baseline)")
+    parser.add_argument("--compare", help="baseline JSON to compare p95 latencies against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p95 ratio counted as regression")
+    seed.add_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bogy-loadtest-")
+    db_path = os.path.join(workdir, "data.db")
+    feedback_dir = os.path.join(workdir, "feedback")
+
+    # the app reads these at import time
+    os.environ["DB_PATH"] = db_path
+    os.environ["FEEDBACK_DIR"] = feedback_dir
+    os.environ["RATELIMIT_STORAGE_URI"] = "memory://"
+    os.environ.setdefault("SESSION_SECRET_KEY", "loadtest")
+    os.chdir(ROOT)
+
+    dataset = seed.generate_from_args(args, db_path, feedback_dir)
+    print(f"seeded {dataset} into {db_path}")
+
+    import main as app_module
+    from definitions import sl_limiter
+    # measure the app, not the rate limits
+    sl_limiter.enabled = False
+
+    conn = sqlite3.connect(db_path)
+    usernames = [
+        r[0] for r in conn.execute("SELECT username FROM users WHERE role = 1 ORDER BY id LIMIT ?", (args.users,))
+    ]
+    conn.close()
+
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    results = {"dataset": dataset, "users": args.users, "iterations": args.iterations, "scenarios": {}}
+    for name in names:
+        results["scenarios"][name] = asyncio.run(run_scenario(app_module.app, name, usernames, args.iterations))
+
+    print_report(results)
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\nresults written to {args.out}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text(encoding="utf-8")), args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
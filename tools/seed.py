@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+# fills a database with a synthetic school: classes, students, teachers,
+# tutors, WLAN codes and vouchers, parent notifications with feedback files
+# and push subscriptions. every seeded user has the password SEED_PASSWORD,
+# the admin account from the initial migration stays as it is.
+#   python -m tools.seed --db /tmp/school.db --classes 32 --students-per-class 28
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from api.v1 import deps  # noqa: E402
+import migrations  # noqa: E402
+
+SEED_PASSWORD = "MusterPW"
+FUTURE = "2999-01-01 00:00:00.000"
+
+FIRSTNAMES = ["Anna", "Ben", "Clara", "David", "Emma", "Felix", "Greta", "Hannah", "Jonas", "Lea", "Lukas", "Mia", "Noah", "Paul", "Sophie", "Tim"]
+LASTNAMES = ["Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker", "Schulz", "Hoffmann", "Koch", "Richter", "Klein", "Wolf", "Neumann", "Braun"]
+
+FEEDBACK_SCHEMA = [
+    {"id": "0", "type": "single-choice", "label": "Teilnahme", "choices": [{"val": "yes", "label": "Ja"}, {"val": "no", "label": "Nein"}]},
+    {"id": "1", "type": "freetext", "label": "Anmerkungen"},
+]
+
+def generate(
+    db_path,
+    feedback_dir,
+    classes=32,
+    students_per_class=28,
+    teachers=80,
+    tutors=120,
+    wlan_codes=200,
+    wlan_vouchers=2000,
+    notifications=150,
+    feedback_ratio=0.6,
+    push_ratio=0.5,
+    seed=1,
+):
+    rng = random.Random(seed)
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    deps.DB_PATH = str(db_path)
+    migrations.migrate()
+
+    # hashing is the slow part of creating users, one hash serves everyone
+    password = deps.hash_password(SEED_PASSWORD)
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    class_names = [f"{5 + i // 4}{'abcd'[i % 4]}" if i < 32 else f"K{i}" for i in range(classes)]
+    cursor.executemany("INSERT OR IGNORE INTO classes (name) VALUES (?)", [(n,) for n in class_names])
+    cursor.execute("SELECT id FROM classes ORDER BY id")
+    class_ids = [r[0] for r in cursor.fetchall()]
+
+    def name():
+        return rng.choice(FIRSTNAMES), rng.choice(LASTNAMES)
+
+    users = []
+    for class_id in class_ids:
+        for n in range(students_per_class):
+            first, last = name()
+            users.append((f"s{class_id}.{n}", first, last, password, 1, class_id))
+    for n in range(teachers):
+        first, last = name()
+        # some teachers are attached to a class as class teacher
+        users.append((f"t{n}", first, last, password, 2, class_ids[n % len(class_ids)] if n < len(class_ids) else None))
+    cursor.executemany(
+        "INSERT OR IGNORE INTO users (username, firstname, lastname, password, role, class) VALUES (?, ?, ?, ?, ?, ?)",
+        users,
+    )
+
+    cursor.execute("SELECT id, class FROM users WHERE role = 1")
+    students = cursor.fetchall()
+    student_ids = [r[0] for r in students]
+    by_class = {}
+    for user_id, class_id in students:
+        by_class.setdefault(class_id, []).append(user_id)
+    cursor.execute("SELECT id FROM users")
+    all_ids = [r[0] for r in cursor.fetchall()]
+
+    cursor.execute("SELECT id FROM subjects")
+    subject_ids = [r[0] for r in cursor.fetchall()]
+    cursor.executemany(
+        "INSERT INTO tutoring (user, subjects) VALUES (?, ?)",
+        [
+            (user_id, ",".join(str(s) for s in rng.sample(subject_ids, rng.randint(1, 3))))
+            for user_id in rng.sample(student_ids, min(tutors, len(student_ids)))
+        ],
+    )
+
+    codes = []
+    for n in range(wlan_codes):
+        if n % 10 == 0:
+            user_ids = "all"
+        else:
+            user_ids = ";".join(str(u) for u in by_class[rng.choice(class_ids)])
+        codes.append((user_ids, f"WLAN-{n:05d}", FUTURE))
+    cursor.executemany("INSERT INTO wlan_codes (user_ids, code, expiry) VALUES (?, ?, ?)", codes)
+
+    cursor.executemany(
+        "INSERT OR IGNORE INTO wlan_vouchers (code, class_id, expiry) VALUES (?, ?, ?)",
+        [(f"VOUCHER-{n:06d}", rng.choice(class_ids + [None]), FUTURE) for n in range(wlan_vouchers)],
+    )
+
+    cursor.executemany(
+        "INSERT OR IGNORE INTO push_subscriptions (user_id, endpoint, p256dh, auth) VALUES (?, ?, ?, ?)",
+        [
+            (user_id, f"https://push.example.invalid/{user_id}", "p256dh-key", "auth-key")
+            for user_id in all_ids
+            if rng.random() < push_ratio
+        ],
+    )
+
+    feedback_path = Path(feedback_dir)
+    feedback_path.mkdir(parents=True, exist_ok=True)
+    for n in range(notifications):
+        if n % 5 == 0:
+            user_ids, audience = "all", student_ids
+        else:
+            audience = by_class[rng.choice(class_ids)]
+            user_ids = ";".join(str(u) for u in audience)
+        cursor.execute(
+            "INSERT INTO parentnotifications (title, body, feedback, attachments, user_ids) VALUES (?, ?, ?, ?, ?)",
+            (f"Elternbrief {n}", "Liebe Eltern, " + "Lorem ipsum dolor sit amet. " * 20, json.dumps(FEEDBACK_SCHEMA), "[]", user_ids),
+        )
+        feedbacks = {
+            str(u): {"0": rng.choice(["yes", "no"]), "1": ""}
+            for u in audience
+            if rng.random() < feedback_ratio
+        }
+        (feedback_path / f"{cursor.lastrowid}.json").write_text(json.dumps({"feedbacks": feedbacks}), encoding="utf-8")
+
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+    return {
+        "classes": len(class_ids),
+        "users": len(all_ids),
+        "students": len(student_ids),
+        "notifications": notifications,
+    }
+
+def add_arguments(parser):
+    parser.add_argument("--classes", type=int, default=32)
+    parser.add_argument("--students-per-class", type=int, default=28)
+    parser.add_argument("--teachers", type=int, default=80)
+    parser.add_argument("--tutors", type=int, default=120)
+    parser.add_argument("--wlan-codes", type=int, default=200)
+    parser.add_argument("--wlan-vouchers", type=int, default=2000)
+    parser.add_argument("--notifications", type=int, default=150)
+    parser.add_argument("--feedback-ratio", type=float, default=0.6)
+    parser.add_argument("--push-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+
+def generate_from_args(args, db_path, feedback_dir):
+    return generate(
+        db_path,
+        feedback_dir,
+        classes=args.classes,
+        students_per_class=args.students_per_class,
+        teachers=args.teachers,
+        tutors=args.tutors,
+        wlan_codes=args.wlan_codes,
+        wlan_vouchers=args.wlan_vouchers,
+        notifications=args.notifications,
+        feedback_ratio=args.feedback_ratio,
+        push_ratio=args.push_ratio,
+        seed=args.seed,
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m tools.seed")
+    parser.add_argument("--db", required=True, help="database file to create or extend")
+    parser.add_argument("--feedback-dir", default=None, help="where feedback files go (default: next to the database)")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if os.path.abspath(args.db) == os.path.abspath("data.db"):
+        sys.exit("refusing to seed the live data.db")
+    feedback_dir = args.feedback_dir or os.path.join(os.path.dirname(os.path.abspath(args.db)), "feedback")
+    print(generate_from_args(args, args.db, feedback_dir))